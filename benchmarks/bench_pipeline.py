@@ -0,0 +1,207 @@
+"""Benchmarks of the session pipeline on recorded fixtures.
+
+The fixture (see fixtures.py) is served by a local ReplayServer. Two kinds
+of figures are measured:
+
+- end to end: process_session for every session of the fixture with the
+  response cache off, plus the per-stage breakdown of openf1_metrics;
+- stage by stage, on data already in memory: JSON decode of the bulk laps
+  responses, lap cleaning (projection to the typed lap table), merge,
+  fastest-lap groupby, 5-lap aggregation and chart rendering.
+
+Every run is appended to benchmarks/results.jsonl (not tracked), tagged
+with the commit, so changes can be compared over time with --compare. The
+synthetic fixtures (synthetic-session, synthetic-season) are generated on
+first use, so the suite also runs offline on a fresh checkout.
+
+    python benchmarks/bench_pipeline.py synthetic-session --repeat 5
+    python benchmarks/bench_pipeline.py synthetic-season --repeat 1 --no-render
+    python benchmarks/bench_pipeline.py singapore-2023 --repeat 5
+    python benchmarks/bench_pipeline.py season-2023 --repeat 1 --no-render
+    python benchmarks/bench_pipeline.py singapore-2023 --compare
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from fixtures import FIXTURES_DIR, REPO_ROOT, SYNTHETIC_FIXTURES, Fixture, ReplayServer, synthesize
+
+from openf1_analysis import speed_by_lap_group
+from openf1_cache import normalize_query
+from openf1_fetch import OpenF1Fetcher, iter_json_array
+from openf1_metrics import Metrics
+from openf1_pipeline import fastest_lap_summary, load_session, merge_session, process_session
+from openf1_schema import LAPS
+from openf1_session import clear_session_memos
+from openf1_store import DEFAULT_FORMAT
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results.jsonl')
+
+
+def timed(function, repeat):
+    """Median wall time of function() over `repeat` calls, in seconds"""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times)
+
+
+def bench_end_to_end(fixture, server, repeat):
+    """Median time of processing every session of the fixture, with its stage breakdown"""
+    times, stage_times = [], {}
+    for _ in range(repeat):
+        # Every repeat has to fetch finished sessions again
+        clear_session_memos()
+        fetcher = OpenF1Fetcher(server.url, rate=0)
+        metrics = Metrics()
+        with tempfile.TemporaryDirectory() as root, metrics.recording():
+            started = time.perf_counter()
+            for session_key in fixture.sessions:
+                process_session(fetcher, session_key, root=root, format=DEFAULT_FORMAT)
+            times.append(time.perf_counter() - started)
+        for name, stats in metrics.stages.items():
+            stage_times.setdefault(name, []).append(stats['wall_s'])
+    return statistics.median(times), {name: statistics.median(values) for name, values in stage_times.items()}
+
+
+def bench_stages(fixture, server, repeat, render=True):
+    """Median time of every in-memory stage, over all the sessions of the fixture"""
+    clear_session_memos()
+    fetcher = OpenF1Fetcher(server.url, rate=0)
+    sessions = [load_session(fetcher, session_key) for session_key in fixture.sessions]
+    bodies = [fixture.body(normalize_query('laps', {'session_key': session_key})) for session_key in fixture.sessions]
+    bodies = [body for body in bodies if body is not None]
+    lap_rows = [[LAPS.row(record) for record in iter_json_array(io.BytesIO(body))] for body in bodies]
+    merged = [
+        merge_session(tables['laps'], tables['drivers'], tables['positions'], tables['session'].get('location'))
+        for tables in sessions
+    ]
+    summaries = [fastest_lap_summary(merged_df) for merged_df in merged]
+
+    def clean():
+        for rows in lap_rows:
+            LAPS.to_frame(rows)
+
+    results = {
+        'json_decode': timed(lambda: [list(iter_json_array(io.BytesIO(body))) for body in bodies], repeat),
+        'lap_cleaning': timed(clean, repeat),
+        'merge': timed(lambda: [
+            merge_session(tables['laps'], tables['drivers'], tables['positions'], tables['session'].get('location'))
+            for tables in sessions
+        ], repeat),
+        'fastest_lap': timed(lambda: [fastest_lap_summary(merged_df) for merged_df in merged], repeat),
+        'lap_groups': timed(lambda: [speed_by_lap_group(merged_df, window=5) for merged_df in merged], repeat),
+    }
+    if render:
+        from openf1_charts import ChartRenderer
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            renderer = ChartRenderer(output_dir)
+
+            def draw():
+                for merged_df, summary in zip(merged, summaries):
+                    location = str(merged_df['race_location'].iloc[0])
+                    renderer.fastest_laps(summary, location)
+                    renderer.speed(speed_by_lap_group(merged_df, window=5), location)
+
+            results['render'] = timed(draw, repeat)
+    return results
+
+
+def _commit():
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def run(name, repeat=3, render=True, results_file=RESULTS_FILE, root=FIXTURES_DIR):
+    """Benchmark fixture `name` and append the result to results_file"""
+    fixture = Fixture(name, root)
+    if not fixture.sessions and name in SYNTHETIC_FIXTURES:
+        print(f"Generating the synthetic fixture {name}")
+        fixture = synthesize(name, root=root)
+    if not fixture.sessions:
+        raise SystemExit(f"No fixture named {name} in {os.path.dirname(fixture.path)}, record it first")
+    with ReplayServer(fixture) as server:
+        end_to_end, pipeline_stages = bench_end_to_end(fixture, server, repeat)
+        stages = bench_stages(fixture, server, repeat, render)
+
+    result = {
+        'commit': _commit(),
+        'date': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': sys.version.split()[0],
+        'fixture': name,
+        'sessions': len(fixture.sessions),
+        'repeat': repeat,
+        'end_to_end_s': end_to_end,
+        'pipeline_stages_s': pipeline_stages,
+        'stages_s': stages,
+    }
+    with open(results_file, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + '\n')
+    return result
+
+
+def _figures(result):
+    figures = {'end_to_end': result['end_to_end_s']}
+    figures.update((f'pipeline.{name}', value) for name, value in result['pipeline_stages_s'].items())
+    figures.update(result['stages_s'])
+    return figures
+
+
+def print_result(result):
+    print(f"{result['fixture']} ({result['sessions']} sessions) at {result['commit']}, median of {result['repeat']}")
+    for name, value in _figures(result).items():
+        print(f"  {name:<22} {value * 1000:>10.1f} ms")
+
+
+def compare(name, baseline=None, results_file=RESULTS_FILE):
+    """Print the latest result of fixture `name` against a baseline commit (default: the previous result)"""
+    with open(results_file, encoding='utf-8') as f:
+        results = [result for result in map(json.loads, f) if result['fixture'] == name]
+    if len(results) < 2:
+        raise SystemExit(f"Need at least two results for {name} in {results_file}")
+    current = results[-1]
+    if baseline is None:
+        before = results[-2]
+    else:
+        matching = [result for result in results[:-1] if result['commit'] == baseline]
+        if not matching:
+            raise SystemExit(f"No result for {name} at commit {baseline}")
+        before = matching[-1]
+
+    print(f"{name}: {before['commit']} -> {current['commit']}")
+    old, new = _figures(before), _figures(current)
+    for metric in new:
+        if metric in old and old[metric]:
+            change = (new[metric] - old[metric]) / old[metric] * 100
+            print(f"  {metric:<22} {old[metric] * 1000:>10.1f} ms {new[metric] * 1000:>10.1f} ms {change:>+7.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the OpenF1 pipeline on a recorded fixture")
+    parser.add_argument('fixture', help="fixture name, e.g. synthetic-session, synthetic-season or singapore-2023")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--no-render', dest='render', action='store_false', help="skip the chart rendering stage")
+    parser.add_argument('--results', default=RESULTS_FILE)
+    parser.add_argument('--root', default=FIXTURES_DIR, help="directory of the recorded fixtures")
+    parser.add_argument('--compare', nargs='?', const='', metavar='COMMIT',
+                        help="compare the latest result with COMMIT (default: the previous result) instead of running")
+    args = parser.parse_args(argv)
+
+    if args.compare is not None:
+        compare(args.fixture, args.compare or None, args.results)
+    else:
+        print_result(run(args.fixture, args.repeat, args.render, args.results, args.root))
+
+
+if __name__ == '__main__':
+    main()
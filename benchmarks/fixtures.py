@@ -0,0 +1,395 @@
+"""Recorded OpenF1 responses and a local server that replays them.
+
+A fixture is a directory with one gzip-compressed body per API query and an
+index.json that maps the canonical query (openf1_cache.normalize_query) to
+its file and lists the sessions the fixture covers:
+
+    benchmarks/fixtures/<name>/index.json
+    benchmarks/fixtures/<name>/<sha256>.json.gz
+
+Recording fetches the sessions with the response cache off and keeps every
+response. ReplayServer then answers the same queries from disk over plain
+HTTP, so benchmarks are repeatable and never touch the network. A query
+missing from the fixture gets a 404 naming it, which means the fixture
+predates a change in the queries the pipeline makes and must be recorded
+again.
+
+Without network access, or to get the same figures on every machine, the
+synthetic fixtures are recorded from a SyntheticServer instead: a local
+stand-in for the API serving a generated season (one race per
+Countries.csv row, 20 drivers, sector and mini-sector data, position
+changes) that answers the same filters. synthetic-session holds its first
+race and synthetic-season all of them; bench_pipeline.py generates them on
+first use.
+
+    python benchmarks/fixtures.py record singapore-2023 --session-key 9165
+    python benchmarks/fixtures.py record season-2023 --years 2023
+    python benchmarks/fixtures.py synthesize synthetic-season
+"""
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from openf1_cache import normalize_query  # noqa: E402
+from openf1_http import HTTPSession  # noqa: E402
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Synthetic fixture name -> whether it covers the whole generated season or only its first race
+SYNTHETIC_FIXTURES = {'synthetic-session': False, 'synthetic-season': True}
+SYNTHETIC_YEAR = 2023
+
+
+def query_key(url):
+    """Canonical query of a request URL or path, e.g. 'laps?session_key=9165'"""
+    parts = urlsplit(url)
+    return normalize_query(parts.path.rsplit('/', 1)[-1], dict(parse_qsl(parts.query, keep_blank_values=True)))
+
+
+class Fixture:
+    """Recorded responses of one benchmark scenario"""
+
+    def __init__(self, name, root=FIXTURES_DIR):
+        self.name = name
+        self.path = os.path.join(root, name)
+        self.sessions = []
+        self.queries = {}
+        index_path = os.path.join(self.path, 'index.json')
+        if os.path.exists(index_path):
+            with open(index_path, encoding='utf-8') as f:
+                index = json.load(f)
+            self.sessions = index['sessions']
+            self.queries = index['queries']
+
+    def add(self, url, body):
+        key = query_key(url)
+        file_name = hashlib.sha256(key.encode('utf-8')).hexdigest() + '.json.gz'
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, file_name), 'wb') as f:
+            f.write(gzip.compress(body, mtime=0))
+        self.queries[key] = file_name
+
+    def compressed(self, key):
+        """gzip-compressed body recorded for a canonical query, or None"""
+        file_name = self.queries.get(key)
+        if file_name is None:
+            return None
+        with open(os.path.join(self.path, file_name), 'rb') as f:
+            return f.read()
+
+    def body(self, key):
+        """Body recorded for a canonical query, or None"""
+        compressed = self.compressed(key)
+        return gzip.decompress(compressed) if compressed is not None else None
+
+    def save(self):
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, 'index.json'), 'w', encoding='utf-8') as f:
+            json.dump({'sessions': self.sessions, 'queries': self.queries}, f, indent=1, sort_keys=True)
+
+
+class _RecordedResponse:
+    """Already-read response handed back to the fetcher by RecordingSession"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self._body = io.BytesIO(body)
+
+    def read(self, size=-1):
+        return self._body.read(size)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class RecordingSession(HTTPSession):
+    """HTTPSession that stores every successful response in a Fixture"""
+
+    def __init__(self, fixture, **kwargs):
+        super().__init__(**kwargs)
+        self.fixture = fixture
+
+    def open(self, url, headers=None):
+        with super().open(url, headers) as response:
+            body = response.read()
+        self.fixture.add(url, body)
+        return _RecordedResponse(response.status, response.headers, body)
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    fixture = None
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        key = query_key(self.path)
+        compressed = self.fixture.compressed(key)
+        if compressed is None:
+            body = json.dumps({'detail': f'{key} is not in fixture {self.fixture.name}'}).encode('utf-8')
+            self._send(404, body)
+        elif 'gzip' in self.headers.get('Accept-Encoding', ''):
+            self._send(200, compressed, {'Content-Encoding': 'gzip'})
+        else:
+            self._send(200, gzip.decompress(compressed))
+
+    def _send(self, status, body, headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        for name, value in dict(headers).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ReplayServer:
+    """Local HTTP server answering OpenF1 queries from a Fixture.
+
+        with ReplayServer(fixture) as server:
+            fetcher = OpenF1Fetcher(server.url, rate=0)
+    """
+
+    def __init__(self, fixture, port=0):
+        handler = type('ReplayHandler', (_ReplayHandler,), {'fixture': fixture})
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_port}/v1'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+_DRIVERS = (1, 11, 16, 55, 44, 63, 4, 81, 14, 18, 10, 31, 23, 2, 22, 3, 77, 24, 20, 27)
+_TEAM_COLOURS = ('3671C6', 'E8002D', 'FF8000', '27F4D2', '229971', '6692FF', 'FF87BC', 'B6BABD', '52E252', '64C4FF')
+# Mini-sectors per sector, and the codes drawn for them (mostly green)
+_SEGMENTS = (7, 8, 6)
+_SEGMENT_CODES = (2048, 2049, 2049, 2049, 2049, 2051)
+
+
+def _iso(value):
+    return value.isoformat(timespec='microseconds')
+
+
+class SyntheticSeason:
+    """Deterministic OpenF1-like records of one season, one race per Countries.csv row"""
+
+    def __init__(self, year=SYNTHETIC_YEAR, laps=58, seed=0, circuits=None):
+        from openf1_index import read_circuits
+
+        self.year = year
+        self.laps = laps
+        self.seed = seed
+        self.sessions = []
+        # session_key -> base lap time, which also sets roughly when the race ends
+        self._base = {}
+        start = datetime(year, 3, 5, 15, tzinfo=timezone.utc)
+        for index, (country, circuit) in enumerate(read_circuits() if circuits is None else circuits):
+            date_start = start + timedelta(weeks=index)
+            base = self._base[9000 + index] = random.Random(seed * 100003 + index).uniform(80, 100)
+            self.sessions.append({
+                'session_key': 9000 + index, 'meeting_key': 1200 + index, 'year': year,
+                'session_name': 'Race', 'session_type': 'Race', 'country_name': country, 'location': circuit,
+                'circuit_short_name': circuit, 'date_start': _iso(date_start),
+                'date_end': _iso(date_start + timedelta(seconds=(base + 2) * laps + 120)),
+            })
+        self._tables = {}
+
+    def drivers(self, session):
+        return [{
+            'session_key': session['session_key'], 'meeting_key': session['meeting_key'],
+            'driver_number': driver_number, 'full_name': f'Driver{index} Surname{index}',
+            'first_name': f'Driver{index}', 'last_name': f'Surname{index}', 'broadcast_name': f'D SURNAME{index}',
+            'name_acronym': f'D{index:02d}', 'team_name': f'Team {index // 2}',
+            'team_colour': _TEAM_COLOURS[index // 2], 'country_code': 'XXX', 'headshot_url': None,
+        } for index, driver_number in enumerate(_DRIVERS)]
+
+    def tables(self, session):
+        """(laps, positions) records of a session, generated once"""
+        key = session['session_key']
+        if key not in self._tables:
+            self._tables[key] = self._generate(session)
+        return self._tables[key]
+
+    def _generate(self, session):
+        rng = random.Random(self.seed * 100003 + session['session_key'])
+        start = datetime.fromisoformat(session['date_start'])
+        base = self._base[session['session_key']]
+        pace = {driver_number: rng.uniform(0, 2) for driver_number in _DRIVERS}
+        elapsed = {driver_number: grid * 0.3 for grid, driver_number in enumerate(_DRIVERS)}
+        laps, positions = [], []
+        order = list(_DRIVERS)
+        for position, driver_number in enumerate(order, start=1):
+            positions.append({'session_key': session['session_key'], 'meeting_key': session['meeting_key'],
+                              'driver_number': driver_number, 'date': _iso(start), 'position': position})
+        for lap_number in range(1, self.laps + 1):
+            for driver_number in _DRIVERS:
+                duration = base + pace[driver_number] + rng.gauss(0, 0.4) + (20 if lap_number == 20 else 0)
+                split = (0.31 + rng.uniform(-0.01, 0.01), 0.36 + rng.uniform(-0.01, 0.01))
+                sectors = [round(duration * split[0], 3), round(duration * split[1], 3)]
+                sectors.append(round(duration - sum(sectors), 3))
+                laps.append({
+                    'session_key': session['session_key'], 'meeting_key': session['meeting_key'],
+                    'driver_number': driver_number, 'lap_number': lap_number,
+                    'date_start': _iso(start + timedelta(seconds=elapsed[driver_number])),
+                    'lap_duration': round(duration, 3) if lap_number > 1 else None,
+                    'duration_sector_1': sectors[0] if lap_number > 1 else None,
+                    'duration_sector_2': sectors[1], 'duration_sector_3': sectors[2],
+                    'i1_speed': rng.randint(250, 300), 'i2_speed': rng.randint(240, 290),
+                    'st_speed': rng.randint(290, 335) if rng.random() > 0.05 else None,
+                    'is_pit_out_lap': lap_number == 21,
+                    **{f'segments_sector_{sector + 1}': [rng.choice(_SEGMENT_CODES) for _ in range(count)]
+                       for sector, count in enumerate(_SEGMENTS)},
+                })
+                elapsed[driver_number] += duration
+            # Position samples are only sent on changes, dated when the lap ends
+            new_order = sorted(_DRIVERS, key=elapsed.get)
+            for position, driver_number in enumerate(new_order, start=1):
+                if order.index(driver_number) + 1 != position:
+                    positions.append({'session_key': session['session_key'], 'meeting_key': session['meeting_key'],
+                                      'driver_number': driver_number, 'position': position,
+                                      'date': _iso(start + timedelta(seconds=elapsed[driver_number]))})
+            order = new_order
+        positions.sort(key=lambda record: record['date'])
+        return laps, positions
+
+    def records(self, endpoint, params):
+        """Records of an endpoint matching query parameters as the API filters them"""
+        if endpoint == 'sessions':
+            records = self.sessions[-1:] if params.get('session_key') == 'latest' else self.sessions
+        else:
+            session_key = params.get('session_key')
+            session = self.sessions[-1] if session_key == 'latest' else next(
+                (session for session in self.sessions if str(session['session_key']) == session_key), None)
+            if session is None:
+                return []
+            laps, positions = self.tables(session)
+            records = {'drivers': self.drivers(session), 'laps': laps, 'position': positions}.get(endpoint, [])
+        return [record for record in records if _matches(record, params)]
+
+
+def _matches(record, params):
+    for name, value in params.items():
+        if name[-1:] in '<>':
+            # 'date>=...' arrives as name 'date>' and value '...'; the bounds are inclusive
+            field = record.get(name[:-1])
+            if field is None:
+                return False
+            bound = datetime.fromisoformat(value)
+            bound = bound if bound.tzinfo else bound.replace(tzinfo=timezone.utc)
+            if (datetime.fromisoformat(field) < bound) if name[-1] == '>' else (datetime.fromisoformat(field) > bound):
+                return False
+        elif value != 'latest' and name in record and str(record[name]) != value:
+            return False
+    return True
+
+
+class _SyntheticHandler(_ReplayHandler):
+    season = None
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query, keep_blank_values=True))
+        records = self.season.records(parts.path.rsplit('/', 1)[-1], params)
+        self._send(200, json.dumps(records).encode('utf-8'))
+
+
+class SyntheticServer(ReplayServer):
+    """Local HTTP server answering OpenF1 queries from a SyntheticSeason"""
+
+    def __init__(self, season, port=0):
+        handler = type('SyntheticHandler', (_SyntheticHandler,), {'season': season})
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_port}/v1'
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+
+def synthesize(name, season=None, root=FIXTURES_DIR):
+    """Record synthetic fixture `name` (see SYNTHETIC_FIXTURES) from a SyntheticServer"""
+    if name not in SYNTHETIC_FIXTURES:
+        raise ValueError(f"Unknown synthetic fixture {name}, expected one of {', '.join(SYNTHETIC_FIXTURES)}")
+    season = season or SyntheticSeason()
+    with SyntheticServer(season) as server:
+        if SYNTHETIC_FIXTURES[name]:
+            return record(name, years=[season.year], base_url=server.url, root=root, rate=0)
+        return record(name, session_keys=[season.sessions[0]['session_key']], base_url=server.url, root=root, rate=0)
+
+
+def record(name, session_keys=(), years=(), session_names=('Race',), base_url=None, root=FIXTURES_DIR, rate=None):
+    """Fetch sessions through a RecordingSession and save them as fixture `name`"""
+    from openf1_batch import resolve_sessions
+    from openf1_index import read_circuits
+    from openf1_fetch import API_URL, DEFAULT_RATE, OpenF1Fetcher, TokenBucket
+    from openf1_session import fetch_session
+
+    fixture = Fixture(name, root)
+    limiter = TokenBucket(DEFAULT_RATE if rate is None else rate)
+    fetcher = OpenF1Fetcher(base_url or API_URL, limiter=limiter, session=RecordingSession(fixture, limiter=limiter))
+    sessions = [session for key in session_keys for session in fetcher.get('sessions', session_key=key)]
+    if years:
+        sessions.extend(resolve_sessions(fetcher, years, session_names, read_circuits()))
+    for session in sessions:
+        print(f"Recording {session.get('location')} {session.get('session_name')} {session.get('year')}")
+        rows = fetch_session(fetcher, session['session_key'])
+        for table, errors in rows['errors'].items():
+            for driver_number, error in errors.items():
+                print(f"  No {table} for driver {driver_number}: {error}")
+    fixture.sessions = [session['session_key'] for session in sessions]
+    fixture.save()
+    print(f"Recorded {len(fixture.queries)} responses for {len(sessions)} sessions into {fixture.path}")
+    return fixture
+
+
+def main(argv=None):
+    from openf1_batch import parse_years
+
+    parser = argparse.ArgumentParser(description="Record OpenF1 responses as a benchmark fixture")
+    commands = parser.add_subparsers(dest='command', required=True)
+    recorder = commands.add_parser('record', help="record the responses of some sessions")
+    recorder.add_argument('name')
+    recorder.add_argument('--session-key', type=int, nargs='*', default=[])
+    recorder.add_argument('--years', type=parse_years, nargs='*', default=[], help="whole seasons, e.g. 2023")
+    recorder.add_argument('--sessions', nargs='+', default=['Race'], help="session names used with --years")
+    recorder.add_argument('--root', default=FIXTURES_DIR)
+    synthesizer = commands.add_parser('synthesize', help="record a synthetic fixture from a local stand-in API")
+    synthesizer.add_argument('name', choices=list(SYNTHETIC_FIXTURES))
+    synthesizer.add_argument('--laps', type=int, default=58, help="laps per race")
+    synthesizer.add_argument('--root', default=FIXTURES_DIR)
+    args = parser.parse_args(argv)
+
+    if args.command == 'synthesize':
+        synthesize(args.name, SyntheticSeason(laps=args.laps), root=args.root)
+        return
+    years = sorted({year for years in args.years for year in years})
+    record(args.name, args.session_key, years, args.sessions, root=args.root)
+
+
+if __name__ == '__main__':
+    main()
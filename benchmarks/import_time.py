@@ -0,0 +1,90 @@
+"""Cold-start import benchmark for the fetch-only path.
+
+Every target module is imported in a fresh interpreter with -X importtime,
+a few times over, and the median start-up wall time and cumulative import
+time are reported with the slowest modules it pulled in. Heavy libraries
+that must stay off the fetch-only path (pandas, numpy, matplotlib, pyarrow)
+are listed when a target loads them; --check turns that into a failure.
+
+    python benchmarks/import_time.py
+    python benchmarks/import_time.py openf1_pipeline openf1_charts --repeat 10
+    python benchmarks/import_time.py --check --json import_times.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FETCH_PATH = ('openf1_fetch', 'openf1_cache', 'openf1_session', 'openf1_cli')
+HEAVY_MODULES = ('pandas', 'numpy', 'matplotlib', 'pyarrow')
+
+
+def import_profile(module):
+    """One cold import of module: (wall seconds, {module: (self us, cumulative us)})"""
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                            cwd=REPO_ROOT, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(own), int(cumulative))
+    return wall, modules
+
+
+def measure(module, repeat=5, top=5):
+    """Median cold-start figures of module over `repeat` fresh interpreters"""
+    walls, totals = [], []
+    for _ in range(repeat):
+        wall, modules = import_profile(module)
+        walls.append(wall)
+        totals.append(modules[module][1])
+    slowest = sorted(modules.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return {
+        'module': module,
+        'wall_ms': round(statistics.median(walls) * 1000, 1),
+        'import_ms': round(statistics.median(totals) / 1000, 1),
+        'heavy': sorted({name.split('.')[0] for name in modules} & set(HEAVY_MODULES)),
+        'slowest': [(name, round(own / 1000, 1)) for name, (own, _) in slowest],
+    }
+
+
+def _commit():
+    result = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True)
+    return result.stdout.strip() or None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure cold-start import time of OpenF1 modules")
+    parser.add_argument('modules', nargs='*', default=list(FETCH_PATH))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', help="write the results to this file, tagged with the current commit")
+    parser.add_argument('--check', action='store_true', help="fail if a module loads one of the heavy libraries")
+    args = parser.parse_args(argv)
+
+    results = [measure(module, args.repeat) for module in args.modules]
+    for result in results:
+        print(f"{result['module']:<20} start-up {result['wall_ms']:>7.1f} ms   import {result['import_ms']:>7.1f} ms")
+        print(f"{'':<20} slowest: " + ', '.join(f'{name} {ms} ms' for name, ms in result['slowest']))
+        if result['heavy']:
+            print(f"{'':<20} loads: {', '.join(result['heavy'])}")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'commit': _commit(), 'python': sys.version.split()[0], 'results': results}, f, indent=2)
+    if args.check and any(result['heavy'] for result in results):
+        raise SystemExit("Heavy libraries imported on the fetch-only path")
+
+
+if __name__ == '__main__':
+    main()
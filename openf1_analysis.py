@@ -0,0 +1,177 @@
+"""Vectorized lap analytics: chart aggregations, time-range filters, as-of joins and sector comparisons."""
+import pandas as pd
+
+from openf1_schema import SECTOR_COLUMNS, SEGMENT_BASE, segment_names
+
+SPEED_METHODS = ('mean', 'rolling', 'ewm')
+
+# Mini-sector statuses counted by segment_counts, by API code
+SEGMENT_STATUSES = {'yellow': 2048, 'green': 2049, 'purple': 2051, 'pit_lane': 2064}
+
+
+def speed_by_lap_group(merged_df, window=5, method='mean', driver_column='full_name', keep=()):
+    """Speed-trap speed of every driver aggregated over groups of laps, in one pass.
+
+    method='mean' averages st_speed over blocks of `window` laps, labelled by
+    the first lap of the block (1, 6, 11, ... for window=5). 'rolling' and
+    'ewm' instead smooth lap by lap with a rolling mean or an exponentially
+    weighted mean of span `window`, labelled by lap_number.
+
+    Returns a tidy frame with driver_column, 'lap_group', 'st_speed' and any
+    per-driver `keep` columns (e.g. team_colour), drivers in order of first
+    appearance and lap groups ascending, ready to be plotted as is.
+    """
+    if method not in SPEED_METHODS:
+        raise ValueError(f"Unknown speed aggregation method: {method}")
+    data = merged_df.loc[
+        merged_df['st_speed'].notna() & merged_df['lap_number'].notna(),
+        [driver_column, 'lap_number', 'st_speed', *keep],
+    ]
+    # Categorical in order of appearance, so groups keep the original legend order
+    drivers = pd.Categorical(data[driver_column], categories=data[driver_column].unique())
+
+    if method == 'mean':
+        lap_group = ((data['lap_number'] - 1) // window) * window + 1
+        result = (data['st_speed'].groupby([drivers, lap_group.rename('lap_group')], observed=True)
+                  .mean().reset_index())
+        result.columns = [driver_column, 'lap_group', 'st_speed']
+    else:
+        data = data.assign(**{driver_column: drivers}).sort_values([driver_column, 'lap_number'])
+        grouped = data.groupby(driver_column, observed=True, sort=False)['st_speed']
+        if method == 'rolling':
+            smoothed = grouped.rolling(window, min_periods=1).mean()
+        else:
+            smoothed = grouped.ewm(span=window).mean()
+        result = pd.DataFrame({
+            driver_column: data[driver_column].to_numpy(),
+            'lap_group': data['lap_number'].to_numpy(),
+            'st_speed': smoothed.droplevel(0).reindex(data.index).to_numpy(),
+        })
+
+    if keep:
+        per_driver = data.groupby(driver_column, observed=True, sort=False)[list(keep)].first()
+        result = result.join(per_driver, on=driver_column)
+    return result
+
+
+def _utc(value):
+    value = pd.Timestamp(value)
+    return value.tz_localize('UTC') if value.tzinfo is None else value
+
+
+def between(df, start=None, end=None, column='date_start'):
+    """Rows whose timestamp column falls in [start, end); naive bounds are taken as UTC"""
+    mask = df[column].notna()
+    if start is not None:
+        mask &= df[column] >= _utc(start)
+    if end is not None:
+        mask &= df[column] < _utc(end)
+    return df[mask]
+
+
+def positions_at_lap_start(laps_df, position_samples):
+    """Race position of every driver when each lap started.
+
+    position_samples is a POSITIONS table of position changes ('driver_number',
+    'date', 'position'); each lap gets the driver's last sample at or before
+    its date_start, in one as-of join. Laps without a date_start, or started
+    before the driver's first sample, get a missing position.
+    """
+    laps = laps_df[['driver_number', 'lap_number', 'date_start']]
+    timed = laps[laps['date_start'].notna()].sort_values('date_start')
+    samples = position_samples[['driver_number', 'date', 'position']].dropna(subset=['date']).sort_values('date')
+    joined = pd.merge_asof(timed, samples, left_on='date_start', right_on='date', by='driver_number')
+    return (laps.merge(joined[['driver_number', 'lap_number', 'position']], on=['driver_number', 'lap_number'],
+                       how='left')
+            .set_index(laps.index))
+
+
+def _keys(df, *names):
+    # session_key is only a grouping key when the table spans several sessions
+    return [name for name in ('session_key', *names) if name in df.columns]
+
+
+def _valid_sectors(laps_df):
+    sectors = laps_df[list(SECTOR_COLUMNS)]
+    return sectors.where(sectors > 0)
+
+
+def ideal_laps(laps_df):
+    """Ideal lap of every driver of every session: the sum of their personal-best sectors.
+
+    Returns one row per (session_key, driver_number) with the best time of
+    each sector, 'ideal_lap', the actual 'fastest_lap' and 'time_lost' (how
+    much slower the fastest lap is than the ideal one), sorted by ideal lap
+    within each session. Drivers without a valid time in every sector get a
+    missing ideal lap.
+    """
+    keys = _keys(laps_df, 'driver_number')
+    grouped = _valid_sectors(laps_df).groupby([laps_df[key] for key in keys], observed=True)
+    result = grouped.min()
+    result['ideal_lap'] = result[list(SECTOR_COLUMNS)].sum(axis=1, min_count=len(SECTOR_COLUMNS))
+    lap_duration = laps_df['lap_duration'].where(laps_df['lap_duration'] > 0)
+    result['fastest_lap'] = lap_duration.groupby([laps_df[key] for key in keys], observed=True).min()
+    result['time_lost'] = result['fastest_lap'] - result['ideal_lap']
+    return result.reset_index().sort_values([*keys[:-1], 'ideal_lap'], kind='stable', ignore_index=True)
+
+
+def theoretical_best(laps_df):
+    """Theoretical best lap of every session: the sum of the session-best sectors.
+
+    Returns one row per session with the best time of each sector, the
+    driver who set it ('duration_sector_1_driver', ...), 'theoretical_best',
+    the fastest actual lap and the gap between the two.
+    """
+    keys = _keys(laps_df)
+    sectors = _valid_sectors(laps_df)
+    if not keys:
+        sectors = sectors.assign(_session=0)
+        keys = ['_session']
+    else:
+        sectors[keys] = laps_df[keys]
+    grouped = sectors.groupby(keys, observed=True)
+    result = grouped[list(SECTOR_COLUMNS)].min()
+    for name in SECTOR_COLUMNS:
+        # Sessions without any valid time for the sector have no row here, and no driver
+        best_rows = sectors.dropna(subset=[name]).groupby(keys, observed=True)[name].idxmin()
+        drivers = laps_df.loc[best_rows, 'driver_number'].set_axis(best_rows.index)
+        result[f'{name}_driver'] = drivers.reindex(result.index).astype('Int8')
+    result['theoretical_best'] = result[list(SECTOR_COLUMNS)].sum(axis=1, min_count=len(SECTOR_COLUMNS))
+    lap_duration = laps_df['lap_duration'].where(laps_df['lap_duration'] > 0)
+    result['fastest_lap'] = lap_duration.groupby([sectors[key] for key in keys], observed=True).min()
+    result['gap'] = result['fastest_lap'] - result['theoretical_best']
+    result = result.reset_index()
+    return result.drop(columns='_session') if '_session' in result.columns else result
+
+
+def sector_deltas(laps_df):
+    """Time lost in every sector of every lap, to the session best and to the driver's own best.
+
+    Returns the lap keys with 'delta_sector_1', ... (against the session-best
+    sector) and 'personal_delta_sector_1', ... (against the driver's best),
+    aligned with laps_df. Sectors without a valid time get a missing delta.
+    """
+    sectors = _valid_sectors(laps_df)
+    session_keys = [laps_df[key] for key in _keys(laps_df)]
+    driver_keys = [laps_df[key] for key in _keys(laps_df, 'driver_number')]
+    session_best = sectors.groupby(session_keys, observed=True).transform('min') if session_keys else sectors.min()
+    personal_best = sectors.groupby(driver_keys, observed=True).transform('min')
+    result = laps_df[_keys(laps_df, 'driver_number', 'lap_number')].copy()
+    for index, name in enumerate(SECTOR_COLUMNS, start=1):
+        result[f'delta_sector_{index}'] = sectors[name] - session_best[name]
+        result[f'personal_delta_sector_{index}'] = sectors[name] - personal_best[name]
+    return result
+
+
+def segment_matrix(laps_df, sector=None):
+    """Encoded mini-sector codes of one sector (1-3) or of the whole lap, as a (laps, mini-sectors) uint8 array"""
+    return laps_df[segment_names(laps_df.columns, sector)].to_numpy()
+
+
+def segment_counts(laps_df, sector=None):
+    """Mini-sectors of every status per driver and session, counted over the whole matrix at once"""
+    matrix = segment_matrix(laps_df, sector)
+    keys = _keys(laps_df, 'driver_number')
+    counts = pd.DataFrame({status: (matrix == code - SEGMENT_BASE).sum(axis=1)
+                           for status, code in SEGMENT_STATUSES.items()}, index=laps_df.index)
+    return counts.groupby([laps_df[key] for key in keys], observed=True).sum().reset_index()
@@ -0,0 +1,126 @@
+"""Batch runner building whole seasons from Countries.csv.
+
+Every circuit in Countries.csv is resolved to a session_key for each
+requested year and session type through a SessionIndex (one request per
+year), and the sessions are processed across a process pool. All workers
+draw from one shared token bucket, so the pool as a whole stays under the
+API rate limit, and each session is written to its own store partition.
+With --charts every worker also renders the charts of the sessions it
+processed, headless and reusing one set of figures, and --report collects
+the per-stage metrics of every session into one JSON file.
+
+    python openf1_batch.py --years 2023-2024 --sessions Race Qualifying --workers 4
+"""
+import argparse
+import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from openf1_cache import DEFAULT_CACHE_DIR, ResponseCache
+from openf1_fetch import API_URL, DEFAULT_RATE, OpenF1Fetcher, SharedTokenBucket
+from openf1_index import COUNTRIES_CSV, SessionIndex, read_circuits
+from openf1_metrics import Metrics
+from openf1_pipeline import print_failures, process_session
+from openf1_store import DEFAULT_FORMAT, STORE_ROOT
+
+_worker_fetcher = None
+_worker_renderer = None
+
+
+def resolve_sessions(fetcher, years, session_names, circuits):
+    """Look up the session record of every (circuit, session type, year) combination.
+
+    Answered by a SessionIndex, so it costs one /v1/sessions request per
+    year whatever the number of circuits and session types.
+    """
+    sessions, missing = SessionIndex(fetcher, circuits).sessions(years, session_names)
+    for country, session_name, year in missing:
+        print(f"No {session_name} session found for {country} {year}")
+    return sessions
+
+
+def _init_worker(base_url, limiter, cache_dir, chart_dir=None):
+    global _worker_fetcher, _worker_renderer
+    cache = ResponseCache(cache_dir) if cache_dir else None
+    _worker_fetcher = OpenF1Fetcher(base_url, cache=cache, limiter=limiter)
+    if chart_dir:
+        # matplotlib is only imported by workers that render
+        from openf1_charts import ChartRenderer
+        _worker_renderer = ChartRenderer(chart_dir)
+
+
+def _process(session, root, format):
+    metrics = Metrics()
+    with metrics.recording():
+        # The session record comes from the index, so workers do not look it up again
+        report = process_session(_worker_fetcher, session['session_key'], root=root, format=format, session=session)
+        if _worker_renderer is not None:
+            from openf1_charts import render_stored_session
+            report['charts'] = render_stored_session(_worker_renderer, *report['partition'], root=root, format=format)
+    report['metrics'] = metrics.report()
+    return report
+
+
+def run_batch(years, session_names, workers=4, rate=DEFAULT_RATE, base_url=API_URL,
+              cache_dir=DEFAULT_CACHE_DIR, root=STORE_ROOT, format=DEFAULT_FORMAT, countries_csv=COUNTRIES_CSV,
+              chart_dir=None):
+    """Resolve and process every matching session; returns one report per session"""
+    limiter = SharedTokenBucket(rate)
+    cache = ResponseCache(cache_dir) if cache_dir else None
+    fetcher = OpenF1Fetcher(base_url, cache=cache, limiter=limiter)
+    sessions = resolve_sessions(fetcher, years, session_names, read_circuits(countries_csv))
+    print(f"Processing {len(sessions)} sessions with {workers} workers")
+
+    reports = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(base_url, limiter, cache_dir, chart_dir)) as pool:
+        futures = {
+            pool.submit(_process, session, root, format): session
+            for session in sessions
+        }
+        for future in as_completed(futures):
+            session = futures[future]
+            label = f"{session.get('location')} {session.get('session_name')} {session.get('year')}"
+            try:
+                report = future.result()
+            except Exception as e:
+                print(f"Error processing {label} (session_key={session['session_key']}): {e}")
+                continue
+            print(f"{label}: {report['laps']} laps from {report['drivers']} drivers")
+            print_failures(report['failed_drivers'], indent='  ')
+            reports.append(report)
+    return reports
+
+
+def parse_years(text):
+    """'2023' -> [2023], '2021-2023' -> [2021, 2022, 2023]"""
+    start, _, end = text.partition('-')
+    return list(range(int(start), int(end or start) + 1))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build OpenF1 session tables for whole seasons")
+    parser.add_argument('--years', type=parse_years, nargs='+', required=True, help="years or ranges, e.g. 2021-2023 2025")
+    parser.add_argument('--sessions', nargs='+', default=['Race'], help="session names, e.g. Race Qualifying")
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="requests per second across all workers")
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="empty string disables the cache")
+    parser.add_argument('--store', default=STORE_ROOT)
+    parser.add_argument('--format', choices=['parquet', 'csv'], default=DEFAULT_FORMAT)
+    parser.add_argument('--countries', default=COUNTRIES_CSV)
+    parser.add_argument('--charts', metavar='DIR', help="also render the charts of every session into DIR")
+    parser.add_argument('--report', metavar='JSON', help="write the session reports, with per-stage metrics, to this file")
+    args = parser.parse_args(argv)
+
+    years = sorted({year for years in args.years for year in years})
+    reports = run_batch(years, args.sessions, workers=args.workers, rate=args.rate,
+                        cache_dir=args.cache_dir, root=args.store, format=args.format,
+                        countries_csv=args.countries, chart_dir=args.charts)
+    print(f"\nProcessed {len(reports)} sessions into {args.store}")
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2, default=str)
+        print(f"Reports saved to: {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,247 @@
+"""Persistent on-disk cache for OpenF1 responses.
+
+Responses are stored as files named by a hash of the endpoint and the
+normalized query, with a small SQLite index holding validators, sizes and
+access times. Finished sessions never change, so their entries never
+expire. Queries on session_key=latest, on sessions that have not finished
+yet and on the sessions of a season still running get a short TTL and are
+revalidated with ETag / If-Modified-Since. Whether a session has finished
+is known from the sessions responses stored so far, which record every
+session's date_end; for a session never seen, a date range filter is taken
+as a poll. The cache is bounded in size and evicts the least recently used
+entries first.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import parse_qsl, urlencode
+
+DEFAULT_CACHE_DIR = os.environ.get('OPENF1_CACHE_DIR', '.openf1_cache')
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_LATEST_TTL = 60
+
+# Results can still be corrected for a while after a session ends
+SETTLE_TIME = timedelta(hours=1)
+
+
+def normalize_query(endpoint, params):
+    """Canonical 'endpoint?query' string used as the cache key"""
+    items = sorted((str(k), str(v)) for k, v in params.items())
+    return f"{endpoint.strip('/')}?{urlencode(items)}"
+
+
+def is_volatile(params):
+    """True when the query follows a moving target.
+
+    That is session_key=latest, or a date/lap range filter such as
+    date_start>=..., which is how incremental refreshes poll for new records.
+    """
+    return any(str(v) == 'latest' or k[-1:] in '<>' for k, v in params.items())
+
+
+def is_finished(date_end, now=None):
+    """True when a session that ends at date_end (ISO8601, None if unknown) can no longer change"""
+    if not date_end:
+        return False
+    now = now or datetime.now(timezone.utc)
+    return datetime.fromisoformat(date_end) + SETTLE_TIME < now
+
+
+class CacheEntry:
+    """One cached response as read back from the index"""
+
+    def __init__(self, key, path, stored_at, ttl, etag, last_modified):
+        self.key = key
+        self.path = path
+        self.stored_at = stored_at
+        self.ttl = ttl
+        self.etag = etag
+        self.last_modified = last_modified
+
+    @property
+    def fresh(self):
+        return self.ttl is None or time.time() - self.stored_at < self.ttl
+
+    def validators(self):
+        """Conditional request headers for revalidating a stale entry"""
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.last_modified:
+            headers['If-Modified-Since'] = self.last_modified
+        return headers
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def open(self):
+        return open(self.path, 'rb')
+
+
+class ResponseCache:
+    """Size-bounded LRU cache of raw response bodies"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 latest_ttl=DEFAULT_LATEST_TTL):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.latest_ttl = latest_ttl
+        os.makedirs(os.path.join(cache_dir, 'bodies'), exist_ok=True)
+        self._lock = threading.Lock()
+        # The index may be shared by several worker processes, so wait on their locks
+        self._db = sqlite3.connect(os.path.join(cache_dir, 'index.sqlite3'), timeout=30, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY, query TEXT, size INTEGER, stored_at REAL,'
+            ' accessed_at REAL, ttl REAL, etag TEXT, last_modified TEXT)'
+        )
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS sessions (session_key INTEGER PRIMARY KEY, year INTEGER, date_end TEXT)'
+        )
+        self._db.commit()
+
+    def _key(self, endpoint, params):
+        return hashlib.sha256(normalize_query(endpoint, params).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, 'bodies', f'{key}.json')
+
+    def note_sessions(self, sessions):
+        """Remember the date_end of some session records, which sets the TTL of their queries"""
+        rows = [(session['session_key'], session.get('year'), session.get('date_end'))
+                for session in sessions if isinstance(session, dict) and 'session_key' in session]
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)', rows)
+            self._db.commit()
+
+    def ttl(self, endpoint, params):
+        """Seconds a response to this query stays fresh, or None if it never expires"""
+        values = {str(k): str(v) for k, v in params.items()}
+        if 'latest' in values.values():
+            return self.latest_ttl
+        year = values.get('year', '')
+        if endpoint.strip('/') == 'sessions' and year.isdigit():
+            # A season keeps growing until its last session has finished
+            with self._lock:
+                ends = [row[0] for row in self._db.execute('SELECT date_end FROM sessions WHERE year = ?',
+                                                           (int(year),))]
+            now = datetime.now(timezone.utc)
+            finished = int(year) < now.year and ends and all(is_finished(end, now) for end in ends)
+            return None if finished else self.latest_ttl
+        session_key = values.get('session_key', '')
+        if session_key.isdigit():
+            with self._lock:
+                row = self._db.execute(
+                    'SELECT date_end FROM sessions WHERE session_key = ?', (int(session_key),)
+                ).fetchone()
+            if row is not None:
+                return None if is_finished(row[0]) else self.latest_ttl
+        return self.latest_ttl if is_volatile(params) else None
+
+    def lookup(self, endpoint, params):
+        """Return the CacheEntry for a query (fresh or stale), or None"""
+        key = self._key(endpoint, params)
+        with self._lock:
+            row = self._db.execute(
+                'SELECT stored_at, ttl, etag, last_modified FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if not os.path.exists(self._path(key)):
+                self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+                self._db.commit()
+                return None
+            self._db.execute('UPDATE responses SET accessed_at = ? WHERE key = ?', (time.time(), key))
+            self._db.commit()
+        return CacheEntry(key, self._path(key), *row)
+
+    def store(self, endpoint, params, body, etag=None, last_modified=None):
+        """Save a response body and evict old entries if over the size limit"""
+        tmp_path = self.temp_path(endpoint, params)
+        with open(tmp_path, 'wb') as f:
+            f.write(body)
+        self.store_file(endpoint, params, tmp_path, etag, last_modified)
+
+    def temp_path(self, endpoint, params):
+        """Scratch file a streamed response is written to before store_file"""
+        return f'{self._path(self._key(endpoint, params))}.{threading.get_ident()}.tmp'
+
+    def store_file(self, endpoint, params, tmp_path, etag=None, last_modified=None):
+        """Move a fully written temp_path into the cache and index it"""
+        key = self._key(endpoint, params)
+        size = os.path.getsize(tmp_path)
+        if endpoint.strip('/') == 'sessions':
+            self._note_sessions_file(tmp_path)
+        os.replace(tmp_path, self._path(key))
+
+        ttl = self.ttl(endpoint, params)
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, normalize_query(endpoint, params), size, now, now, ttl, etag, last_modified),
+            )
+            self._db.commit()
+            self._evict()
+
+    def _note_sessions_file(self, path):
+        try:
+            with open(path, 'rb') as f:
+                sessions = json.load(f)
+        except ValueError:
+            return  # not a JSON array of sessions, e.g. an error body
+        if isinstance(sessions, list):
+            self.note_sessions(sessions)
+
+    def refresh(self, entry):
+        """Mark a stale entry as fresh again after a 304 Not Modified.
+
+        The TTL is worked out again, so a session that has finished since
+        the entry was stored stops being revalidated.
+        """
+        with self._lock:
+            row = self._db.execute('SELECT query FROM responses WHERE key = ?', (entry.key,)).fetchone()
+        ttl = entry.ttl
+        if row is not None:
+            endpoint, _, query = row[0].partition('?')
+            ttl = self.ttl(endpoint, dict(parse_qsl(query, keep_blank_values=True)))
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                'UPDATE responses SET stored_at = ?, accessed_at = ?, ttl = ? WHERE key = ?',
+                (now, now, ttl, entry.key),
+            )
+            self._db.commit()
+
+    def invalidate(self, endpoint, **params):
+        """Drop a single query from the cache"""
+        key = self._key(endpoint, params)
+        with self._lock:
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._db.commit()
+        if os.path.exists(self._path(key)):
+            os.remove(self._path(key))
+
+    def size(self):
+        """Total bytes of cached bodies"""
+        with self._lock:
+            return self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def _evict(self):
+        total = self._db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall()
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            if os.path.exists(self._path(key)):
+                os.remove(self._path(key))
+            total -= size
+        self._db.commit()
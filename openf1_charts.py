@@ -0,0 +1,309 @@
+"""Performance charts for the OpenF1 session tables.
+
+create_fastest_lap_visualization is the interactive path used by the
+scripts (pyplot, saved at dpi=300 and shown). ChartRenderer is the headless
+path for batch runs: it draws on the non-interactive Agg canvas without
+pyplot, keeps one figure per chart type and, from one session to the next,
+only updates the data of the existing artists instead of rebuilding the
+figure. render_sessions spreads stored sessions over a process pool, with
+one renderer per worker.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+from openf1_analysis import speed_by_lap_group
+from openf1_metrics import stage
+from openf1_store import DEFAULT_FORMAT, STORE_ROOT, read_partition
+
+FASTEST_LAP_FIGSIZE = (16, 12)
+SPEED_FIGSIZE = (12, 6)
+BATCH_DPI = 100
+
+PODIUM_COLOURS = ['gold', 'silver', '#CD7F32']  # P1, P2, P3 (bronze)
+
+SCATTER_LEGEND = [
+    Line2D([0], [0], marker='o', color='w', markerfacecolor='red', markersize=10, label='Podium (1-3)'),
+    Line2D([0], [0], marker='o', color='w', markerfacecolor='orange', markersize=10, label='Points (4-10)'),
+    Line2D([0], [0], marker='o', color='w', markerfacecolor='blue', markersize=10, label='No Points (11+)'),
+]
+
+# Bar panels: (value column, colour column, label format, label padding in points)
+BAR_PANELS = (
+    ('lap_duration', 'lap_colour', '{:.3f}', 1),
+    ('st_speed', 'lap_colour', '{:.0f}', 1),
+    ('final_position', 'position_colour', '{:.0f}', -10),  # inside the bar, the axis is inverted
+)
+
+
+def _chart_name(race_location):
+    return race_location.replace(' ', '_')
+
+
+def _prepare_fastest_laps(fastest_lap_data):
+    """Drivers with complete data sorted by lap time and by position.
+
+    Surnames and the colours of every panel are computed once as columns,
+    so drawing never loops over rows in Python.
+    """
+    clean_data = fastest_lap_data.dropna(subset=['lap_duration', 'st_speed', 'final_position'])
+    clean_data = clean_data.sort_values('lap_duration')
+    position = clean_data['final_position'].to_numpy(dtype=float)
+    podium = [position == 1, position == 2, position == 3]
+    clean_data = clean_data.assign(
+        surname=clean_data['full_name'].str.split().str[-1],
+        # Colors based on final position (podium finishers get special colors)
+        lap_colour=np.select(podium, PODIUM_COLOURS, 'lightblue'),
+        position_colour=np.select(podium, PODIUM_COLOURS, 'lightcoral'),
+        points_colour=np.select([position <= 3, position <= 10], ['red', 'orange'], 'blue'),
+    )
+    return clean_data, clean_data.sort_values('final_position')
+
+
+def _draw_bars(ax, data, column, colour_column, fmt, padding, **label_props):
+    x = np.arange(len(data))
+    bars = ax.bar(x, data[column].to_numpy(dtype=float), color=data[colour_column].to_numpy())
+    ax.set_xticks(x, labels=data['surname'].to_numpy(), rotation=45, ha='right')
+    return bars, ax.bar_label(bars, fmt=fmt, padding=padding, **label_props)
+
+
+def draw_fastest_laps(fig, fastest_lap_data, race_location):
+    """Draw the four fastest-lap panels on fig; returns the artists for later updates"""
+    clean_data, position_data = _prepare_fastest_laps(fastest_lap_data)
+    ax1, ax2, ax3, ax4 = fig.subplots(2, 2).flat
+    title = fig.suptitle(f'F1 Driver Performance Analysis - {race_location}', fontsize=16, fontweight='bold')
+
+    # 1. Fastest Lap Times
+    bars1, labels1 = _draw_bars(ax1, clean_data, *BAR_PANELS[0], fontsize=8)
+    ax1.set_title('Fastest Lap Times', fontweight='bold')
+    ax1.set_xlabel('Drivers')
+    ax1.set_ylabel('Lap Duration (seconds)')
+
+    # 2. Speed Trap Speeds
+    bars2, labels2 = _draw_bars(ax2, clean_data, *BAR_PANELS[1], fontsize=8)
+    ax2.set_title('Speed Trap Speeds (Fastest Lap)', fontweight='bold')
+    ax2.set_xlabel('Drivers')
+    ax2.set_ylabel('Speed (km/h)')
+
+    # 3. Final Positions
+    ax3.invert_yaxis()  # Lower position numbers at top
+    bars3, labels3 = _draw_bars(ax3, position_data, *BAR_PANELS[2], fontsize=10, fontweight='bold')
+    ax3.set_title('Final Race Positions', fontweight='bold')
+    ax3.set_xlabel('Drivers')
+    ax3.set_ylabel('Position')
+
+    # 4. Scatter: Lap Time vs Speed (colored by position)
+    points = clean_data[['lap_duration', 'st_speed']].to_numpy(dtype=float)
+    scatter = ax4.scatter(points[:, 0], points[:, 1], c=clean_data['points_colour'].to_numpy(), s=100, alpha=0.7)
+    ax4.set_title('Lap Time vs Speed Trap Speed', fontweight='bold')
+    ax4.set_xlabel('Fastest Lap Duration (seconds)')
+    ax4.set_ylabel('Speed Trap Speed (km/h)')
+    annotations = [
+        ax4.annotate(surname, point, xytext=(5, 5), textcoords='offset points', fontsize=8)
+        for surname, point in zip(clean_data['surname'].to_numpy(), points)
+    ]
+    ax4.legend(handles=SCATTER_LEGEND, loc='upper right')
+
+    return {
+        'axes': (ax1, ax2, ax3, ax4), 'title': title,
+        'bars': (bars1, bars2, bars3), 'labels': (labels1, labels2, labels3),
+        'scatter': scatter, 'annotations': annotations,
+    }
+
+
+def update_fastest_laps(artists, fastest_lap_data, race_location):
+    """Point the artists of an earlier draw_fastest_laps at another session.
+
+    Returns False when the number of drivers changed and the figure has to be
+    drawn again.
+    """
+    clean_data, position_data = _prepare_fastest_laps(fastest_lap_data)
+    if len(clean_data) != len(artists['annotations']):
+        return False
+    ax1, ax2, ax3, ax4 = artists['axes']
+    artists['title'].set_text(f'F1 Driver Performance Analysis - {race_location}')
+
+    panels = zip((ax1, ax2, ax3), (clean_data, clean_data, position_data), BAR_PANELS,
+                 artists['bars'], artists['labels'])
+    for ax, data, (column, colour_column, fmt, _), bars, labels in panels:
+        values = data[column].to_numpy(dtype=float)
+        for bar, label, value, colour in zip(bars, labels, values, data[colour_column].to_numpy()):
+            bar.set_height(value)
+            bar.set_facecolor(colour)
+            label.xy = (label.xy[0], value)
+            label.set_text(fmt.format(value))
+        ax.set_xticks(ax.get_xticks(), labels=data['surname'].to_numpy(), rotation=45, ha='right')
+        ax.relim()
+        ax.autoscale_view()
+
+    points = clean_data[['lap_duration', 'st_speed']].to_numpy(dtype=float)
+    artists['scatter'].set_offsets(points)
+    artists['scatter'].set_facecolor(clean_data['points_colour'].to_numpy())
+    for annotation, surname, point in zip(artists['annotations'], clean_data['surname'].to_numpy(), points):
+        annotation.set_text(surname)
+        annotation.xy = point
+    ax4.ignore_existing_data_limits = True
+    ax4.update_datalim(points)
+    ax4.autoscale_view()
+    return True
+
+
+def create_fastest_lap_visualization(fastest_lap_data, race_location, dpi=300, show=True):
+    """Create visualization comparing drivers' fastest laps, speeds, and positions"""
+    import matplotlib.pyplot as plt
+
+    if fastest_lap_data.dropna(subset=['lap_duration', 'st_speed', 'final_position']).empty:
+        print("No complete data available for visualization")
+        return
+
+    fig = plt.figure(figsize=FASTEST_LAP_FIGSIZE)
+    draw_fastest_laps(fig, fastest_lap_data, race_location)
+    plt.tight_layout()
+    filename = f'f1_performance_analysis_{_chart_name(race_location)}.png'
+    plt.savefig(filename, dpi=dpi, bbox_inches='tight')
+    if show:
+        plt.show()
+
+    print(f"Visualization saved as: {filename}")
+
+
+def team_colour(value):
+    """Matplotlib colour of a team_colour value, with the '#' the API leaves out; None if missing"""
+    if value is None or value != value or value == '':
+        return None
+    value = str(value)
+    return value if value.startswith('#') else f'#{value}'
+
+
+def _line_colour(datos_piloto, index):
+    # Team colour when speed_by_lap_group kept it, else the default colour cycle
+    if 'team_colour' in datos_piloto.columns:
+        colour = team_colour(datos_piloto['team_colour'].iloc[0])
+        if colour is not None:
+            return colour
+    return f'C{index % 10}'
+
+
+def draw_speed_chart(ax, speed_avg, race_location, window=5):
+    """Plot a speed_by_lap_group result, one line per driver, in team colours when it has team_colour"""
+    for line in list(ax.lines):
+        line.remove()
+    for index, (piloto, datos_piloto) in enumerate(speed_avg.groupby('full_name', observed=True, sort=False)):
+        ax.plot(datos_piloto['lap_group'], datos_piloto['st_speed'], marker='o', markersize=4,
+                linewidth=1.3, label=piloto.split()[-1], color=_line_colour(datos_piloto, index))
+    ax.set_xlabel(f"Vuelta (inicio de grupo de {window})")
+    ax.set_ylabel("Velocidad promedio (km/h)")
+    ax.set_title(f"Velocidades promedio cada {window} vueltas - {race_location}")
+    ax.grid(True)
+    ax.legend()
+
+
+def update_speed_chart(ax, speed_avg, race_location, window=5):
+    """Reuse the existing driver lines of draw_speed_chart for another session"""
+    groups = list(speed_avg.groupby('full_name', observed=True, sort=False))
+    lines = ax.lines
+    for index, (piloto, datos_piloto) in enumerate(groups):
+        if index < len(lines):
+            lines[index].set_data(datos_piloto['lap_group'].to_numpy(dtype=float),
+                                  datos_piloto['st_speed'].to_numpy(dtype=float))
+            lines[index].set_label(piloto.split()[-1])
+            lines[index].set_color(_line_colour(datos_piloto, index))
+        else:
+            ax.plot(datos_piloto['lap_group'], datos_piloto['st_speed'], marker='o', markersize=4,
+                    linewidth=1.3, label=piloto.split()[-1], color=_line_colour(datos_piloto, index))
+    for line in list(lines[len(groups):]):
+        line.remove()
+    ax.set_title(f"Velocidades promedio cada {window} vueltas - {race_location}")
+    ax.relim()
+    ax.autoscale_view()
+    ax.legend()
+
+
+class ChartRenderer:
+    """Headless renderer that keeps its figures alive across sessions"""
+
+    def __init__(self, output_dir='.', dpi=BATCH_DPI, tight=False):
+        os.makedirs(output_dir, exist_ok=True)
+        self.output_dir = output_dir
+        self.dpi = dpi
+        # bbox_inches='tight' renders every figure twice, so batch runs skip it by default
+        self.bbox_inches = 'tight' if tight else None
+        self._fastest_fig = None
+        self._fastest_artists = None
+        self._speed_fig = None
+
+    def _save(self, fig, filename):
+        path = os.path.join(self.output_dir, filename)
+        fig.savefig(path, dpi=self.dpi, bbox_inches=self.bbox_inches)
+        return path
+
+    def fastest_laps(self, fastest_lap_data, race_location, name=None):
+        """Render the fastest-lap panels for one session; returns the file path or None"""
+        if fastest_lap_data.dropna(subset=['lap_duration', 'st_speed', 'final_position']).empty:
+            return None
+        if self._fastest_fig is None:
+            self._fastest_fig = Figure(figsize=FASTEST_LAP_FIGSIZE)
+            FigureCanvasAgg(self._fastest_fig)
+        if self._fastest_artists is None or not update_fastest_laps(self._fastest_artists, fastest_lap_data,
+                                                                    race_location):
+            self._fastest_fig.clear()
+            self._fastest_artists = draw_fastest_laps(self._fastest_fig, fastest_lap_data, race_location)
+            self._fastest_fig.tight_layout()
+        return self._save(self._fastest_fig, f'f1_performance_analysis_{_chart_name(name or race_location)}.png')
+
+    def speed(self, speed_avg, race_location, window=5, name=None):
+        """Render the lap-group speed chart for one session; returns the file path or None"""
+        if speed_avg.empty:
+            return None
+        if self._speed_fig is None:
+            self._speed_fig = Figure(figsize=SPEED_FIGSIZE)
+            FigureCanvasAgg(self._speed_fig)
+            draw_speed_chart(self._speed_fig.add_subplot(), speed_avg, race_location, window)
+            self._speed_fig.tight_layout()
+        else:
+            update_speed_chart(self._speed_fig.axes[0], speed_avg, race_location, window)
+        return self._save(self._speed_fig, f'f1_speed_{window}lap_avg_{_chart_name(name or race_location)}.png')
+
+
+def render_stored_session(renderer, year, meeting_key, session_key, root=STORE_ROOT, format=DEFAULT_FORMAT,
+                          name=None, window=5):
+    """Render both charts of one stored session; returns the written paths"""
+    with stage('read'):
+        fastest_df = read_partition('fastest_laps', year, meeting_key, session_key, root, format)
+        merged_df = read_partition('merged', year, meeting_key, session_key, root, format)
+    if merged_df is None or merged_df.empty:
+        return []
+    race_location = str(merged_df['race_location'].iloc[0])
+    name = name or f'{race_location}_{year}_{session_key}'
+    paths = []
+    with stage('render'):
+        if fastest_df is not None:
+            paths.append(renderer.fastest_laps(fastest_df, race_location, name=name))
+        keep = ('team_colour',) if 'team_colour' in merged_df.columns else ()
+        speed_avg = speed_by_lap_group(merged_df, window=window, keep=keep)
+        paths.append(renderer.speed(speed_avg, race_location, window, name=name))
+    return [path for path in paths if path]
+
+
+_worker_renderer = None
+
+
+def _init_render_worker(output_dir, dpi):
+    global _worker_renderer
+    _worker_renderer = ChartRenderer(output_dir, dpi)
+
+
+def _render_partition(partition, root, format):
+    return render_stored_session(_worker_renderer, *partition, root=root, format=format)
+
+
+def render_sessions(partitions, workers=None, output_dir='.', dpi=BATCH_DPI, root=STORE_ROOT, format=DEFAULT_FORMAT):
+    """Render stored sessions, given as (year, meeting_key, session_key), across a process pool"""
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_render_worker,
+                             initargs=(output_dir, dpi)) as pool:
+        results = pool.map(_render_partition, partitions, [root] * len(partitions), [format] * len(partitions))
+        return [path for paths in results for path in paths]
@@ -0,0 +1,204 @@
+"""Command line entry point for the OpenF1 session pipeline.
+
+Every stage of the pipeline is a subcommand working on one session. The
+stages hand their results over through the response cache and the table
+store, so they can be run one at a time or all together with `run`:
+
+    python openf1_cli.py fetch --country Singapore --year 2023      # download into the cache
+    python openf1_cli.py clean --session-key 9165                   # typed drivers/laps/positions tables
+    python openf1_cli.py merge --session-key 9165                   # merged lap table
+    python openf1_cli.py summarize --session-key 9165               # fastest lap of every driver
+    python openf1_cli.py plot --session-key 9165 --charts-dir charts
+    python openf1_cli.py run --country Singapore --year 2023 --charts
+
+The session is chosen with --session-key (default latest) or with
+--country/--year/--session, resolved through a SessionIndex: one request
+for the whole year, and the record found is handed to the stages so they
+never look the session up again. Stages import what they need when they run:
+fetch never loads pandas, and matplotlib is only imported by plot and by
+run --charts. --report writes the per-stage timings, bytes, records and
+cache hits of the run as JSON (see openf1_metrics).
+
+`pip install -e .` installs the same commands as `openf1`, e.g.
+`openf1 run --session-key 9165`.
+"""
+import argparse
+import os
+from importlib.util import find_spec
+
+from openf1_cache import DEFAULT_CACHE_DIR, ResponseCache
+from openf1_fetch import DEFAULT_RATE, DEFAULT_WORKERS, OpenF1Fetcher
+from openf1_index import SessionIndex
+from openf1_metrics import Metrics, stage
+from openf1_session import fetch_session
+
+# Same defaults as openf1_store.STORE_ROOT/DEFAULT_FORMAT, without importing the store (and pandas) up front
+STORE_ROOT = os.environ.get('OPENF1_STORE_DIR', 'f1_store')
+DEFAULT_FORMAT = 'parquet' if find_spec('pyarrow') else 'csv'
+
+
+def make_fetcher(args):
+    cache = ResponseCache(args.cache_dir) if args.cache_dir else None
+    return OpenF1Fetcher(max_workers=args.workers, rate=args.rate, cache=cache)
+
+
+def select_session(fetcher, args):
+    """Session record picked by --session-key or by --country/--year/--session"""
+    if args.country and args.year:
+        with stage('session'):
+            session = SessionIndex(fetcher).find(args.country, args.session, args.year)
+        if session is None:
+            raise SystemExit(f"No {args.session} session found for {args.country} {args.year}")
+    else:
+        if args.country:
+            params = {'country_name': args.country, 'session_name': args.session}
+        else:
+            params = {'session_key': args.session_key}
+        with stage('session'):
+            sessions = fetcher.get('sessions', **params)
+        if not sessions:
+            raise SystemExit(f"No session found for {params}")
+        # Without a year the most recent matching session is used
+        session = sessions[-1]
+    print(f"Session {session['session_key']}: {session.get('location')} {session.get('session_name')} {session.get('year')}")
+    return session
+
+
+def _partition(session):
+    from openf1_store import PARTITION_KEYS
+
+    return [session[key] for key in PARTITION_KEYS]
+
+
+def _stored(table, session, args):
+    from openf1_store import read_partition
+
+    df = read_partition(table, *_partition(session), root=args.store, format=args.format)
+    if df is None:
+        raise SystemExit(f"No stored {table} table for session {session['session_key']}, run the previous stage first")
+    return df
+
+
+def _print_paths(paths):
+    for table, path in paths.items():
+        print(f"{table} saved to: {path}")
+
+
+def fetch(fetcher, session, args):
+    """Download the session's responses into the response cache"""
+    if fetcher.cache is None:
+        print("The cache is disabled, fetched data will not be kept")
+    rows = fetch_session(fetcher, session['session_key'], session=session)
+    print(f"Fetched {len(rows['drivers'])} drivers, {len(rows['laps'])} laps, "
+          f"{len(rows['positions'])} final positions")
+    for table, errors in rows['errors'].items():
+        for driver_number, error in sorted(errors.items()):
+            print(f"No {table} for driver {driver_number}: {error}")
+
+
+def clean(fetcher, session, args):
+    """Project the responses into typed drivers, laps and positions tables"""
+    from openf1_pipeline import failed_drivers, load_session, print_failures
+    from openf1_store import write_session
+
+    tables = load_session(fetcher, session['session_key'], session=session)
+    raw = {name: tables[name] for name in ('drivers', 'laps', 'positions')}
+    with stage('write'):
+        paths = write_session(raw, *_partition(session), root=args.store, format=args.format)
+    _print_paths(paths)
+    print_failures(failed_drivers(tables['errors']))
+
+
+def merge(fetcher, session, args):
+    """Join driver info and final positions onto the stored laps"""
+    from openf1_pipeline import merge_session
+    from openf1_store import read_partition, write_table
+
+    with stage('read'):
+        laps_df, drivers_df = _stored('laps', session, args), _stored('drivers', session, args)
+        positions_df = read_partition('positions', *_partition(session), root=args.store, format=args.format)
+    with stage('merge'):
+        merged_df = merge_session(laps_df, drivers_df, positions_df, session.get('location'))
+    with stage('write'):
+        path = write_table(merged_df, 'merged', *_partition(session), root=args.store, format=args.format)
+    print(f"merged saved to: {path}")
+
+
+def summarize(fetcher, session, args):
+    """Fastest lap of every driver from the stored merged table"""
+    from openf1_pipeline import fastest_lap_summary
+    from openf1_store import write_table
+
+    with stage('read'):
+        merged_df = _stored('merged', session, args)
+    with stage('summary'):
+        summary = fastest_lap_summary(merged_df)
+    print(summary)
+    with stage('write'):
+        path = write_table(summary, 'fastest_laps', *_partition(session), root=args.store, format=args.format)
+    print(f"fastest_laps saved to: {path}")
+
+
+def plot(fetcher, session, args):
+    """Render the charts of the stored session"""
+    from openf1_charts import ChartRenderer, render_stored_session
+
+    renderer = ChartRenderer(args.charts_dir, dpi=args.dpi)
+    for path in render_stored_session(renderer, *_partition(session), root=args.store, format=args.format):
+        print(f"Chart saved as: {path}")
+
+
+def run(fetcher, session, args):
+    """All stages in one go"""
+    from openf1_pipeline import print_failures, process_session
+
+    report = process_session(fetcher, session['session_key'], root=args.store, format=args.format, session=session)
+    _print_paths(report['paths'])
+    print_failures(report['failed_drivers'])
+    if args.charts:
+        plot(fetcher, session, args)
+
+
+STAGES = {'fetch': fetch, 'clean': clean, 'merge': merge, 'summarize': summarize, 'plot': plot, 'run': run}
+
+
+def build_parser():
+    common = argparse.ArgumentParser(add_help=False)
+    selector = common.add_argument_group('session')
+    selector.add_argument('--session-key', default='latest')
+    selector.add_argument('--country', help="country name, instead of --session-key")
+    selector.add_argument('--year', type=int)
+    selector.add_argument('--session', default='Race', help="session name used with --country")
+    common.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="concurrent requests")
+    common.add_argument('--rate', type=float, default=DEFAULT_RATE, help="requests per second")
+    common.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help="empty string disables the cache")
+    common.add_argument('--store', default=STORE_ROOT)
+    common.add_argument('--format', choices=['parquet', 'csv'], default=DEFAULT_FORMAT)
+    common.add_argument('--charts-dir', default='.')
+    common.add_argument('--dpi', type=int, default=100)
+    common.add_argument('--report', metavar='JSON', help="write per-stage metrics of the run to this file")
+    common.add_argument('--profile', metavar='PROF', help="also profile the run with cProfile into this file")
+    common.add_argument('--trace-memory', action='store_true', help="track peak memory per stage with tracemalloc")
+
+    parser = argparse.ArgumentParser(description="OpenF1 session pipeline")
+    stages = parser.add_subparsers(dest='stage', required=True)
+    for name, stage in STAGES.items():
+        sub = stages.add_parser(name, parents=[common], help=stage.__doc__)
+        if name == 'run':
+            sub.add_argument('--charts', action='store_true', help="also render the charts")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    metrics = Metrics(trace_memory=args.trace_memory, profile=args.profile)
+    with metrics.recording():
+        fetcher = make_fetcher(args)
+        STAGES[args.stage](fetcher, select_session(fetcher, args), args)
+    if args.report:
+        metrics.write(args.report)
+        print(f"Metrics saved to: {args.report}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,334 @@
+"""Shared fetch engine for the OpenF1 API.
+
+The per-driver laps/position requests used to run one blocking urlopen at a
+time. OpenF1Fetcher runs them concurrently on a thread pool and paces every
+request through a token bucket so a whole session stays under the API limits.
+Requests go through a pooled keep-alive HTTPSession that retries 429/5xx
+answers with backoff. With a ResponseCache attached, repeated queries are
+served from disk.
+
+Large responses are decoded incrementally: iter_records yields one record at
+a time straight from the socket, so peak memory follows the records kept by
+the caller instead of the raw body, its decoded text and the parsed list.
+"""
+import codecs
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+import openf1_metrics
+from openf1_http import DEFAULT_RETRIES, HTTPSession
+
+# OPENF1_API_URL points the scripts at a mirror or a local stub server
+API_URL = os.environ.get('OPENF1_API_URL', 'https://api.openf1.org/v1')
+
+# OpenF1 allows 3 requests per second on the free tier
+DEFAULT_RATE = 3.0
+DEFAULT_WORKERS = 8
+CHUNK_SIZE = 64 * 1024
+
+_SEPARATORS = ' \t\r\n,'
+
+
+def iter_json_array(stream, chunk_size=CHUNK_SIZE):
+    """Yield the elements of a top-level JSON array read from a binary stream.
+
+    Only the undecoded tail of the stream is buffered, never the whole body.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer, pos, eof, started = '', 0, False, False
+    while True:
+        while pos < len(buffer) and buffer[pos] in _SEPARATORS:
+            pos += 1
+        if pos < len(buffer):
+            if not started:
+                if buffer[pos] != '[':
+                    raise ValueError(f"Expected a JSON array, got {buffer[pos:pos + 80]!r}")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == ']':
+                return
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                end = None
+            # A value ending exactly at the buffer edge may continue in the next chunk, and a number
+            # can also stop short of its '.', exponent or sign: it needs a separator or ']' after it
+            if end is not None and (eof or end < len(buffer) and (
+                    buffer[end] in _SEPARATORS or buffer[end] == ']' or not isinstance(value, (int, float)))):
+                yield value
+                pos = end
+                continue
+        if eof:
+            raise ValueError("Truncated JSON array in response")
+        chunk = stream.read(chunk_size)
+        eof = not chunk
+        buffer = buffer[pos:] + utf8.decode(chunk, final=eof)
+        pos = 0
+
+
+def _counted(records):
+    """Pass records through, adding how many there were to the active metrics"""
+    n = 0
+    try:
+        for record in records:
+            n += 1
+            yield record
+    finally:
+        openf1_metrics.count(records=n)
+
+
+class _CountingReader:
+    """File-like wrapper counting the bytes read from a stream"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes += len(data)
+        return data
+
+
+class _TeeReader:
+    """File-like wrapper copying everything read from a stream into another file"""
+
+    def __init__(self, stream, copy):
+        self.stream = stream
+        self.copy = copy
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.copy.write(data)
+        return data
+
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._state = [self.capacity, time.monotonic()]  # tokens, last refill
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it"""
+        if not self.rate:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                tokens = min(self.capacity, self._state[0] + (now - self._state[1]) * self.rate)
+                self._state[1] = now
+                if tokens >= 1:
+                    self._state[0] = tokens - 1
+                    return
+                self._state[0] = tokens
+                wait = (1 - tokens) / self.rate
+            time.sleep(wait)
+
+
+class SharedTokenBucket(TokenBucket):
+    """Token bucket kept in shared memory so worker processes share one budget.
+
+    Hand it to the workers at start-up (Process args or a pool initializer).
+    context defaults to the multiprocessing module, imported only here since
+    single-process runs never need it.
+    """
+
+    def __init__(self, rate, capacity=None, context=None):
+        if context is None:
+            import multiprocessing as context
+        super().__init__(rate, capacity)
+        self._state = context.Array('d', self._state, lock=False)
+        self._lock = context.Lock()
+
+
+class OpenF1Fetcher:
+    """Concurrent, rate-limited client for the OpenF1 endpoints"""
+
+    def __init__(self, base_url=API_URL, max_workers=DEFAULT_WORKERS, rate=DEFAULT_RATE,
+                 burst=None, timeout=30, cache=None, limiter=None, retries=DEFAULT_RETRIES, session=None):
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache
+        self.max_workers = max_workers
+        self.timeout = timeout
+        # Pass a SharedTokenBucket as limiter to share one budget across processes
+        self.limiter = limiter if limiter is not None else TokenBucket(rate, burst)
+        # One connection per worker thread is kept alive; retries are paced by the limiter too
+        self.session = session if session is not None else HTTPSession(
+            timeout, retries, pool_size=max_workers, limiter=self.limiter
+        )
+
+    def url(self, endpoint, params):
+        """Build the request URL for an endpoint and its query parameters"""
+        # Keep comparison operators readable: {'date_start>': t} is sent as date_start>=t
+        query = urlencode(params, safe='<>')
+        return f'{self.base_url}/{endpoint}?{query}' if query else f'{self.base_url}/{endpoint}'
+
+    def get(self, endpoint, **params):
+        """Fetch one endpoint and return the decoded JSON records"""
+        records = json.loads(self.get_bytes(endpoint, **params).decode('utf-8'))
+        openf1_metrics.count(records=len(records))
+        return records
+
+    def get_bytes(self, endpoint, **params):
+        """Fetch one endpoint and return the raw response body"""
+        entry = self.cache.lookup(endpoint, params) if self.cache is not None else None
+        if entry is not None and entry.fresh:
+            try:
+                body = entry.read()
+            except OSError:
+                entry = None  # evicted by another thread in the meantime
+            else:
+                openf1_metrics.count(cache_hits=1)
+                return body
+
+        with self.session.open(self.url(endpoint, params), entry.validators() if entry else None) as response:
+            if response.status == 304 and entry is not None:
+                openf1_metrics.count(cache_hits=1)
+                self.cache.refresh(entry)
+                return entry.read()
+            body = response.read()
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+        openf1_metrics.count(bytes=len(body), cache_misses=int(self.cache is not None))
+
+        if self.cache is not None:
+            self.cache.store(endpoint, params, body, etag=etag, last_modified=last_modified)
+        return body
+
+    def iter_records(self, endpoint, **params):
+        """Stream the records of one endpoint as they are decoded.
+
+        A cached body is streamed from its file; a downloaded one is copied
+        to the cache while it is decoded and only indexed once complete.
+        """
+        return _counted(self._iter_records(endpoint, params))
+
+    def _iter_records(self, endpoint, params):
+        entry = self.cache.lookup(endpoint, params) if self.cache is not None else None
+        if entry is not None and entry.fresh:
+            try:
+                cached = entry.open()
+            except OSError:
+                entry = None  # evicted by another thread in the meantime
+            else:
+                openf1_metrics.count(cache_hits=1)
+                with cached:
+                    yield from iter_json_array(cached)
+                return
+
+        response = self.session.open(self.url(endpoint, params), entry.validators() if entry else None)
+        if response.status == 304 and entry is not None:
+            response.close()
+            openf1_metrics.count(cache_hits=1)
+            self.cache.refresh(entry)
+            with entry.open() as cached:
+                yield from iter_json_array(cached)
+            return
+
+        counted = _CountingReader(response)
+        with response:
+            if self.cache is None:
+                try:
+                    yield from iter_json_array(counted)
+                    counted.read()  # the tail after ']', so the connection can be reused
+                finally:
+                    openf1_metrics.count(bytes=counted.bytes)
+                return
+            openf1_metrics.count(cache_misses=1)
+            tmp_path = self.cache.temp_path(endpoint, params)
+            complete = False
+            try:
+                with open(tmp_path, 'wb') as copy:
+                    tee = _TeeReader(counted, copy)
+                    yield from iter_json_array(tee)
+                    tee.read()
+                complete = True
+            finally:
+                openf1_metrics.count(bytes=counted.bytes)
+                if complete:
+                    self.cache.store_file(endpoint, params, tmp_path,
+                                          etag=response.headers.get('ETag'),
+                                          last_modified=response.headers.get('Last-Modified'))
+                elif os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+    def get_many(self, calls):
+        """Run (endpoint, params) calls concurrently.
+
+        Returns a list of (records, error) pairs in the same order as calls;
+        exactly one of the two is None for every call.
+        """
+        def run(call):
+            endpoint, params = call
+            try:
+                return self.get(endpoint, **params), None
+            except Exception as e:
+                return None, e
+
+        calls = list(calls)
+        if not calls:
+            return []
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(calls))) as pool:
+            return list(pool.map(run, calls))
+
+    def get_per_driver(self, endpoint, session_key, driver_numbers, transform=None, **params):
+        """Fetch an endpoint once per driver, concurrently.
+
+        Returns (results, errors): dicts keyed by driver_number holding the
+        records (passed through transform, if given) or the exception raised
+        for that driver.
+        """
+        driver_numbers = list(driver_numbers)
+        calls = [
+            (endpoint, {'session_key': session_key, 'driver_number': driver_number, **params})
+            for driver_number in driver_numbers
+        ]
+        results, errors = {}, {}
+        for driver_number, (records, error) in zip(driver_numbers, self.get_many(calls)):
+            if error is not None:
+                errors[driver_number] = error
+            elif transform is None:
+                results[driver_number] = records
+            else:
+                results[driver_number] = [transform(record) for record in records]
+        return results, errors
+
+    def get_session_bulk(self, endpoint, session_key, driver_numbers, transform=None, **params):
+        """Fetch an endpoint once for the whole session and split it by driver.
+
+        Records are streamed and passed through transform (if given) as they
+        are decoded, so only the transformed records are kept. Returns the
+        same (results, errors) pair as get_per_driver. Drivers missing from
+        the bulk response (the API cut it short) and every driver when the
+        bulk request fails are fetched one by one instead.
+        """
+        driver_numbers = list(driver_numbers)
+        results = {driver_number: [] for driver_number in driver_numbers}
+        try:
+            for record in self.iter_records(endpoint, session_key=session_key, **params):
+                records = results.get(record.get('driver_number'))
+                if records is not None:
+                    records.append(record if transform is None else transform(record))
+        except Exception as e:
+            print(f"Bulk {endpoint} request failed ({e}), falling back to per-driver requests")
+            return self.get_per_driver(endpoint, session_key, driver_numbers, transform, **params)
+
+        missing = [driver_number for driver_number in driver_numbers if not results[driver_number]]
+        errors = {}
+        if missing:
+            print(f"Bulk {endpoint} response has no records for {len(missing)} drivers, fetching them individually")
+            retried, errors = self.get_per_driver(endpoint, session_key, missing, transform, **params)
+            results.update(retried)
+            for driver_number in errors:
+                del results[driver_number]
+        return results, errors
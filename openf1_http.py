@@ -0,0 +1,206 @@
+"""Pooled keep-alive HTTP client used by OpenF1Fetcher.
+
+urlopen opens a new TCP (and TLS) connection for every request, so a
+session of 40+ requests paid 40+ handshakes. HTTPSession keeps a small pool
+of persistent http.client connections per host and hands them out to the
+fetcher threads. Responses are requested gzip-compressed and decompressed
+while they are read, so streaming decoding keeps working.
+
+Requests answered with 429 or a 5xx status, and requests that fail to
+connect, are retried a bounded number of times with exponential backoff and
+full jitter, honouring Retry-After. Requests that still fail raise
+RequestFailed, which records the status and the number of attempts so
+callers can report the failure instead of dropping it.
+"""
+import gzip
+import http.client
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import openf1_metrics
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+DEFAULT_RETRIES = 4
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+DEFAULT_POOL_SIZE = 8
+
+# Connection-level failures (refused, reset, timed out, malformed response) worth another attempt
+RETRY_ERRORS = (OSError, http.client.HTTPException)
+
+
+class RequestFailed(Exception):
+    """A request that failed for good, after its retries if it was retryable"""
+
+    def __init__(self, url, status=None, reason=None, attempts=1):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.attempts = attempts
+        detail = f'HTTP {status} {reason}' if status is not None else reason
+        super().__init__(f"{detail} for {url} ({attempts} attempt{'s' if attempts != 1 else ''})")
+
+
+def describe_error(error):
+    """Structured summary of a fetch error, for reports and logs"""
+    return {
+        'error': type(error).__name__,
+        'status': getattr(error, 'status', None),
+        'attempts': getattr(error, 'attempts', 1),
+        'message': str(error),
+    }
+
+
+class PooledResponse:
+    """Readable response body that gives its connection back to the pool when done.
+
+    The connection is only reused if the body was read to the end; a
+    response closed half-way closes its connection instead.
+    """
+
+    def __init__(self, pool, connection, response):
+        self.status = response.status
+        self.headers = response.headers
+        self._pool = pool
+        self._connection = connection
+        self._response = response
+        gzipped = response.headers.get('Content-Encoding', '').lower() == 'gzip'
+        self._body = gzip.GzipFile(fileobj=response) if gzipped else response
+
+    def read(self, size=-1):
+        # HTTPResponse.read(-1) would wait for the server to close a keep-alive connection
+        return self._body.read() if size is None or size < 0 else self._body.read(size)
+
+    def close(self):
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        if self._response.isclosed():
+            self._pool.put(connection)
+        else:
+            self._response.close()
+            connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Idle keep-alive connections to one host"""
+
+    def __init__(self, scheme, host, timeout, size=DEFAULT_POOL_SIZE):
+        self.connection_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        self.host = host
+        self.timeout = timeout
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def get(self):
+        """(connection, reused) with an idle connection if there is one"""
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True
+        return self.connection_class(self.host, timeout=self.timeout), False
+
+    def put(self, connection):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+
+class HTTPSession:
+    """Keep-alive GET client with gzip, timeouts and bounded retries"""
+
+    def __init__(self, timeout=30, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, max_backoff=MAX_BACKOFF,
+                 pool_size=DEFAULT_POOL_SIZE, limiter=None):
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_size = pool_size
+        # Every attempt, retries included, takes a token from the limiter
+        self.limiter = limiter
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _pool(self, scheme, host):
+        with self._lock:
+            pool = self._pools.get((scheme, host))
+            if pool is None:
+                pool = self._pools[(scheme, host)] = ConnectionPool(scheme, host, self.timeout, self.pool_size)
+            return pool
+
+    def delay(self, attempt, retry_after=None):
+        """Seconds to wait before retry number `attempt` (1-based)"""
+        if retry_after is not None:
+            try:
+                return min(self.max_backoff, float(retry_after))
+            except ValueError:
+                pass  # HTTP-date form, fall back to backoff
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+    def open(self, url, headers=None):
+        """GET url and return a PooledResponse with a 2xx or 304 status.
+
+        Raises RequestFailed for any other status, and for retryable
+        failures once the retries are used up.
+        """
+        parts = urlsplit(url)
+        pool = self._pool(parts.scheme, parts.netloc)
+        target = f'{parts.path or "/"}?{parts.query}' if parts.query else parts.path or '/'
+        headers = {'Accept-Encoding': 'gzip', **(headers or {})}
+
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.limiter is not None:
+                self.limiter.acquire()
+            connection, reused = pool.get()
+            openf1_metrics.count(requests=1)
+            try:
+                connection.request('GET', target, headers=headers)
+                response = connection.getresponse()
+            except RETRY_ERRORS as e:
+                connection.close()
+                if reused:
+                    # The server dropped an idle keep-alive connection; try again on a new one
+                    attempt -= 1
+                    continue
+                if attempt > self.retries:
+                    raise RequestFailed(url, reason=str(e) or type(e).__name__, attempts=attempt) from e
+                openf1_metrics.count(retries=1)
+                time.sleep(self.delay(attempt))
+                continue
+
+            if response.status == 304:
+                response.read()  # no body, but lets the connection go back to the pool
+            if 200 <= response.status < 300 or response.status == 304:
+                return PooledResponse(pool, connection, response)
+            retry_after = response.headers.get('Retry-After')
+            response.read()  # drain the body so the connection can be reused
+            pool.put(connection)
+            if response.status not in RETRY_STATUSES or attempt > self.retries:
+                raise RequestFailed(url, response.status, response.reason, attempt)
+            openf1_metrics.count(retries=1)
+            time.sleep(self.delay(attempt, retry_after))
+
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            pools = list(self._pools.values())
+        for pool in pools:
+            pool.close()
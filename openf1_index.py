@@ -0,0 +1,103 @@
+"""In-memory index of sessions and meetings, seeded from Countries.csv.
+
+Resolving a (country, session type, year) to its session_key used to take
+one /v1/sessions query per combination, and often a second one by
+session_key just to read the location. A SessionIndex instead pulls every
+session of a year in one /v1/sessions?year= request, the first time that
+year is needed, and answers every later lookup from memory: session_key,
+meeting, location and date range. With the response cache on, the yearly
+pull of a finished season is only made once across runs; the current
+season's is revalidated after the cache's short TTL, so sessions added or
+updated since are picked up.
+
+    index = SessionIndex(fetcher)
+    session = index.find('Singapore', 'Race', 2023)
+    session['session_key'], session['location'], session['date_start'], session['date_end']
+
+Countries.csv lists some races by name rather than by country (Miami, Las
+Vegas, ...), so each row also matches on its circuit, which is the OpenF1
+location of those races.
+"""
+import csv
+import os
+
+COUNTRIES_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Countries.csv')
+
+
+def read_circuits(path=COUNTRIES_CSV):
+    """(country, circuit) pairs listed in Countries.csv"""
+    with open(path, newline='', encoding='utf-8') as f:
+        return [(row['Country'], row['Circuit']) for row in csv.DictReader(f)]
+
+
+def _name(value):
+    return (value or '').casefold()
+
+
+class SessionIndex:
+    """Sessions of the years pulled so far, looked up by country, circuit or key"""
+
+    def __init__(self, fetcher, circuits=None):
+        self.fetcher = fetcher
+        self.circuits = read_circuits() if circuits is None else list(circuits)
+        # Countries.csv row -> circuit, so a country name also finds its circuit
+        self._circuit_of = {_name(country): _name(circuit) for country, circuit in self.circuits}
+        self._years = {}
+        self._by_key = {}
+        # (year, country or location, session name) -> last session record
+        self._lookup = {}
+
+    def load_year(self, year):
+        """Sessions of one year, pulled in a single request the first time"""
+        sessions = self._years.get(year)
+        if sessions is None:
+            sessions = self._years[year] = self.fetcher.get('sessions', year=year)
+            for session in sessions:
+                self._by_key[session['session_key']] = session
+                for name in (session.get('country_name'), session.get('location')):
+                    self._lookup[(year, _name(name), _name(session.get('session_name')))] = session
+        return sessions
+
+    def session(self, session_key):
+        """Session record of a key from an already pulled year, or None"""
+        return self._by_key.get(session_key)
+
+    def find(self, country, session_name='Race', year=None):
+        """Session record of a country (or Countries.csv circuit), session type and year, or None.
+
+        Without a year the most recent year already pulled that has a match
+        is used; if none has, nothing is pulled and None is returned.
+        """
+        names = [_name(country)]
+        if _name(country) in self._circuit_of:
+            names.append(self._circuit_of[_name(country)])
+        years = [year] if year is not None else sorted(self._years, reverse=True)
+        for candidate_year in years:
+            self.load_year(candidate_year)
+            for name in names:
+                session = self._lookup.get((candidate_year, name, _name(session_name)))
+                if session is not None:
+                    return session
+        return None
+
+    def meeting(self, meeting_key):
+        """Every pulled session of a meeting, in date order"""
+        sessions = [session for session in self._by_key.values() if session.get('meeting_key') == meeting_key]
+        return sorted(sessions, key=lambda session: session.get('date_start') or '')
+
+    def sessions(self, years, session_names):
+        """Session records of every Countries.csv row for the given years and session types.
+
+        Returns (sessions, missing): the records found, and the
+        (country, session_name, year) combinations without one.
+        """
+        found, missing = [], []
+        for year in years:
+            for session_name in session_names:
+                for country, _ in self.circuits:
+                    session = self.find(country, session_name, year)
+                    if session is None:
+                        missing.append((country, session_name, year))
+                    else:
+                        found.append(session)
+        return found, missing
@@ -0,0 +1,236 @@
+"""Live mode: follow a running session and update its charts in place.
+
+An asyncio loop polls the session (session_key=latest by default) every few
+seconds. Each poll asks only for the laps started since the oldest lap still
+in progress and for the position samples since the last one seen, and folds
+them into in-memory trackers (see openf1_tracker): the fastest lap and
+sectors of every driver, the 5-lap speed averages and the latest position.
+A poll therefore costs what it brings, not the whole session so far.
+
+The fastest-lap and speed charts are drawn once and then only get new
+artist data (bar heights, label text, scatter offsets, line data), through
+the same update functions the batch renderer uses. Interactive windows are
+kept responsive while waiting; with --charts-dir the figures are saved
+headless after every update instead.
+
+    python openf1_live.py                         # session_key=latest, every 5 s
+    python openf1_live.py --interval 3 --charts-dir live_charts
+"""
+import argparse
+import asyncio
+import time
+
+from openf1_fetch import DEFAULT_RATE, OpenF1Fetcher
+from openf1_schema import DRIVERS, POSITIONS
+from openf1_session import DRIVER_FIELDS_TO_REMOVE, STALE_LAP, api_date, parse_date, last_positions
+from openf1_tracker import FastestLapTracker, LapGroupSpeeds
+
+DEFAULT_INTERVAL = 5.0
+
+
+class LiveSession:
+    """In-memory state of a followed session, fed only what every poll brings"""
+
+    def __init__(self, fetcher, session_key='latest', window=5):
+        self.fetcher = fetcher
+        self.session_key = session_key
+        self.session = None
+        self.drivers = []
+        self.drivers_df = None
+        self.tracker = FastestLapTracker()
+        self.speeds = LapGroupSpeeds(window)
+        # driver_number -> (date_start, completed) of the latest lap seen
+        self.latest_laps = {}
+        # (driver_number, lap_number) -> lap_duration seen, to tell new data from laps fetched again
+        self._lap_durations = {}
+        # driver_number -> POSITIONS row of the latest sample seen
+        self.positions = {}
+        self.position_cursor = None
+
+    def start(self):
+        """Resolve the session and load its drivers, once"""
+        sessions = self.fetcher.get('sessions', session_key=self.session_key)
+        if not sessions:
+            raise ValueError(f"No session found for session_key={self.session_key}")
+        self.session = sessions[0]
+        # From here on the actual key is used, so a new session starting elsewhere does not mix in
+        self.session_key = self.session['session_key']
+        self.drivers = self.fetcher.get('drivers', session_key=self.session_key)
+        self.drivers_df = None
+
+    def lap_cursor(self):
+        """Start of the oldest lap that may still change, or None before the first poll"""
+        if not self.latest_laps:
+            return None
+        newest = max(date_start for date_start, _ in self.latest_laps.values())
+        open_laps = [date_start for date_start, completed in self.latest_laps.values()
+                     if not completed and date_start > newest - STALE_LAP]
+        return min(open_laps) if open_laps else newest
+
+    def poll(self):
+        """Fetch and fold in the new laps and position samples; returns how many were new or updated"""
+        if self.session is None:
+            self.start()
+        params = {}
+        cursor = self.lap_cursor()
+        if cursor is not None:
+            params['date_start>'] = api_date(cursor)
+        new_laps = 0
+        for record in self.fetcher.iter_records('laps', session_key=self.session_key, **params):
+            key = (record['driver_number'], record['lap_number'])
+            if key in self._lap_durations and self._lap_durations[key] == record.get('lap_duration'):
+                continue  # the still open lap of the previous poll, unchanged
+            self._lap_durations[key] = record.get('lap_duration')
+            new_laps += 1
+            self.tracker.update_record(record)
+            self.speeds.update_record(record)
+            date_start = parse_date(record.get('date_start'))
+            latest = self.latest_laps.get(record['driver_number'])
+            if date_start is not None and (latest is None or date_start >= latest[0]):
+                self.latest_laps[record['driver_number']] = (date_start, record.get('lap_duration') is not None)
+
+        if self.position_cursor is None:
+            driver_numbers = [driver['driver_number'] for driver in self.drivers]
+            rows = last_positions(self.fetcher, self.session, driver_numbers)
+        else:
+            rows = list(map(POSITIONS.row, self.fetcher.iter_records(
+                'position', session_key=self.session_key, **{'date>': api_date(self.position_cursor)}
+            )))
+        new_positions = 0
+        cursor = self.position_cursor
+        for row in rows:
+            date = parse_date(row[1])
+            if cursor is not None and (date is None or date <= cursor):
+                continue  # the cursor is sent rounded down to the second, so the last samples come again
+            self.positions[row[0]] = row  # driver_number first, samples in date order
+            new_positions += 1
+            if date is not None and (self.position_cursor is None or date > self.position_cursor):
+                self.position_cursor = date
+        return new_laps, new_positions
+
+    def snapshot(self):
+        """(fastest-lap summary, lap-group speeds) tables of the session so far"""
+        from openf1_pipeline import final_positions
+
+        if self.drivers_df is None:
+            self.drivers_df = DRIVERS.without(*DRIVER_FIELDS_TO_REMOVE).frame(self.drivers)
+        names = {driver['driver_number']: driver.get('full_name') for driver in self.drivers}
+        colours = {driver['driver_number']: driver.get('team_colour') for driver in self.drivers}
+        summary = self.tracker.summary(self.drivers_df, final_positions(self.positions.values()))
+        return summary, self.speeds.frame(names, colours=colours)
+
+
+class LiveCharts:
+    """Fastest-lap and speed figures kept open and updated in place"""
+
+    def __init__(self, output_dir=None, dpi=None, window=5):
+        self.window = window
+        self.renderer = None
+        self.interactive = output_dir is None
+        if self.interactive:
+            import matplotlib.pyplot as plt
+
+            from openf1_charts import FASTEST_LAP_FIGSIZE, SPEED_FIGSIZE
+
+            plt.ion()
+            self.fastest_fig = plt.figure(figsize=FASTEST_LAP_FIGSIZE)
+            self.speed_fig = plt.figure(figsize=SPEED_FIGSIZE)
+            self.speed_ax = self.speed_fig.add_subplot()
+            self._fastest_artists = None
+        else:
+            from openf1_charts import BATCH_DPI, ChartRenderer
+
+            self.renderer = ChartRenderer(output_dir, dpi=dpi or BATCH_DPI)
+
+    def update(self, summary, speed_avg, race_location):
+        """Show the latest tables, reusing the existing artists whenever possible"""
+        if self.renderer is not None:
+            paths = [self.renderer.fastest_laps(summary, race_location),
+                     self.renderer.speed(speed_avg, race_location, self.window)]
+            return [path for path in paths if path]
+
+        from openf1_charts import draw_fastest_laps, draw_speed_chart, update_fastest_laps, update_speed_chart
+
+        if not summary.dropna(subset=['lap_duration', 'st_speed', 'final_position']).empty:
+            if self._fastest_artists is None or not update_fastest_laps(self._fastest_artists, summary,
+                                                                        race_location):
+                self.fastest_fig.clear()
+                self._fastest_artists = draw_fastest_laps(self.fastest_fig, summary, race_location)
+                self.fastest_fig.tight_layout()
+            self.fastest_fig.canvas.draw_idle()
+        if not speed_avg.empty:
+            if self.speed_ax.lines:
+                update_speed_chart(self.speed_ax, speed_avg, race_location, self.window)
+            else:
+                draw_speed_chart(self.speed_ax, speed_avg, race_location, self.window)
+            self.speed_fig.canvas.draw_idle()
+        return []
+
+    def idle(self, seconds):
+        """Process window events for up to `seconds`"""
+        self.fastest_fig.canvas.start_event_loop(seconds)
+
+
+async def _wait(charts, seconds):
+    # Interactive windows keep handling events while the loop waits
+    if charts is not None and charts.interactive:
+        charts.idle(seconds)
+        await asyncio.sleep(0)
+    else:
+        await asyncio.sleep(seconds)
+
+
+async def follow(live, charts=None, interval=DEFAULT_INTERVAL, polls=None):
+    """Poll the session every `interval` seconds and update the charts; stops after `polls` polls if given"""
+    loop = asyncio.get_running_loop()
+    next_poll = loop.time()
+    done = 0
+    while polls is None or done < polls:
+        started = time.perf_counter()
+        # The blocking fetch runs in a thread so the windows stay responsive meanwhile
+        poll = asyncio.ensure_future(asyncio.to_thread(live.poll))
+        if charts is not None and charts.interactive:
+            # Interactive windows handle their events until the poll is done
+            while not (await asyncio.wait({poll}, timeout=0))[0]:
+                charts.idle(0.05)
+        try:
+            new_laps, new_positions = await poll
+        except Exception as e:
+            print(f"Poll failed ({e}), trying again in {interval:.0f}s")
+            new_laps = new_positions = None
+        if new_laps is not None:
+            if charts is not None and (new_laps or new_positions or done == 0):
+                summary, speed_avg = live.snapshot()
+                for path in charts.update(summary, speed_avg, live.session.get('location')):
+                    print(f"Chart saved as: {path}")
+            print(f"{live.session.get('location')}: {new_laps} laps, {new_positions} position samples "
+                  f"({time.perf_counter() - started:.2f}s)")
+        done += 1
+        next_poll = max(next_poll + interval, loop.time())
+        if (polls is None or done < polls) and next_poll > loop.time():
+            await _wait(charts, next_poll - loop.time())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Follow a live OpenF1 session and update its charts")
+    parser.add_argument('--session-key', default='latest')
+    parser.add_argument('--interval', type=float, default=DEFAULT_INTERVAL, help="seconds between polls")
+    parser.add_argument('--polls', type=int, help="stop after this many polls")
+    parser.add_argument('--window', type=int, default=5, help="laps per speed average")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="requests per second")
+    parser.add_argument('--charts-dir', help="save the charts headless into this directory instead of showing them")
+    parser.add_argument('--dpi', type=int)
+    parser.add_argument('--no-charts', dest='charts', action='store_false', help="only print what every poll brings")
+    args = parser.parse_args(argv)
+
+    # No response cache: every poll has to reach the API
+    live = LiveSession(OpenF1Fetcher(rate=args.rate), args.session_key, args.window)
+    charts = LiveCharts(args.charts_dir, args.dpi, args.window) if args.charts else None
+    try:
+        asyncio.run(follow(live, charts, args.interval, args.polls))
+    except KeyboardInterrupt:
+        print("Stopped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+"""Per-stage instrumentation of a pipeline run.
+
+A Metrics recorder collects, for every named stage (session, drivers, laps,
+positions, merge, summary, write, render), the wall time spent in it, the
+bytes and records fetched, HTTP requests and retries, cache hits and misses,
+and the peak memory reached. The pipeline reports into whichever recorder is
+active through the module-level stage() and count() helpers, which do
+nothing when no recorder is active, so uninstrumented runs pay nothing.
+
+    metrics = Metrics(trace_memory=True, profile='run.prof')
+    with metrics.recording():
+        process_session(fetcher, 9165)
+    metrics.write('run.json')
+
+Counts are attributed to the innermost stage open at the time, including
+counts made by the fetcher's worker threads. Stage times are inclusive of
+nested stages; a stage entered several times accumulates. cProfile and
+tracemalloc are only imported when asked for, keeping this module off the
+start-up bill of fetch-only runs.
+"""
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+COUNTERS = ('bytes', 'records', 'requests', 'retries', 'cache_hits', 'cache_misses')
+
+_active = None
+
+
+def _max_rss_kb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource is not None else None
+
+
+class Metrics:
+    """Recorder for the stages of one run"""
+
+    def __init__(self, trace_memory=False, profile=None):
+        self.trace_memory = trace_memory
+        self.profile = profile
+        self.stages = {}
+        self._stack = []
+        self._lock = threading.Lock()
+        self._started = None
+        self._wall = 0.0
+        self._tracemalloc = None  # the module, once recording() has imported it
+
+    def _stage(self, name):
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = dict.fromkeys(COUNTERS, 0)
+            stats.update(calls=0, wall_s=0.0, max_rss_kb=None, peak_traced_bytes=None)
+        return stats
+
+    def _tracing(self):
+        return self._tracemalloc is not None and self._tracemalloc.is_tracing()
+
+    def _note_peak(self):
+        # Every open stage has seen the traced peak reached so far
+        peak = self._tracemalloc.get_traced_memory()[1]
+        for name in self._stack:
+            stats = self.stages[name]
+            stats['peak_traced_bytes'] = max(stats['peak_traced_bytes'] or 0, peak)
+
+    @contextmanager
+    def stage(self, name):
+        """Time a stage and attribute the counts made meanwhile to it"""
+        with self._lock:
+            stats = self._stage(name)
+            if self._tracing():
+                self._note_peak()
+                self._tracemalloc.reset_peak()
+            self._stack.append(name)
+        started = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            elapsed = time.perf_counter() - started
+            with self._lock:
+                if self._tracing():
+                    self._note_peak()
+                self._stack.remove(name)
+                stats['calls'] += 1
+                stats['wall_s'] += elapsed
+                stats['max_rss_kb'] = _max_rss_kb()
+
+    def count(self, **counts):
+        """Add counts (see COUNTERS) to the innermost open stage"""
+        with self._lock:
+            stats = self._stage(self._stack[-1] if self._stack else 'other')
+            for name, value in counts.items():
+                stats[name] += value
+
+    @contextmanager
+    def recording(self):
+        """Make this the active recorder, with the optional profiler and memory tracing"""
+        global _active
+        previous, _active = _active, self
+        profiler = None
+        if self.profile:
+            import cProfile
+
+            profiler = cProfile.Profile()
+        tracing = False
+        if self.trace_memory:
+            import tracemalloc
+
+            self._tracemalloc = tracemalloc
+            tracing = not tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.start()
+        if profiler is not None:
+            profiler.enable()
+        self._started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self._wall += time.perf_counter() - self._started
+            if profiler is not None:
+                profiler.disable()
+                profiler.dump_stats(self.profile)
+            if tracing:
+                self._tracemalloc.stop()
+            _active = previous
+
+    def report(self):
+        """Machine-readable summary of the run"""
+        stages = {name: dict(stats, wall_s=round(stats['wall_s'], 6)) for name, stats in self.stages.items()}
+        return {
+            'wall_s': round(self._wall, 6),
+            'max_rss_kb': _max_rss_kb(),
+            'python': sys.version.split()[0],
+            'stages': stages,
+        }
+
+    def write(self, path):
+        """Write report() as JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+
+def stage(name):
+    """Stage of the active recorder, or a no-op context"""
+    return _active.stage(name) if _active is not None else nullcontext()
+
+
+def count(**counts):
+    """Add counts to the active recorder, if any"""
+    if _active is not None:
+        _active.count(**counts)
@@ -0,0 +1,165 @@
+"""Session pipeline stages shared by the OpenF1 scripts."""
+import pandas as pd
+from pandas.api.extensions import take
+
+from openf1_http import describe_error
+from openf1_metrics import stage
+from openf1_schema import DRIVERS, LAPS, POSITIONS
+from openf1_session import (DRIVER_FIELDS_TO_REMOVE, FINAL_POSITION_WINDOW, SessionMemo, fetch_session,
+                            last_positions, session_finished)
+from openf1_store import DEFAULT_FORMAT, PARTITION_KEYS, STORE_ROOT, write_session
+
+SUMMARY_COLUMNS = ['driver_number', 'full_name', 'team_name', 'lap_duration', 'st_speed', 'final_position']
+
+# Race distance of finished sessions
+_race_lap_count_memo = SessionMemo()
+
+
+def merge_session(laps_df, drivers_df, positions_df=None, race_location=None):
+    """Left-join driver info and final positions onto the lap table in one pass.
+
+    driver_number is turned into a categorical once; every side table is
+    aligned to its categories, and its columns are gathered by the category
+    codes. The merged frame is assembled from those columns in one step,
+    without intermediate merges or _x/_y suffix cleanup.
+    """
+    keys = pd.Categorical(laps_df['driver_number'])
+    codes = keys.codes
+    columns = {name: laps_df[name] for name in laps_df.columns}
+
+    for side in (drivers_df, positions_df):
+        if side is None or side.empty:
+            continue
+        # session_key/meeting_key are identical within a session, so only the lap table's copy is kept
+        wanted = [name for name in side.columns if name != 'driver_number' and name not in columns]
+        aligned = side.drop_duplicates('driver_number').set_index('driver_number')[wanted]
+        aligned = aligned.reindex(keys.categories)
+        for name in wanted:
+            columns[name] = take(aligned[name].array, codes, allow_fill=True)
+
+    merged_df = pd.DataFrame(columns, index=laps_df.index)
+    if race_location is not None and 'race_location' not in merged_df.columns:
+        merged_df['race_location'] = pd.Categorical([race_location] * len(merged_df))
+    return merged_df
+
+
+def final_positions(rows):
+    """Final positions table from projected POSITIONS rows in date order.
+
+    The last position entry of each driver is the finishing position.
+    """
+    last = {}
+    for row in rows:
+        last[row[0]] = row  # driver_number is the first POSITIONS column
+    return POSITIONS.to_frame(last.values()).rename(columns={'position': 'final_position'})
+
+
+def resolve_final_positions(fetcher, session, driver_numbers, window=FINAL_POSITION_WINDOW):
+    """Final positions table of a session, read backwards from its end (see last_positions)"""
+    return final_positions(last_positions(fetcher, session, driver_numbers, window))
+
+
+def race_lap_count(laps_df, positions_df, session=None):
+    """Race distance in laps: the number of laps completed by the winner.
+
+    Derived from laps already in memory; memoized per session_key when the
+    sessions record passed in has finished (see session_finished).
+    """
+    finished = session is not None and session_finished(session)
+    if finished:
+        lap_count = _race_lap_count_memo.get(session['session_key'])
+        if lap_count is not None:
+            return lap_count
+    winner = positions_df.loc[positions_df['final_position'] == 1, 'driver_number'] if not positions_df.empty else []
+    if len(winner) == 0:
+        return None
+    lap_count = int(laps_df.loc[laps_df['driver_number'] == winner.iloc[0], 'lap_number'].max())
+    if finished:
+        _race_lap_count_memo.put(session['session_key'], lap_count)
+    return lap_count
+
+
+def load_session(fetcher, session_key, fields_to_remove=DRIVER_FIELDS_TO_REMOVE, session=None):
+    """Fetch one session and build its drivers, laps and final positions tables.
+
+    Returns a dict with the session record ('session'), the three DataFrames
+    and the per-driver fetch errors ('errors', keyed by table).
+    """
+    fetched = fetch_session(fetcher, session_key, fields_to_remove, session)
+    with stage('drivers'):
+        drivers_df = DRIVERS.without(*fields_to_remove).to_frame(fetched['drivers'])
+    with stage('laps'):
+        laps_df = LAPS.to_frame(fetched['laps'])
+    with stage('positions'):
+        positions_df = final_positions(fetched['positions'])
+    return {
+        'session': fetched['session'],
+        'drivers': drivers_df,
+        'laps': laps_df,
+        'positions': positions_df,
+        'errors': fetched['errors'],
+    }
+
+
+def fastest_lap_summary(merged_df):
+    """Fastest valid lap of every driver, sorted by lap time"""
+    valid_laps = merged_df[merged_df['lap_duration'].notna() & (merged_df['lap_duration'] > 0)]
+    fastest_laps = valid_laps.loc[valid_laps.groupby('driver_number', observed=True)['lap_duration'].idxmin()]
+    columns = [column for column in SUMMARY_COLUMNS if column in fastest_laps.columns]
+    # Stable, so drivers on the same lap time stay in driver_number order
+    return fastest_laps[columns].sort_values('lap_duration', kind='stable')
+
+
+def session_outputs(drivers_df, laps_df, positions_df, race_location, tracker=None):
+    """All tables stored for a session, adding the merged and fastest-lap tables when there are laps.
+
+    With a FastestLapTracker already fed with laps_df, the fastest-lap table
+    is its snapshot instead of a groupby over every lap.
+    """
+    outputs = {'drivers': drivers_df, 'laps': laps_df, 'positions': positions_df}
+    if not laps_df.empty:
+        with stage('merge'):
+            outputs['merged'] = merge_session(laps_df, drivers_df, positions_df, race_location)
+        with stage('summary'):
+            outputs['fastest_laps'] = (tracker.summary(drivers_df, positions_df) if tracker is not None
+                                       else fastest_lap_summary(outputs['merged']))
+    return outputs
+
+
+def process_session(fetcher, session_key, root=STORE_ROOT, format=DEFAULT_FORMAT, session=None):
+    """Fetch, merge and summarize one session and write it to its own store partition.
+
+    Returns a small report dict with the row counts, written paths and the
+    drivers whose data could not be fetched (see failed_drivers).
+    """
+    tables = load_session(fetcher, session_key, session=session)
+    session = tables['session']
+    outputs = session_outputs(tables['drivers'], tables['laps'], tables['positions'], session.get('location'))
+    partition = [session[key] for key in PARTITION_KEYS]
+    with stage('write'):
+        paths = write_session(outputs, *partition, root=root, format=format)
+    return {
+        'session_key': session['session_key'],
+        'location': session.get('location'),
+        'partition': tuple(partition),
+        'laps': len(tables['laps']),
+        'drivers': len(tables['drivers']),
+        'paths': paths,
+        'failed_drivers': failed_drivers(tables['errors']),
+    }
+
+
+def failed_drivers(errors):
+    """Per-table list of the drivers whose data could not be fetched, with the reason"""
+    return {
+        table: [{'driver_number': driver_number, **describe_error(by_driver[driver_number])}
+                for driver_number in sorted(by_driver)]
+        for table, by_driver in errors.items() if by_driver
+    }
+
+
+def print_failures(failed, indent=''):
+    """Print a failed_drivers report, one line per driver"""
+    for table, failures in failed.items():
+        for failure in failures:
+            print(f"{indent}No {table} for driver {failure['driver_number']}: {failure['message']}")
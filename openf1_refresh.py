@@ -0,0 +1,150 @@
+"""Incremental refresh of a stored session, typically session_key=latest.
+
+Instead of downloading every lap and position sample again, each refresh
+reads what is already stored for the session, asks the API only for the laps
+still open (see lap_cursor) and the position samples after the last one
+stored, and folds them into the stored tables. A live-weekend poll then
+costs a few KB instead of the whole session.
+
+With --interval the session is polled until interrupted, without the
+response cache, and a FastestLapTracker carried from one poll to the next
+folds in only the new laps, so the fastest-lap table does not regroup the
+whole session each time.
+
+    python openf1_refresh.py              # refresh session_key=latest once
+    python openf1_refresh.py --session-key 9165
+    python openf1_refresh.py --interval 10
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from openf1_cache import DEFAULT_CACHE_DIR, ResponseCache
+from openf1_fetch import OpenF1Fetcher
+from openf1_pipeline import final_positions, process_session, resolve_final_positions, session_outputs
+from openf1_schema import LAPS, POSITIONS
+from openf1_store import DEFAULT_FORMAT, PARTITION_KEYS, STORE_ROOT, apply_schema, read_partition, write_session
+from openf1_session import STALE_LAP, api_date, parse_date
+from openf1_tracker import FastestLapTracker
+
+
+def lap_cursor(laps_df):
+    """Start of the oldest stored lap that may still change, or None when no lap has a date_start.
+
+    That is the oldest lap still without a lap_duration among the latest
+    laps of the drivers still running; a driver whose open lap started more
+    than STALE_LAP before the newest lap has retired and no longer holds the
+    cursor back. With no open lap left, the newest lap start.
+    """
+    timed = laps_df.dropna(subset=['date_start'])
+    if timed.empty:
+        return None
+    latest = timed.loc[timed.groupby('driver_number', observed=True)['date_start'].idxmax()]
+    newest = latest['date_start'].max()
+    open_laps = latest.loc[latest['lap_duration'].isna() & (latest['date_start'] > newest - STALE_LAP), 'date_start']
+    return open_laps.min() if not open_laps.empty else newest
+
+
+def _in_driver_order(df, drivers_df, *columns):
+    # Fresh tables follow the drivers table (see fetch_session), not driver_number order
+    rank = {driver_number: index for index, driver_number in enumerate(drivers_df['driver_number'].tolist())}
+    return df.sort_values(['driver_number', *columns], ignore_index=True,
+                          key=lambda column: column.map(rank) if column.name == 'driver_number' else column)
+
+
+def refresh_session(fetcher, session_key='latest', root=STORE_ROOT, format=DEFAULT_FORMAT, tracker=None):
+    """Fetch only the laps and positions newer than the stored copy of a session.
+
+    Falls back to a full process_session when no laps are stored yet, and
+    to the usual final-positions lookup when no positions are. A
+    FastestLapTracker passed in is seeded with the stored laps the first
+    time and then only fed the new ones. Returns a report dict with the
+    number of new laps and position samples.
+    """
+    session_data = fetcher.get('sessions', session_key=session_key)
+    if not session_data:
+        raise ValueError(f"No session found for session_key={session_key}")
+    session = session_data[0]
+    partition = [session[key] for key in PARTITION_KEYS]
+    stored = {table: read_partition(table, *partition, root=root, format=format)
+              for table in ('drivers', 'laps', 'positions')}
+    if stored['drivers'] is None or stored['laps'] is None or stored['laps'].empty:
+        print("No stored laps for this session yet, doing a full fetch")
+        return process_session(fetcher, session['session_key'], root=root, format=format, session=session)
+
+    # Stored tables drop the partition keys; put them back so the refreshed tables match fresh ones
+    laps_df = stored['laps'].assign(meeting_key=session['meeting_key'], session_key=session['session_key'])
+    drivers_df = stored['drivers'].assign(meeting_key=session['meeting_key'], session_key=session['session_key'])
+    positions_df = stored['positions']
+
+    # Laps still open are requested again: they are updated once completed
+    cursor = lap_cursor(laps_df)
+    params = {'date_start>': api_date(cursor)} if cursor is not None else {}
+    new_laps = LAPS.to_frame(map(LAPS.row, fetcher.iter_records('laps', session_key=session['session_key'], **params)))
+    if not new_laps.empty:
+        # Sessions stored before a column was added get it back as missing values, and
+        # mini-sector columns only one side has are padded by apply_schema
+        columns = new_laps.columns.union(laps_df.columns, sort=False)
+        laps_df = pd.concat([laps_df.reindex(columns=columns), new_laps], ignore_index=True)
+        laps_df = apply_schema(_in_driver_order(laps_df.drop_duplicates(['driver_number', 'lap_number'], keep='last'),
+                                                drivers_df, 'lap_number'))
+
+    new_samples = 0
+    if positions_df is None or positions_df.empty:
+        # Nothing was stored on the first run (write_session skips empty tables): resolve them afresh
+        positions_df = resolve_final_positions(fetcher, session, drivers_df['driver_number'].tolist())
+        new_samples = len(positions_df)
+    else:
+        # Samples only come on changes, so anything after the last one stored is new
+        last_sample = positions_df['date'].max()
+        rows = [row for row in map(POSITIONS.row, fetcher.iter_records(
+            'position', session_key=session['session_key'], **{'date>': api_date(last_sample)}
+        )) if row[1] and parse_date(row[1]) > last_sample]  # the filter is rounded down to the second
+        new_samples = len(rows)
+        if rows:
+            updates = final_positions(rows)
+            positions_df = _in_driver_order(pd.concat([positions_df, updates], ignore_index=True)
+                                            .drop_duplicates('driver_number', keep='last'), drivers_df)
+
+    if tracker is not None:
+        if not tracker.laps_seen:
+            tracker.update_frame(stored['laps'])
+        tracker.update_frame(new_laps)
+    outputs = session_outputs(drivers_df, laps_df, positions_df, session.get('location'), tracker)
+    paths = write_session(outputs, *partition, root=root, format=format)
+    return {
+        'session_key': session['session_key'],
+        'location': session.get('location'),
+        'laps': len(laps_df),
+        'new_laps': len(new_laps),
+        'new_position_samples': new_samples,
+        'paths': paths,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Fetch only new laps and positions for a stored session")
+    parser.add_argument('--session-key', default='latest')
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help="empty string disables the cache; never used with --interval")
+    parser.add_argument('--store', default=STORE_ROOT)
+    parser.add_argument('--format', choices=['parquet', 'csv'], default=DEFAULT_FORMAT)
+    parser.add_argument('--interval', type=float, metavar='SECONDS', help="keep polling every SECONDS")
+    args = parser.parse_args(argv)
+
+    # Polls repeat the same query while nothing changes, so they must not be answered from the cache
+    cache = ResponseCache(args.cache_dir) if args.cache_dir and not args.interval else None
+    fetcher = OpenF1Fetcher(cache=cache)
+    tracker = FastestLapTracker() if args.interval else None
+    while True:
+        report = refresh_session(fetcher, args.session_key, root=args.store, format=args.format, tracker=tracker)
+        print(f"{report['location']}: fetched {report.get('new_laps', report['laps'])} laps, "
+              f"{report['laps']} laps stored")
+        if not args.interval:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
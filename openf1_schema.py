@@ -0,0 +1,173 @@
+"""Column types and per-endpoint projections for the OpenF1 tables.
+
+A Projection lists the columns kept from an endpoint. It is compiled once
+into an itemgetter, so projecting a decoded record is a single C call that
+returns a tuple instead of a filtered dict rebuilt key by key. The tuples
+are turned into typed columns in one pass by to_frame. pandas is only
+imported there, so fetching and projecting does not pay for it.
+
+Identifiers that are never missing use plain NumPy integers, the smallest
+that fit; columns that can be missing use the nullable pandas types.
+Timestamps are parsed once, in to_frame, into timezone-aware UTC datetimes
+at the API's microsecond precision and stay that way through merging,
+storage and filtering; they are only formatted when displayed.
+
+The mini-sector codes of segments_sector_1/2/3 come as one list per lap.
+to_frame turns each of them into fixed-width uint8 columns
+(segments_sector_1_1, segments_sector_1_2, ...), one per mini-sector and as
+many as the longest list, so no per-lap Python list outlives the decode and
+a sector's codes can be read back as a 2D array in one step.
+"""
+from itertools import chain
+from operator import itemgetter
+
+# Timestamps keep the API's own precision
+TIMESTAMP_UNIT = 'us'
+TIMESTAMP_TYPE = f'datetime64[{TIMESTAMP_UNIT}, UTC]'
+TIMESTAMP_COLUMNS = frozenset({'date_start', 'date'})
+
+SECTOR_COLUMNS = ('duration_sector_1', 'duration_sector_2', 'duration_sector_3')
+
+# Mini-sector codes: 2048 yellow, 2049 green, 2051 purple, 2064 pit lane; 0 means no data.
+# Stored as code - SEGMENT_BASE in one byte, with 0 for no data, padding and unknown codes
+SEGMENT_COLUMNS = ('segments_sector_1', 'segments_sector_2', 'segments_sector_3')
+SEGMENT_BASE = 2047
+SEGMENT_TYPE = 'uint8'
+
+# Storage types shared by every table, applied to whichever columns are present
+COLUMN_TYPES = {
+    'year': 'int16',
+    'meeting_key': 'int32',
+    'session_key': 'int32',
+    'driver_number': 'int8',
+    'lap_number': 'int16',
+    'position': 'Int8',
+    'final_position': 'Int8',
+    'lap_duration': 'float32',
+    'st_speed': 'float32',
+    'i1_speed': 'float32',
+    'i2_speed': 'float32',
+    'duration_sector_1': 'float32',
+    'duration_sector_2': 'float32',
+    'duration_sector_3': 'float32',
+    'is_pit_out_lap': 'boolean',
+    'speed': 'int16',
+    'throttle': 'uint8',
+    'brake': 'uint8',
+    'rpm': 'int16',
+    'n_gear': 'int8',
+    'drs': 'uint8',
+    'x': 'int32',
+    'y': 'int32',
+    'z': 'int32',
+    'date_start': TIMESTAMP_TYPE,
+    'date': TIMESTAMP_TYPE,
+    'full_name': 'string',
+    'first_name': 'string',
+    'last_name': 'string',
+    'broadcast_name': 'string',
+    'headshot_url': 'string',
+    'name_acronym': 'string',
+    'team_name': 'category',
+    'team_colour': 'category',
+    'country_code': 'category',
+    'race_location': 'category',
+}
+
+
+def timestamp_series(values):
+    """UTC datetime column of ISO8601 timestamps (None becomes NaT)"""
+    import pandas as pd
+
+    return pd.to_datetime(pd.Series(values, dtype=object), format='ISO8601', utc=True).dt.as_unit(TIMESTAMP_UNIT)
+
+
+def segment_columns(name, values):
+    """Fixed-width uint8 columns {name}_1, {name}_2, ... of a column of mini-sector code lists"""
+    import numpy as np
+
+    lengths = np.fromiter((len(codes) if codes else 0 for codes in values), dtype=np.int64, count=len(values))
+    flat = np.fromiter((code or 0 for code in chain.from_iterable(codes for codes in values if codes)),
+                       dtype=np.int64, count=int(lengths.sum()))
+    encoded = np.where((flat > SEGMENT_BASE) & (flat <= SEGMENT_BASE + 255), flat - SEGMENT_BASE, 0)
+    matrix = np.zeros((len(values), int(lengths.max(initial=0))), dtype=SEGMENT_TYPE)
+    # Row-major, so the codes land in lap order, left-aligned
+    matrix[np.arange(matrix.shape[1]) < lengths[:, None]] = encoded
+    return {f'{name}_{index + 1}': matrix[:, index] for index in range(matrix.shape[1])}
+
+
+def segment_names(columns, sector=None):
+    """Encoded mini-sector columns among `columns`, of one sector (1-3) or all, in order"""
+    prefixes = SEGMENT_COLUMNS if sector is None else (SEGMENT_COLUMNS[sector - 1],)
+    found = []
+    for column in columns:
+        prefix, _, index = str(column).rpartition('_')
+        if prefix in prefixes and index.isdigit():
+            found.append((prefixes.index(prefix), int(index), column))
+    return [column for _, _, column in sorted(found)]
+
+
+def decode_segments(matrix):
+    """API mini-sector codes of an encoded segment matrix (0 stays 0)"""
+    import numpy as np
+
+    matrix = np.asarray(matrix)
+    return np.where(matrix > 0, matrix.astype(np.int16) + SEGMENT_BASE, 0)
+
+
+class Projection:
+    """Ordered set of columns kept from one endpoint"""
+
+    def __init__(self, *names):
+        self.names = names
+        self._getter = itemgetter(*names)
+
+    def without(self, *names):
+        """Same projection minus some columns"""
+        return Projection(*(name for name in self.names if name not in names))
+
+    def row(self, record):
+        """Project one decoded record to a tuple of the kept fields"""
+        try:
+            values = self._getter(record)
+        except KeyError:
+            values = tuple(record.get(name) for name in self.names)
+        return values if len(self.names) > 1 else (values,)
+
+    def to_frame(self, rows):
+        """Build a typed DataFrame from projected rows"""
+        import pandas as pd
+
+        rows = list(rows)
+        columns = zip(*rows) if rows else [()] * len(self.names)
+        table = {}
+        for name, values in zip(self.names, columns):
+            if name in TIMESTAMP_COLUMNS:
+                table[name] = timestamp_series(values)
+            elif name in SEGMENT_COLUMNS:
+                table.update(segment_columns(name, values))
+            else:
+                table[name] = pd.Series(values, dtype=COLUMN_TYPES.get(name))
+        return pd.DataFrame(table)
+
+    def frame(self, records):
+        """Project decoded records straight into a typed DataFrame"""
+        return self.to_frame(map(self.row, records))
+
+
+DRIVERS = Projection(
+    'meeting_key', 'session_key', 'driver_number', 'broadcast_name', 'full_name', 'first_name',
+    'last_name', 'name_acronym', 'team_name', 'team_colour', 'country_code', 'headshot_url',
+)
+
+LAPS = Projection(
+    'meeting_key', 'session_key', 'driver_number', 'lap_number', 'date_start',
+    'is_pit_out_lap', 'lap_duration', 'st_speed', 'i1_speed', 'i2_speed', *SECTOR_COLUMNS, *SEGMENT_COLUMNS,
+)
+
+POSITIONS = Projection('driver_number', 'date', 'position')
+
+# High-frequency streams, kept as memory-mapped arrays rather than DataFrames (see openf1_telemetry)
+CAR_DATA = Projection('driver_number', 'date', 'speed', 'throttle', 'brake', 'rpm', 'n_gear', 'drs')
+
+LOCATION = Projection('driver_number', 'date', 'x', 'y', 'z')
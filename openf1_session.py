@@ -0,0 +1,185 @@
+"""Fetch stage of the session pipeline, without pandas.
+
+Downloads the drivers, laps and final position samples of one session and
+projects them to tuples. Nothing here imports pandas, so fetch-only runs
+(cache warming, cron prefetches) start in a fraction of the time of a full
+run. openf1_pipeline builds the typed tables from these rows.
+"""
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from openf1_cache import is_finished
+from openf1_metrics import stage
+from openf1_schema import DRIVERS, LAPS, POSITIONS
+
+DRIVER_FIELDS_TO_REMOVE = ('headshot_url', 'first_name', 'last_name', 'broadcast_name', 'country_code')
+
+# First look-back window from the end of a session when resolving final positions
+FINAL_POSITION_WINDOW = timedelta(minutes=5)
+# Windows tried before falling back to one request for the whole position history
+MAX_POSITION_WINDOWS = 3
+
+# A lap still without a lap_duration this long after the newest lap started is a retirement, not a slow lap
+STALE_LAP = timedelta(minutes=5)
+
+# Finished sessions a SessionMemo keeps results for before dropping the least recently used
+MEMO_SESSIONS = 64
+
+_memos = []
+
+
+def parse_date(value):
+    """Aware datetime of an API ISO8601 timestamp, or None if missing"""
+    return datetime.fromisoformat(value) if value else None
+
+
+def api_date(value):
+    """Aware datetime (or stored UTC Timestamp) -> value for the API date filters, to the second"""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S')
+
+
+def session_finished(session, now=None):
+    """True when a sessions record has ended long enough ago (openf1_cache.SETTLE_TIME) that its data is final"""
+    return is_finished(session.get('date_end'), now)
+
+
+class SessionMemo:
+    """Per session_key results of finished sessions, bounded to the maxsize most recently used"""
+
+    def __init__(self, maxsize=MEMO_SESSIONS):
+        self.maxsize = maxsize
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        _memos.append(self)
+
+    def get(self, session_key):
+        """Memoized result of a session, or None"""
+        with self._lock:
+            if session_key not in self._results:
+                return None
+            self._results.move_to_end(session_key)
+            return self._results[session_key]
+
+    def put(self, session_key, result):
+        with self._lock:
+            self._results[session_key] = result
+            self._results.move_to_end(session_key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+
+
+def clear_session_memos():
+    """Forget every memoized session result, e.g. between benchmark repeats"""
+    for memo in _memos:
+        memo.clear()
+
+
+# Last position rows of finished sessions
+_last_positions_memo = SessionMemo()
+
+
+def last_positions(fetcher, session, driver_numbers, window=FINAL_POSITION_WINDOW, max_windows=MAX_POSITION_WINDOWS):
+    """Last POSITIONS row of every driver without downloading the whole position history.
+
+    Position samples are only emitted on changes, so the session is read
+    backwards from its end in up to max_windows windows that double in
+    length, and each driver keeps the last sample of the most recent window
+    it appears in. Most drivers are resolved by the first few minutes of
+    data. Anyone still missing after that (e.g. a leader who never changed
+    place) is picked up from a single request for the whole history, which
+    is cheaper than reading further back window by window. Finished
+    sessions (see session_finished) are memoized per session_key.
+    """
+    session_key = session['session_key']
+    memoized = _last_positions_memo.get(session_key)
+    if memoized is not None:
+        return list(memoized)
+
+    now = datetime.now(timezone.utc)
+    start = parse_date(session.get('date_start'))
+    end = parse_date(session.get('date_end'))
+    end = end if end is not None and end < now else now
+
+    missing = set(driver_numbers)
+    last = {}
+    upper = None
+    for _ in range(max_windows):
+        lower = end - window
+        if not missing or (start is not None and lower <= start):
+            break
+        params = {'date>': api_date(lower)}
+        if upper is not None:
+            params['date<'] = api_date(upper)
+        found = {}
+        for row in map(POSITIONS.row, fetcher.iter_records('position', session_key=session_key, **params)):
+            if row[0] in missing:  # driver_number is the first POSITIONS column
+                found[row[0]] = row
+        last.update(found)
+        missing -= found.keys()
+        upper, window = lower, window * 2
+
+    if missing:
+        found = {}
+        for row in map(POSITIONS.row, fetcher.iter_records('position', session_key=session_key)):
+            if row[0] in missing:
+                found[row[0]] = row
+        last.update(found)
+        missing -= found.keys()
+
+    for driver_number in sorted(missing):
+        print(f"No position data for driver {driver_number}")
+    rows = [last[driver_number] for driver_number in driver_numbers if driver_number in last]
+    if session_finished(session, now):
+        _last_positions_memo.put(session_key, list(rows))
+    return rows
+
+
+def fetch_session(fetcher, session_key, fields_to_remove=DRIVER_FIELDS_TO_REMOVE, session=None):
+    """Fetch one session as projected rows.
+
+    Returns a dict with the session record ('session'), the DRIVERS rows
+    without fields_to_remove ('drivers'), the LAPS rows in driver order
+    ('laps'), the POSITIONS rows of every driver's last sample ('positions')
+    and the per-driver fetch errors ('errors', keyed by table). A session
+    record the caller already has (e.g. from a SessionIndex) saves looking
+    it up again.
+    """
+    if session is not None:
+        session_data = [session]
+    else:
+        with stage('session'):
+            session_data = fetcher.get('sessions', session_key=session_key)
+    if not session_data:
+        raise ValueError(f"No session found for session_key={session_key}")
+    with stage('drivers'):
+        drivers_data = fetcher.get('drivers', session_key=session_key)
+        driver_rows = list(map(DRIVERS.without(*fields_to_remove).row, drivers_data))
+    driver_numbers = [driver['driver_number'] for driver in drivers_data]
+
+    with stage('laps'):
+        laps_by_driver, lap_errors = fetcher.get_session_bulk('laps', session_key, driver_numbers, transform=LAPS.row)
+        lap_rows = [row for driver_number in driver_numbers for row in laps_by_driver.get(driver_number, ())]
+
+    position_errors = {}
+    with stage('positions'):
+        try:
+            position_rows = last_positions(fetcher, session_data[0], driver_numbers)
+        except Exception as e:
+            print(f"Final position lookup failed ({e}), fetching the full position history")
+            positions_by_driver, position_errors = fetcher.get_session_bulk(
+                'position', session_key, driver_numbers, transform=POSITIONS.row
+            )
+            position_rows = [row for rows in positions_by_driver.values() for row in rows]
+
+    return {
+        'session': session_data[0],
+        'drivers': driver_rows,
+        'laps': lap_rows,
+        'positions': position_rows,
+        'errors': {'laps': lap_errors, 'positions': position_errors},
+    }
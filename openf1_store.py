@@ -0,0 +1,162 @@
+"""Columnar session store replacing the f1_*_session_latest.csv outputs.
+
+Every table lives in its own dataset partitioned by year/meeting_key/session_key:
+
+    f1_store/laps/year=2023/meeting_key=1219/session_key=9165/data.parquet
+
+Writing a session only replaces that session's partition, and read_table can
+load single columns or sessions with predicate pushdown instead of parsing a
+whole CSV. Parquet needs pyarrow; format='csv' keeps the same layout with
+plain CSV files, and is the default (DEFAULT_FORMAT) where pyarrow is not
+installed.
+"""
+import os
+from importlib.util import find_spec
+
+import pandas as pd
+
+from openf1_schema import COLUMN_TYPES, SEGMENT_TYPE, segment_names
+
+STORE_ROOT = os.environ.get('OPENF1_STORE_DIR', 'f1_store')
+PARTITION_KEYS = ('year', 'meeting_key', 'session_key')
+
+FILE_NAMES = {'parquet': 'data.parquet', 'csv': 'data.csv'}
+DEFAULT_FORMAT = 'parquet' if find_spec('pyarrow') else 'csv'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("The parquet session store needs pyarrow (pip install pyarrow) or format='csv'")
+
+
+def apply_schema(df):
+    """Cast the known columns of a table to their compact storage types"""
+    types = {column: dtype for column, dtype in COLUMN_TYPES.items() if column in df.columns}
+    segments = segment_names(df.columns)
+    if segments:
+        # Sessions with fewer mini-sectors come back from a CSV read or a concat with gaps
+        df = df.fillna(dict.fromkeys(segments, 0))
+        types.update(dict.fromkeys(segments, SEGMENT_TYPE))
+    return df.astype(types) if types else df
+
+
+def partition_dir(table, year, meeting_key, session_key, root=STORE_ROOT):
+    """Directory holding one session of a table"""
+    return os.path.join(root, table, f'year={year}', f'meeting_key={meeting_key}', f'session_key={session_key}')
+
+
+def write_table(df, table, year, meeting_key, session_key, root=STORE_ROOT, format=DEFAULT_FORMAT):
+    """Write one session of a table, replacing any earlier copy of that session"""
+    if format not in FILE_NAMES:
+        raise ValueError(f"Unknown store format: {format}")
+    if format == 'parquet':
+        _require_pyarrow()
+
+    directory = partition_dir(table, year, meeting_key, session_key, root)
+    os.makedirs(directory, exist_ok=True)
+    # The partition keys come back from the directory names on read
+    df = apply_schema(df.drop(columns=[key for key in PARTITION_KEYS if key in df.columns]))
+    path = os.path.join(directory, FILE_NAMES[format])
+    tmp_path = f'{path}.tmp'
+    if format == 'parquet':
+        df.to_parquet(tmp_path, index=False, engine='pyarrow')
+    else:
+        df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_session(tables, year, meeting_key, session_key, root=STORE_ROOT, format=DEFAULT_FORMAT):
+    """Write several tables ({name: DataFrame}) for one session, skipping empty ones"""
+    return {
+        table: write_table(df, table, year, meeting_key, session_key, root, format)
+        for table, df in tables.items()
+        if df is not None and not df.empty
+    }
+
+
+def read_partition(table, year, meeting_key, session_key, root=STORE_ROOT, format=DEFAULT_FORMAT):
+    """Read one stored session of a table, or None if it was never written"""
+    path = os.path.join(partition_dir(table, year, meeting_key, session_key, root), FILE_NAMES[format])
+    if not os.path.exists(path):
+        return None
+    if format == 'parquet':
+        _require_pyarrow()
+        return apply_schema(pd.read_parquet(path, engine='pyarrow'))
+    return apply_schema(pd.read_csv(path))
+
+
+def read_table(table, columns=None, filters=None, root=STORE_ROOT, format=DEFAULT_FORMAT):
+    """Read a table from the store.
+
+    filters uses the pyarrow list-of-tuples form, e.g.
+    [('year', '=', 2023), ('driver_number', 'in', [1, 11])]. Filters on the
+    partition keys prune whole sessions before any file is opened.
+    """
+    path = os.path.join(root, table)
+    if format == 'parquet':
+        _require_pyarrow()
+        df = pd.read_parquet(path, columns=columns, filters=filters, schema=_dataset_schema(path), engine='pyarrow')
+        return apply_schema(df)
+    if format != 'csv':
+        raise ValueError(f"Unknown store format: {format}")
+    return _read_csv_table(path, columns, filters)
+
+
+def _dataset_schema(path):
+    # pyarrow takes the schema of a dataset from its first file, which would drop the
+    # mini-sector columns only sessions with more segments have: merge every file's footer
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schemas = [
+        pq.read_schema(os.path.join(directory, FILE_NAMES['parquet']))
+        for directory, _, files in os.walk(path) if FILE_NAMES['parquet'] in files
+    ]
+    if not schemas:
+        return None
+    schema = pa.unify_schemas(schemas).remove_metadata()
+    for key in PARTITION_KEYS:
+        schema = schema.append(pa.field(key, pa.int32()))
+    return schema
+
+
+_OPERATORS = {
+    '=': lambda s, v: s == v,
+    '==': lambda s, v: s == v,
+    '!=': lambda s, v: s != v,
+    '<': lambda s, v: s < v,
+    '<=': lambda s, v: s <= v,
+    '>': lambda s, v: s > v,
+    '>=': lambda s, v: s >= v,
+    'in': lambda s, v: s.isin(v),
+    'not in': lambda s, v: ~s.isin(v),
+}
+
+
+def _read_csv_table(path, columns, filters):
+    filters = filters or []
+    frames = []
+    for directory, _, files in os.walk(path):
+        if FILE_NAMES['csv'] not in files:
+            continue
+        keys = dict(part.split('=', 1) for part in os.path.relpath(directory, path).split(os.sep))
+        partition = pd.DataFrame({key: [int(value)] for key, value in keys.items()})
+        # Prune sessions on the partition keys before reading the file
+        if not all(_OPERATORS[op](partition[key], value).all() for key, op, value in filters if key in keys):
+            continue
+        df = pd.read_csv(os.path.join(directory, FILE_NAMES['csv']))
+        for key, value in keys.items():
+            df[key] = int(value)
+        frames.append(df)
+
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    df = pd.concat(frames, ignore_index=True)
+    for key, op, value in filters:
+        df = df[_OPERATORS[op](df[key], value)]
+    if columns is not None:
+        df = df[columns]
+    return apply_schema(df.reset_index(drop=True))
@@ -0,0 +1,272 @@
+"""High-frequency car_data and location streams as memory-mapped NumPy arrays.
+
+/v1/car_data (speed, throttle, brake, rpm, gear, DRS) and /v1/location (x,
+y, z) run to millions of samples per session, far too many to carry around
+as DataFrames. Ingestion streams a session in time windows, one bulk request
+per window for every driver, and appends each window, as typed columns, to
+one raw file per field and driver, next to a time index:
+
+    f1_telemetry/car_data/year=2023/meeting_key=1219/session_key=9165/driver_number=1/
+        date.bin  speed.bin  throttle.bin  brake.bin  rpm.bin  n_gear.bin  drs.bin  meta.json
+
+date holds the sample times as microseconds since the epoch (UTC), strictly
+increasing. Only one window is ever held in memory while ingesting.
+
+Reading maps the files with np.memmap instead of loading them. Selecting a
+lap is two binary searches on the time index, [date_start, date_start +
+lap_duration), and returns views of the mapped files: nothing is copied, and
+only the pages actually used are read from disk.
+
+    telemetry = read_telemetry('car_data', 2023, 1219, 9165, 1)
+    for lap_number, samples in telemetry.laps(laps_df):
+        samples['speed'].max()
+
+    python openf1_telemetry.py --session-key 9165 --drivers 1 11 --window 5
+"""
+import argparse
+import json
+import os
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from openf1_fetch import DEFAULT_RATE, OpenF1Fetcher
+from openf1_metrics import stage
+from openf1_schema import CAR_DATA, COLUMN_TYPES, LOCATION, timestamp_series
+from openf1_session import api_date, parse_date
+
+TELEMETRY_ROOT = os.environ.get('OPENF1_TELEMETRY_DIR', 'f1_telemetry')
+STREAMS = {'car_data': CAR_DATA, 'location': LOCATION}
+
+# Length of the time windows a session is fetched and appended in
+DEFAULT_WINDOW = timedelta(minutes=5)
+
+TIME_TYPE = 'datetime64[us]'
+META_FILE = 'meta.json'
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+
+
+def _fields(endpoint):
+    # Every projected column but driver_number and the time index, with its storage type
+    return {name: COLUMN_TYPES[name] for name in STREAMS[endpoint].names[2:]}
+
+
+def _microseconds(value):
+    """Microseconds since the epoch of a datetime (naive ones are taken as UTC) or ISO8601 string"""
+    if isinstance(value, str):
+        value = parse_date(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+
+def session_dir(endpoint, year, meeting_key, session_key, root=TELEMETRY_ROOT):
+    """Directory holding one stream of one session, laid out like the table store partitions"""
+    return os.path.join(root, endpoint, f'year={year}', f'meeting_key={meeting_key}', f'session_key={session_key}')
+
+
+def telemetry_dir(endpoint, year, meeting_key, session_key, driver_number, root=TELEMETRY_ROOT):
+    """Directory holding one driver's samples of one session"""
+    return os.path.join(session_dir(endpoint, year, meeting_key, session_key, root), f'driver_number={driver_number}')
+
+
+class TelemetryWriter:
+    """Appends windows of projected samples to the column files of every driver of a session"""
+
+    def __init__(self, endpoint, directory):
+        self.endpoint = endpoint
+        self.directory = directory
+        self.fields = _fields(endpoint)
+        # driver_number -> [samples written, last sample time]
+        self.written = {}
+
+    def append(self, rows):
+        """Append one window of CAR_DATA/LOCATION rows (any driver order); returns the samples written"""
+        if not rows:
+            return 0
+        columns = list(zip(*rows))
+        drivers = np.asarray(columns[0], dtype=COLUMN_TYPES['driver_number'])
+        times = timestamp_series(columns[1]).astype('int64').to_numpy()
+        order = np.lexsort((times, drivers))
+        drivers, times = drivers[order], times[order]
+        values = {
+            name: np.fromiter((0 if value is None else value for value in column), dtype=dtype,
+                              count=len(column))[order]
+            for (name, dtype), column in zip(self.fields.items(), columns[2:])
+        }
+
+        written = 0
+        boundaries = np.flatnonzero(np.diff(drivers)) + 1
+        for start, end in zip(np.r_[0, boundaries], np.r_[boundaries, len(drivers)]):
+            driver_number = int(drivers[start])
+            count, last = self.written.get(driver_number, (0, None))
+            # Windows overlap by their bounds, and the API can send a sample twice
+            keep = np.r_[True, np.diff(times[start:end]) > 0]
+            if last is not None:
+                keep &= times[start:end] > last
+            if not keep.any():
+                continue
+            directory = os.path.join(self.directory, f'driver_number={driver_number}')
+            os.makedirs(directory, exist_ok=True)
+            chunk = times[start:end][keep]
+            with open(os.path.join(directory, 'date.bin'), 'ab') as f:
+                chunk.tofile(f)
+            for name, column in values.items():
+                with open(os.path.join(directory, f'{name}.bin'), 'ab') as f:
+                    column[start:end][keep].tofile(f)
+            self.written[driver_number] = [count + len(chunk), int(chunk[-1])]
+            written += len(chunk)
+        return written
+
+    def close(self):
+        """Write the meta.json of every driver; the column files are complete from then on"""
+        for driver_number, (count, _) in self.written.items():
+            meta = {'endpoint': self.endpoint, 'driver_number': driver_number, 'samples': count,
+                    'fields': self.fields}
+            with open(os.path.join(self.directory, f'driver_number={driver_number}', META_FILE), 'w',
+                      encoding='utf-8') as f:
+                json.dump(meta, f, indent=1)
+        return {driver_number: count for driver_number, (count, _) in self.written.items()}
+
+
+def _windows(session, window):
+    start = parse_date(session.get('date_start'))
+    end = parse_date(session.get('date_end'))
+    if start is None:
+        yield {}
+        return
+    now = datetime.now(timezone.utc)
+    end = end if end is not None and end < now else now
+    while start < end:
+        yield {'date>': api_date(start), 'date<': api_date(min(start + window, end))}
+        start += window
+
+
+def ingest_session(fetcher, session, endpoints=tuple(STREAMS), driver_numbers=None, root=TELEMETRY_ROOT,
+                   window=DEFAULT_WINDOW):
+    """Fetch the car_data/location streams of a session into memory-mapped column files.
+
+    session is a sessions record (its date range sets the windows). Every
+    window is one request for all the drivers, or for driver_numbers only
+    if given. Each stream of the session is written next to its final
+    place and swapped in once complete, replacing any earlier copy.
+    Returns {endpoint: {driver_number: samples}}.
+    """
+    report = {}
+    partition = [session['year'], session['meeting_key'], session['session_key']]
+    for endpoint in endpoints:
+        projection = STREAMS[endpoint]
+        directory = session_dir(endpoint, *partition, root=root)
+        tmp_directory = f'{directory}.tmp'
+        shutil.rmtree(tmp_directory, ignore_errors=True)
+        writer = TelemetryWriter(endpoint, tmp_directory)
+        with stage(endpoint):
+            for params in _windows(session, window):
+                drivers = [{'driver_number': driver_number} for driver_number in driver_numbers or ()] or [{}]
+                for driver in drivers:
+                    records = fetcher.iter_records(endpoint, session_key=session['session_key'], **params, **driver)
+                    writer.append(list(map(projection.row, records)))
+        report[endpoint] = writer.close()
+        shutil.rmtree(directory, ignore_errors=True)
+        if os.path.isdir(tmp_directory):
+            os.replace(tmp_directory, directory)
+    return report
+
+
+class Telemetry:
+    """Memory-mapped samples of one stream of one driver in one session.
+
+    telemetry['speed'], telemetry.date, ... are read-only arrays backed by
+    the files; slices of them stay views.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.endpoint = meta['endpoint']
+        self.driver_number = meta['driver_number']
+        self.samples = meta['samples']
+        self.date = self._map('date', TIME_TYPE)
+        self.columns = {name: self._map(name, dtype) for name, dtype in meta['fields'].items()}
+
+    def _map(self, name, dtype):
+        if not self.samples:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self.directory, f'{name}.bin'), dtype=dtype, mode='r', shape=(self.samples,))
+
+    def __len__(self):
+        return self.samples
+
+    def __getitem__(self, name):
+        return self.date if name == 'date' else self.columns[name]
+
+    def _slice(self, start, end):
+        return {'date': self.date[start:end], **{name: column[start:end] for name, column in self.columns.items()}}
+
+    def _range(self, start, end):
+        first, last = np.searchsorted(self.date, np.array([start, end], dtype='int64').astype(TIME_TYPE))
+        return self._slice(first, last)
+
+    def between(self, start, end):
+        """Views of the samples in [start, end); datetimes (naive ones as UTC) or ISO8601 strings"""
+        return self._range(_microseconds(start), _microseconds(end))
+
+    def lap(self, date_start, lap_duration):
+        """Views of the samples of one lap, from its date_start and lap_duration (seconds)"""
+        start = _microseconds(date_start)
+        return self._range(start, start + round(float(lap_duration) * 1e6))
+
+    def laps(self, laps_df):
+        """(lap_number, views) for every lap of laps_df with a date_start and a lap_duration.
+
+        laps_df is a laps table (or the merged one) of this driver; rows of
+        other drivers are skipped when it has a driver_number column. The lap
+        bounds are looked up in the time index all at once.
+        """
+        laps = laps_df
+        if 'driver_number' in laps.columns:
+            laps = laps[laps['driver_number'] == self.driver_number]
+        laps = laps[laps['date_start'].notna() & (laps['lap_duration'] > 0)]
+        starts = laps['date_start'].dt.tz_convert(None).to_numpy().astype(TIME_TYPE)
+        ends = starts + (laps['lap_duration'].to_numpy(dtype='float64') * 1e6).astype('timedelta64[us]')
+        firsts, lasts = np.searchsorted(self.date, starts), np.searchsorted(self.date, ends)
+        for lap_number, first, last in zip(laps['lap_number'].tolist(), firsts, lasts):
+            yield lap_number, self._slice(first, last)
+
+
+def read_telemetry(endpoint, year, meeting_key, session_key, driver_number, root=TELEMETRY_ROOT):
+    """Telemetry of one driver in one session, or None if it was never ingested"""
+    directory = telemetry_dir(endpoint, year, meeting_key, session_key, driver_number, root)
+    if not os.path.exists(os.path.join(directory, META_FILE)):
+        return None
+    return Telemetry(directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest OpenF1 car_data/location streams into memory-mapped arrays")
+    parser.add_argument('--session-key', default='latest')
+    parser.add_argument('--endpoints', nargs='+', choices=list(STREAMS), default=list(STREAMS))
+    parser.add_argument('--drivers', type=int, nargs='+', help="only these driver numbers")
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW.total_seconds() / 60,
+                        help="minutes of samples per request")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="requests per second")
+    parser.add_argument('--root', default=TELEMETRY_ROOT)
+    args = parser.parse_args(argv)
+
+    # No response cache: the column files are the cache, and raw bodies would only double the disk use
+    fetcher = OpenF1Fetcher(rate=args.rate)
+    sessions = fetcher.get('sessions', session_key=args.session_key)
+    if not sessions:
+        raise SystemExit(f"No session found for session_key={args.session_key}")
+    session = sessions[0]
+    print(f"Session {session['session_key']}: {session.get('location')} {session.get('session_name')} {session.get('year')}")
+    report = ingest_session(fetcher, session, args.endpoints, args.drivers, args.root,
+                            timedelta(minutes=args.window))
+    for endpoint, counts in report.items():
+        print(f"{endpoint}: {sum(counts.values())} samples for {len(counts)} drivers")
+
+
+if __name__ == '__main__':
+    main()
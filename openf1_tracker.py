@@ -0,0 +1,182 @@
+"""Incremental fastest-lap and best-sector tracking for live sessions.
+
+fastest_lap_summary filters, groups and sorts every lap of the session, which
+is fine once but makes every poll of a live session cost as much as the whole
+session so far. A FastestLapTracker keeps the best lap and the personal-best
+sectors of every driver, and the session-best sectors, and folds new laps in
+one at a time in constant time. A snapshot of it is the same table as
+fastest_lap_summary:
+
+    tracker = FastestLapTracker()
+    tracker.update_frame(laps_df)          # seed from the laps already stored
+    tracker.update_frame(new_laps)         # then only what each poll brings
+    summary = tracker.summary(drivers_df, positions_df)
+
+Laps can be fed again once they are completed (the API updates a driver's
+latest lap in place); keeping the minimum makes that harmless. LapGroupSpeeds
+does the same for the 5-lap speed averages of speed_by_lap_group. Nothing
+here imports pandas until a snapshot is taken.
+"""
+import math
+
+from openf1_schema import SECTOR_COLUMNS
+
+TRACKED_COLUMNS = ('driver_number', 'lap_number', 'lap_duration', 'st_speed', *SECTOR_COLUMNS)
+
+
+def _valid(duration):
+    return duration is not None and not math.isnan(duration) and duration > 0
+
+
+class FastestLapTracker:
+    """Best lap and personal-best sectors of every driver, and the session-best sectors"""
+
+    def __init__(self):
+        # driver_number -> (lap_duration, lap_number, st_speed)
+        self.best_laps = {}
+        # driver_number -> [best duration of sector 1, 2, 3]
+        self.personal_best_sectors = {}
+        # Per sector (duration, driver_number, lap_number) of the session best, or None
+        self.session_best_sectors = [None] * len(SECTOR_COLUMNS)
+        self.laps_seen = 0
+
+    def update(self, driver_number, lap_number, lap_duration=None, st_speed=None, *sectors):
+        """Fold one lap in; returns whether any best changed"""
+        self.laps_seen += 1
+        changed = False
+        if _valid(lap_duration):
+            best = self.best_laps.get(driver_number)
+            if best is None or lap_duration < best[0]:
+                self.best_laps[driver_number] = (lap_duration, lap_number, st_speed)
+                changed = True
+
+        personal = self.personal_best_sectors.get(driver_number)
+        for sector, duration in enumerate(sectors[:len(SECTOR_COLUMNS)]):
+            if not _valid(duration):
+                continue
+            if personal is None:
+                personal = self.personal_best_sectors[driver_number] = [None] * len(SECTOR_COLUMNS)
+            if personal[sector] is None or duration < personal[sector]:
+                personal[sector] = duration
+                changed = True
+            session_best = self.session_best_sectors[sector]
+            if session_best is None or duration < session_best[0]:
+                self.session_best_sectors[sector] = (duration, driver_number, lap_number)
+        return changed
+
+    def update_record(self, record):
+        """Fold in one lap given as a mapping, e.g. a decoded API record"""
+        return self.update(*(record.get(name) for name in TRACKED_COLUMNS))
+
+    def update_frame(self, laps_df):
+        """Fold in every lap of a lap table, in row order; returns whether any best changed"""
+        columns = [laps_df[name].tolist() if name in laps_df.columns else [None] * len(laps_df)
+                   for name in TRACKED_COLUMNS]
+        changed = False
+        for lap in zip(*columns):
+            changed |= self.update(*lap)
+        return changed
+
+    def summary(self, drivers_df=None, positions_df=None):
+        """Snapshot of the best laps as the fastest_lap_summary table, fastest first (ties by driver_number)"""
+        import pandas as pd
+
+        from openf1_pipeline import SUMMARY_COLUMNS
+        from openf1_schema import COLUMN_TYPES
+
+        driver_numbers = sorted(self.best_laps)
+        best = [self.best_laps[driver_number] for driver_number in driver_numbers]
+        summary = pd.DataFrame({
+            'driver_number': pd.Series(driver_numbers, dtype=COLUMN_TYPES['driver_number']),
+            'lap_duration': pd.Series([lap[0] for lap in best], dtype=COLUMN_TYPES['lap_duration']),
+            'st_speed': pd.Series([lap[2] for lap in best], dtype=COLUMN_TYPES['st_speed']),
+        })
+        for side in (drivers_df, positions_df):
+            if side is None or side.empty:
+                continue
+            wanted = [name for name in SUMMARY_COLUMNS if name in side.columns and name not in summary.columns]
+            aligned = side.drop_duplicates('driver_number').set_index('driver_number')[wanted]
+            for name in wanted:
+                summary[name] = aligned[name].reindex(driver_numbers).array
+        columns = [column for column in SUMMARY_COLUMNS if column in summary.columns]
+        return summary[columns].sort_values('lap_duration', kind='stable', ignore_index=True)
+
+    def sectors(self):
+        """Snapshot of the personal-best sectors of every driver, with session-best flags"""
+        import pandas as pd
+
+        from openf1_schema import COLUMN_TYPES
+
+        driver_numbers = list(self.personal_best_sectors)
+        table = {'driver_number': pd.Series(driver_numbers, dtype=COLUMN_TYPES['driver_number'])}
+        for sector, name in enumerate(SECTOR_COLUMNS):
+            durations = [self.personal_best_sectors[driver_number][sector] for driver_number in driver_numbers]
+            table[name] = pd.Series(durations, dtype=COLUMN_TYPES[name])
+            session_best = self.session_best_sectors[sector]
+            table[f'{name}_session_best'] = [
+                session_best is not None and session_best[1] == driver_number for driver_number in driver_numbers
+            ]
+        return pd.DataFrame(table)
+
+
+class LapGroupSpeeds:
+    """Mean speed-trap speed of every driver per block of `window` laps, updated lap by lap.
+
+    Keeps a running sum and count per (driver, lap group), so a new lap costs
+    O(1); a lap fed again (completed since) replaces its earlier speed. With
+    the drivers passed in the order of the drivers table, frame() gives the
+    same table as speed_by_lap_group(merged_df, window), whose drivers come
+    in the order of the merged laps.
+    """
+
+    def __init__(self, window=5):
+        self.window = window
+        # (driver_number, lap_group) -> [sum of st_speed, number of laps]
+        self._totals = {}
+        # (driver_number, lap_number) -> st_speed already counted
+        self._speeds = {}
+        # driver_number -> None, in order of first appearance
+        self._drivers = {}
+
+    def update(self, driver_number, lap_number, st_speed):
+        """Fold one lap in; returns whether the table changed"""
+        if lap_number is None or st_speed is None or math.isnan(st_speed):
+            return False
+        previous = self._speeds.get((driver_number, lap_number))
+        if previous == st_speed:
+            return False
+        lap_group = ((lap_number - 1) // self.window) * self.window + 1
+        totals = self._totals.setdefault((driver_number, lap_group), [0.0, 0])
+        if previous is not None:
+            totals[0] -= previous
+            totals[1] -= 1
+        totals[0] += st_speed
+        totals[1] += 1
+        self._speeds[(driver_number, lap_number)] = st_speed
+        self._drivers.setdefault(driver_number, None)
+        return True
+
+    def update_record(self, record):
+        """Fold in one lap given as a mapping, e.g. a decoded API record"""
+        return self.update(record.get('driver_number'), record.get('lap_number'), record.get('st_speed'))
+
+    def frame(self, names=None, driver_column='full_name', colours=None):
+        """Snapshot as a tidy table, drivers labelled through names ({driver_number: name}).
+
+        Drivers come in the order of names, then any others in order of
+        first appearance. With colours ({driver_number: team_colour}) the table also has the
+        team_colour column that speed_by_lap_group(..., keep=('team_colour',)) gives.
+        """
+        import pandas as pd
+
+        names = names or {}
+        order = {driver_number: index for index, driver_number in enumerate({**names, **self._drivers})}
+        keys = sorted(self._totals, key=lambda key: (order[key[0]], key[1]))
+        table = {
+            driver_column: [names.get(driver_number, str(driver_number)) for driver_number, _ in keys],
+            'lap_group': [lap_group for _, lap_group in keys],
+            'st_speed': [self._totals[key][0] / self._totals[key][1] for key in keys],
+        }
+        if colours is not None:
+            table['team_colour'] = [colours.get(driver_number) for driver_number, _ in keys]
+        return pd.DataFrame(table)
@@ -1,46 +1,42 @@
-from urllib.request import urlopen
-import json
+from openf1_analysis import speed_by_lap_group
+from openf1_cache import ResponseCache
+from openf1_fetch import OpenF1Fetcher
+from openf1_index import SessionIndex
+from openf1_pipeline import fastest_lap_summary, merge_session, race_lap_count, resolve_final_positions
+from openf1_schema import DRIVERS, LAPS
+from openf1_store import PARTITION_KEYS, write_session, write_table
 import pandas as pd
-from datetime import datetime
-import matplotlib.pyplot as plt
-import numpy as np
-import time
 
 # Como obtener cualquier clave de sesión de acuerdo a país, tipo de sesión y año (Escalable a cualquier carrera si se añade ingresar por teclado)
 print("Getting session key for specific country, session type, and year")
 country = "Singapore"  # Se puede cambiar a cualquier país que tenga carreras de F1
 session = "Race"
 year = 2023
-url = f"https://api.openf1.org/v1/sessions?country_name={country}&session_name={session}&year={year}"
-initial_response = urlopen(url)
-data = json.loads(initial_response.read().decode('utf-8'))
+fetcher = OpenF1Fetcher(cache=ResponseCache())
+# El índice trae todas las sesiones del año en un solo pedido y de ahí salen la clave, el lugar y las fechas
+session_record = SessionIndex(fetcher).find(country, session, year)
 
-if data:
-    session_key = data[0]['session_key']
+if session_record:
+    session_key = session_record['session_key']
     print(f"Session key for {country} {session} {year}: {session_key}")
 else:
     print("No session found for the given parameters.")
 
-# Get session information for the latest session to get race location
-print("\nGetting session information for latest session")
-session_response = urlopen(f'https://api.openf1.org/v1/sessions?session_key={session_key}')
-session_data = json.loads(session_response.read().decode('utf-8'))
-race_location = session_data[0]['location'] if session_data else "Unknown"
-print(f"Race location: {race_location}") #Revisar si es repetitivo con el bloque que averigua la session_key a partir de país, tipo de sesión y año
+# La ubicación ya viene en el registro de la sesión, no hace falta volver a consultar la API
+session_data = [session_record]
+race_location = session_record['location']
+print(f"Race location: {race_location}")
+session_partition = [session_data[0][key] for key in PARTITION_KEYS]  # year, meeting_key, session_key
 
 # Get all drivers data for the latest session
 print("\nGetting drivers data for latest session")
-response = urlopen(f'https://api.openf1.org/v1/drivers?session_key={session_key}') 
-drivers_data = json.loads(response.read().decode('utf-8'))
+drivers_data = fetcher.get('drivers', session_key=session_key)
 print("Raw drivers JSON data:") #opcional debug print?
 print(drivers_data)
 
-# Create DataFrame from drivers data and remove unwanted fields
-drivers_df = pd.DataFrame(drivers_data)
+# Create DataFrame from drivers data, projecting away the unwanted fields
 fields_to_remove = ['headshot_url', 'first_name', 'last_name', 'broadcast_name', 'country_code'] #Dejo 'team_colour' para usarlo en el gráfico
-for field in fields_to_remove:
-    if field in drivers_df.columns:
-        drivers_df = drivers_df.drop(field, axis=1)
+drivers_df = DRIVERS.without(*fields_to_remove).frame(drivers_data)
 print("\nDrivers DataFrame:")
 print(drivers_df)
 
@@ -48,70 +44,23 @@ print(drivers_df)
 print("\nGetting lap data for all drivers in latest session")
 all_laps_data = []
 
-for driver in drivers_data:
-    driver_number = driver['driver_number']
-    print(f"Getting laps for driver {driver_number}")
-    
-    try:
-        # Get all laps for this driver in the latest session
-        lap_response = urlopen(f'https://api.openf1.org/v1/laps?session_key={session_key}&driver_number={driver_number}')
-        lap_data = json.loads(lap_response.read().decode('utf-8'))
-        
-        # Add each lap to our collection (remove unwanted fields)
-        for lap in lap_data:
-            # Keep only desired fields
-            lap_cleaned = {
-                k: v for k, v in lap.items() 
-                if not k.startswith('segments_sector') 
-                and not k.startswith('duration_sector')
-                and k not in ['i1_speed', 'i2_speed']
-            }
-            all_laps_data.append(lap_cleaned)
-            
-    except Exception as e:
-        print(f"Error getting laps for driver {driver_number}: {e}")
-
-# Get finishing positions for all drivers in the latest session
-print("\nGetting finishing positions for all drivers in latest session")
-all_positions_data = []
-
-for driver in drivers_data:
-    driver_number = driver['driver_number']
-    print(f"Getting final position for driver {driver_number}")
-    
-    try:
-        # Get position data for this driver in the latest session
-        position_response = urlopen(f'https://api.openf1.org/v1/position?session_key={session_key}&driver_number={driver_number}')
-        position_data = json.loads(position_response.read().decode('utf-8'))
-        
-        # Get the last position entry (finishing position)
-        if position_data:
-            final_position = position_data[-1]  # Last entry is the finishing position
-            all_positions_data.append({
-                'driver_number': driver_number,
-                'final_position': final_position['position'],
-                'date': final_position['date']
-            })
-            # Si este piloto terminó primero, el número de vueltas que relizó es el total de vueltas de la carrera
-            if final_position['position'] == 1:
-                lap_response = urlopen(f'https://api.openf1.org/v1/laps?session_key={session_key}&driver_number={driver_number}')
-                lap_data = json.loads(lap_response.read().decode('utf-8'))
-                num_laps = len(lap_data)
-        else:
-            print(f"No position data for driver {driver_number}")
-            
-    except Exception as e:
-        print(f"Error getting position for driver {driver_number}: {e}")
+driver_numbers = [driver['driver_number'] for driver in drivers_data]
+print(f"Getting laps for {len(driver_numbers)} drivers")
+# Laps are projected to the kept columns as they are decoded, so the full raw response is never held in memory
+laps_by_driver, lap_errors = fetcher.get_session_bulk('laps', session_key, driver_numbers, transform=LAPS.row)
 
-    time.sleep(0.5)  # Espera medio segundo entre solicitudes
+for driver_number in driver_numbers:
+    if driver_number in lap_errors:
+        print(f"Error getting laps for driver {driver_number}: {lap_errors[driver_number]}")
+        continue
 
-print(f"Número de vueltas de la carrera: {num_laps}")
+    # Add each lap to our collection
+    all_laps_data.extend(laps_by_driver[driver_number])
 
-# Create DataFrame from positions data
-positions_df = pd.DataFrame(all_positions_data)
-# Format date column if it exists
-if not positions_df.empty and 'date' in positions_df.columns:
-    positions_df['date'] = pd.to_datetime(positions_df['date'], format='ISO8601').dt.strftime('%Y-%m-%d %H:%M:%S')
+# Get finishing positions for all drivers in the latest session
+print("\nGetting finishing positions for all drivers in latest session")
+# Only the end of the position history is requested, not every position change of the session
+positions_df = resolve_final_positions(fetcher, session_data[0], driver_numbers)
 print(f"\nPositions DataFrame:")
 if not positions_df.empty: #Revisa si hay datos de posiciones
     print(positions_df)
@@ -121,43 +70,21 @@ else:
     print("No position data available")
 
 # Create DataFrame from all laps data
-laps_df = pd.DataFrame(all_laps_data)
-# Format date_start column if it exists
-if not laps_df.empty and 'date_start' in laps_df.columns:
-    laps_df['date_start'] = pd.to_datetime(laps_df['date_start'], format='ISO8601').dt.strftime('%Y-%m-%d %H:%M:%S')
+laps_df = LAPS.to_frame(all_laps_data)
 print(f"\nLaps DataFrame ({len(all_laps_data)} total laps):")
 if not laps_df.empty:
     print(laps_df.head())
 else:
     print("No lap data available")
 
+# El número de vueltas de la carrera sale de las vueltas del ganador que ya están en memoria
+num_laps = race_lap_count(laps_df, positions_df, session_data[0])
+print(f"Número de vueltas de la carrera: {num_laps}")
+
 # Merge/link the data - join drivers info with their laps and positions
 if not laps_df.empty:
-    # Merge drivers with laps data
-    merged_df = pd.merge(laps_df, drivers_df, on='driver_number', how='left')
-    
-    # Also merge with positions data if available
-    if not positions_df.empty:
-        merged_df = pd.merge(merged_df, positions_df, on='driver_number', how='left')
-    
-    # Clean up duplicate columns (session_key_x/y, meeting_key_x/y)
-    if 'session_key_x' in merged_df.columns and 'session_key_y' in merged_df.columns:
-        # Check if they're the same values
-        if merged_df['session_key_x'].equals(merged_df['session_key_y']):
-            merged_df = merged_df.drop('session_key_y', axis=1)
-            merged_df = merged_df.rename(columns={'session_key_x': 'session_key'})
-            print("Removed duplicate session_key column")
-    
-    if 'meeting_key_x' in merged_df.columns and 'meeting_key_y' in merged_df.columns:
-        # Check if they're the same values
-        if merged_df['meeting_key_x'].equals(merged_df['meeting_key_y']):
-            merged_df = merged_df.drop('meeting_key_y', axis=1)
-            merged_df = merged_df.rename(columns={'meeting_key_x': 'meeting_key'})
-            print("Removed duplicate meeting_key column")
-    
-    # Add race location to merged data
-    if 'race_location' not in merged_df.columns:
-        merged_df['race_location'] = race_location
+    # Join driver info, final positions and race location onto the laps in one pass
+    merged_df = merge_session(laps_df, drivers_df, positions_df, race_location)
     
     print(f"\nMerged DataFrame (laps with driver info and positions):")
     print(merged_df.head())
@@ -172,35 +99,25 @@ if not laps_df.empty:
     if not positions_df.empty:
         print(f"Drivers with position data: {len(positions_df)}")
     
-    # Save to CSV files
-    drivers_df.to_csv('f1_drivers_session_latest.csv', index=False)
-    laps_df.to_csv('f1_laps_session_latest.csv', index=False)
-    merged_df.to_csv('f1_merged_data_session_latest.csv', index=False)
-    if not positions_df.empty:
-        positions_df.to_csv('f1_positions_session_latest.csv', index=False)
-    
-    file_list = "f1_drivers_session_latest.csv, f1_laps_session_latest.csv, f1_merged_data_session_latest.csv"
-    if not positions_df.empty:
-        file_list += ", f1_positions_session_latest.csv"
-    print(f"CSV files saved: {file_list}")
+    # Save the session tables to the columnar store
+    saved = write_session(
+        {'drivers': drivers_df, 'laps': laps_df, 'merged': merged_df, 'positions': positions_df},
+        *session_partition
+    )
+    print(f"Session tables saved: {', '.join(saved.values())}")
     
     # Get fastest lap for each driver
     print("\nAnalyzing fastest laps for each driver")
     
-    # Filter out laps with null duration and get fastest lap per driver
-    valid_laps = merged_df[merged_df['lap_duration'].notna() & (merged_df['lap_duration'] > 0)]
-    fastest_laps = valid_laps.loc[valid_laps.groupby('driver_number')['lap_duration'].idxmin()]
-    
-    # Create summary DataFrame with fastest lap info
-    fastest_lap_summary = fastest_laps[['driver_number', 'full_name', 'team_name', 'lap_duration', 'st_speed', 'final_position']].copy()
-    fastest_lap_summary = fastest_lap_summary.sort_values('lap_duration')
+    # Fastest valid lap of every driver, sorted by lap time
+    lap_summary = fastest_lap_summary(merged_df)
     
     print("\nFastest lap summary:")
-    print(fastest_lap_summary)
+    print(lap_summary)
     
     # Save fastest lap summary
-    fastest_lap_summary.to_csv('f1_fastest_laps_summary.csv', index=False)
-    print("Fastest lap summary saved to: f1_fastest_laps_summary.csv")
+    summary_path = write_table(lap_summary, 'fastest_laps', *session_partition)
+    print(f"Fastest lap summary saved to: {summary_path}")
     
     # Crear gráfico simple de velocidades por vuelta con promedio cada 5 vueltas
     print("\nCreating simple speed vs lap visualization (5-lap averages)")
@@ -210,36 +127,28 @@ if not laps_df.empty:
         lambda x: f'#{x}' if pd.notna(x) and not str(x).startswith('#') else x
     )
     
-    # Filtrar datos válidos
-    speed_data = merged_df[merged_df['st_speed'].notna() & merged_df['lap_number'].notna()]
+    # Promedio de velocidad por grupo de 5 vueltas para todos los pilotos en un solo groupby
+    speed_avg = speed_by_lap_group(merged_df, window=5, keep=('team_colour',))
     
-    if not speed_data.empty:
+    if not speed_avg.empty:
+        # matplotlib solo se importa si hay algo que graficar
+        import matplotlib.pyplot as plt
+
         plt.figure(figsize=(12, 6))
         
         # Incluir TODOS los pilotos
-        for piloto in speed_data['full_name'].unique():
-            datos_piloto = speed_data[speed_data['full_name'] == piloto].copy()
-            color_equipo = datos_piloto['team_colour'].iloc[0]  # Color del equipo adecado al piloto
-            
-            # Crear grupos de 5 vueltas
-            datos_piloto['lap_group'] = ((datos_piloto['lap_number'] - 1) // 5) * 5 + 1
-            
-            # Calcular promedio de velocidad por grupo de 5 vueltas
-            speed_avg = datos_piloto.groupby('lap_group')['st_speed'].mean().reset_index()
-            
-            # Solo mostrar si tiene datos suficientes
-            if len(speed_avg) > 0:
-                # Usar solo el apellido para la leyenda
-                apellido = piloto.split()[-1]
-                plt.plot(
-                    speed_avg['lap_group'],
-                    speed_avg['st_speed'], 
-                    marker='o',
-                    label=apellido,
-                    markersize=4,
-                    linewidth=1.3,
-                    color=color_equipo  # Usar color del equipo
-                )
+        for piloto, datos_piloto in speed_avg.groupby('full_name', observed=True, sort=False):
+            # Usar solo el apellido para la leyenda
+            apellido = piloto.split()[-1]
+            plt.plot(
+                datos_piloto['lap_group'],
+                datos_piloto['st_speed'], 
+                marker='o',
+                label=apellido,
+                markersize=4,
+                linewidth=1.3,
+                color=datos_piloto['team_colour'].iloc[0]  # Usar color del equipo
+            )
         
         plt.xlabel("Vuelta (inicio de grupo de 5)")
         plt.ylabel("Velocidad promedio (km/h)")
@@ -261,5 +170,5 @@ else:
     print("No lap data available for merging")
     # Still save drivers data if available
     if not drivers_df.empty:
-        drivers_df.to_csv('f1_drivers_session_latest.csv', index=False)
-        print("Drivers data saved to: f1_drivers_session_latest.csv")
\ No newline at end of file
+        drivers_path = write_table(drivers_df, 'drivers', *session_partition)
+        print(f"Drivers data saved to: {drivers_path}")
\ No newline at end of file
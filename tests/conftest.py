@@ -0,0 +1,175 @@
+"""Shared fixtures: a scriptable local stand-in for the OpenF1 API"""
+import gzip
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openf1_http  # noqa: E402
+from openf1_session import clear_session_memos  # noqa: E402
+
+
+class StubServer:
+    """Local HTTP server answering each path with scripted responses.
+
+    stub.script('/v1/laps', (503, {}, b''), (200, {}, [...])) makes the first
+    request to /v1/laps fail and every later one succeed; the last response
+    of a script repeats. Bodies that are not bytes are sent as JSON, and
+    gzip-compressed when the client accepts it and the response headers ask
+    for it with {'gzip': True}. A callable body is called with the request
+    headers and query parameters and returns (status, headers, body).
+    stub.serve('/v1/laps', records) answers with the records matching the
+    query the way the API filters them. Every request is kept in `requests`
+    as (path with query, headers).
+    """
+
+    def __init__(self):
+        self.scripts = {}
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                stub.requests.append((self.path, dict(self.headers)))
+                parts = urlsplit(self.path)
+                path, params = parts.path, dict(parse_qsl(parts.query, keep_blank_values=True))
+                script = stub.scripts.get(path) or [(404, {}, {'detail': 'Not Found'})]
+                status, headers, body = script.pop(0) if len(script) > 1 else script[0]
+                headers = dict(headers)
+                if callable(body):
+                    status, headers, body = body(dict(self.headers), params)
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode('utf-8')
+                if headers.pop('gzip', False) and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    headers['Content-Encoding'] = 'gzip'
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_port}/v1'
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+
+    def script(self, path, *responses):
+        self.scripts[path] = list(responses)
+
+    def serve(self, path, records):
+        self.script(path, (200, {}, lambda headers, params: (200, {}, filter_records(records, params))))
+
+    def paths(self, prefix=''):
+        return [path for path, _ in self.requests if path.startswith(prefix)]
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def filter_records(records, params):
+    """Records matching API query parameters; 'date>=...' arrives as 'date>' and the bounds are inclusive"""
+    def matches(record):
+        for name, value in params.items():
+            if name[-1:] in '<>':
+                field = record.get(name[:-1])
+                if field is None:
+                    return False
+                field, bound = datetime.fromisoformat(field), datetime.fromisoformat(value)
+                bound = bound if bound.tzinfo else bound.replace(tzinfo=timezone.utc)
+                if field < bound if name[-1] == '>' else field > bound:
+                    return False
+            elif value != 'latest' and name in record and str(record[name]) != value:
+                return False
+        return True
+
+    return [record for record in records if matches(record)]
+
+
+SESSION_START = datetime(2023, 9, 17, 12, 0, tzinfo=timezone.utc)
+
+
+def race(laps=6):
+    """API records of a short finished race of three drivers, by endpoint.
+
+    Drivers are listed out of number order. Driver 55 wins, driver 1 last
+    changes place 20 minutes in and driver 4 has no time for lap 1.
+    """
+    session = {'session_key': 9165, 'meeting_key': 1219, 'year': 2023, 'location': 'Marina Bay',
+               'country_name': 'Singapore', 'session_name': 'Race', 'session_type': 'Race',
+               'date_start': SESSION_START.isoformat(), 'date_end': (SESSION_START + timedelta(hours=2)).isoformat()}
+    keys = {'meeting_key': 1219, 'session_key': 9165}
+    drivers = [
+        {**keys, 'driver_number': 1, 'full_name': 'Max VERSTAPPEN', 'name_acronym': 'VER',
+         'team_name': 'Red Bull Racing', 'team_colour': '3671C6', 'headshot_url': 'https://example.org/1.png'},
+        {**keys, 'driver_number': 55, 'full_name': 'Carlos SAINZ', 'name_acronym': 'SAI',
+         'team_name': 'Ferrari', 'team_colour': 'F91536', 'headshot_url': 'https://example.org/55.png'},
+        {**keys, 'driver_number': 4, 'full_name': 'Lando NORRIS', 'name_acronym': 'NOR',
+         'team_name': 'McLaren', 'team_colour': 'F58020', 'headshot_url': None},
+    ]
+    lap_records = []
+    for offset, driver_number in enumerate((1, 55, 4)):
+        for lap_number in range(1, laps + 1):
+            duration = 100 - offset + (lap_number % 3) * 0.5
+            lap_records.append({
+                **keys, 'driver_number': driver_number, 'lap_number': lap_number,
+                'date_start': (SESSION_START + timedelta(minutes=5, seconds=100 * (lap_number - 1))).isoformat(),
+                'lap_duration': None if (driver_number, lap_number) == (4, 1) else duration,
+                'duration_sector_1': 30 + offset * 0.1 + lap_number * 0.01, 'duration_sector_2': 35.0,
+                'duration_sector_3': duration - 65, 'i1_speed': 280, 'i2_speed': 270,
+                'st_speed': 300 + offset + lap_number, 'is_pit_out_lap': lap_number == 1 or None,
+                'segments_sector_1': [2049, 2051][:1 + lap_number % 2], 'segments_sector_2': [2048],
+                'segments_sector_3': [2049, 2049, 2064],
+            })
+    lap_records.sort(key=lambda record: record['date_start'])
+
+    def sample(minutes, driver_number, position):
+        return {**keys, 'driver_number': driver_number, 'position': position,
+                'date': (SESSION_START + timedelta(minutes=minutes)).isoformat()}
+
+    positions = [sample(0, 1, 1), sample(0, 55, 2), sample(0, 4, 3),
+                 sample(20, 55, 1), sample(20, 1, 2), sample(117, 4, 3)]
+    return {'sessions': [session], 'drivers': drivers, 'laps': lap_records, 'position': positions}
+
+
+def serve_race(stub, records):
+    for endpoint, endpoint_records in records.items():
+        stub.serve(f'/v1/{endpoint}', endpoint_records)
+
+
+@pytest.fixture(autouse=True)
+def _fresh_memos():
+    clear_session_memos()
+    yield
+    clear_session_memos()
+
+
+@pytest.fixture
+def stub():
+    server = StubServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff sleeps of the HTTP client, recorded instead of slept"""
+    recorded = []
+    monkeypatch.setattr(openf1_http.time, 'sleep', recorded.append)
+    return recorded
@@ -0,0 +1,104 @@
+import itertools
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from openf1_cache import ResponseCache, is_finished
+from openf1_fetch import OpenF1Fetcher
+
+LAPS = [{'driver_number': 1, 'lap_number': 1, 'lap_duration': 95.1}]
+
+
+def _date(**delta):
+    return (datetime.now(timezone.utc) + timedelta(**delta)).isoformat()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ResponseCache(str(tmp_path / 'cache'), latest_ttl=60)
+
+
+def test_store_and_lookup(cache):
+    assert cache.lookup('laps', {'session_key': 9165}) is None
+    cache.store('laps', {'session_key': 9165, 'driver_number': 1}, b'[]', etag='"v1"')
+    entry = cache.lookup('laps', {'driver_number': '1', 'session_key': '9165'})
+    assert entry.read() == b'[]'
+    assert entry.validators() == {'If-None-Match': '"v1"'}
+
+
+def test_is_finished_waits_for_the_session_to_settle():
+    assert not is_finished(None)
+    assert not is_finished(_date(minutes=-30))
+    assert is_finished(_date(hours=-2))
+
+
+def test_ttl_follows_the_session_end(cache):
+    cache.note_sessions([{'session_key': 9165, 'year': 2023, 'date_end': '2023-09-17T14:00:00+00:00'},
+                         {'session_key': 9999, 'year': 2023, 'date_end': _date(hours=2)}])
+    assert cache.ttl('laps', {'session_key': 9165}) is None
+    assert cache.ttl('laps', {'session_key': 9165, 'date>': '2023-09-17T12:00:00'}) is None
+    assert cache.ttl('laps', {'session_key': 9999}) == 60
+    assert cache.ttl('laps', {'session_key': 'latest'}) == 60
+    # Unknown sessions fall back to the shape of the query
+    assert cache.ttl('laps', {'session_key': 1}) is None
+    assert cache.ttl('laps', {'session_key': 1, 'date>': '2023-09-17T12:00:00'}) == 60
+
+
+def test_season_pulls_expire_until_every_session_has_finished(cache):
+    assert cache.ttl('sessions', {'year': 2022}) == 60
+    cache.note_sessions([{'session_key': 8000, 'year': 2022, 'date_end': '2022-11-20T15:00:00+00:00'}])
+    assert cache.ttl('sessions', {'year': 2022}) is None
+    this_year = datetime.now(timezone.utc).year
+    cache.note_sessions([{'session_key': 9998, 'year': this_year, 'date_end': _date(days=-1)}])
+    assert cache.ttl('sessions', {'year': this_year}) == 60
+
+
+def test_storing_sessions_records_their_end(cache):
+    cache.store('sessions', {'year': 2022}, b'[{"session_key": 8000, "year": 2022, '
+                                            b'"date_end": "2022-11-20T15:00:00+00:00"}]')
+    assert cache.lookup('sessions', {'year': 2022}).ttl is None
+    assert cache.ttl('laps', {'session_key': 8000}) is None
+
+
+def test_finished_sessions_are_served_from_the_cache(stub, cache):
+    cache.note_sessions([{'session_key': 9165, 'year': 2023, 'date_end': '2023-09-17T14:00:00+00:00'}])
+    stub.script('/v1/laps', (200, {}, LAPS))
+    fetcher = OpenF1Fetcher(stub.url, rate=0, cache=cache)
+    assert fetcher.get('laps', session_key=9165) == LAPS
+    assert fetcher.get('laps', session_key=9165) == LAPS
+    assert list(fetcher.iter_records('laps', session_key=9165)) == LAPS
+    assert len(stub.paths('/v1/laps')) == 1
+
+
+def test_stale_entries_are_revalidated_with_their_etag(stub, tmp_path):
+    def not_modified(headers, params):
+        if headers.get('If-None-Match') == '"v1"':
+            return 304, {'ETag': '"v1"'}, b''
+        return 200, {'ETag': '"v2"'}, []
+
+    cache = ResponseCache(str(tmp_path / 'cache'), latest_ttl=0)
+    stub.script('/v1/laps', (200, {'ETag': '"v1"'}, LAPS), (200, {}, not_modified))
+    fetcher = OpenF1Fetcher(stub.url, rate=0, cache=cache)
+    assert fetcher.get('laps', session_key='latest') == LAPS
+    assert fetcher.get('laps', session_key='latest') == LAPS
+    assert list(fetcher.iter_records('laps', session_key='latest')) == LAPS
+
+    (_, first), (_, second), (_, third) = stub.requests
+    assert 'If-None-Match' not in first
+    assert second['If-None-Match'] == third['If-None-Match'] == '"v1"'
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr('openf1_cache.time.time', lambda: next(clock))
+    cache = ResponseCache(str(tmp_path / 'cache'), max_bytes=250)
+    body = b'x' * 100
+    cache.store('laps', {'session_key': 1}, body)
+    cache.store('laps', {'session_key': 2}, body)
+    assert cache.lookup('laps', {'session_key': 1}) is not None  # 1 is now more recent than 2
+    cache.store('laps', {'session_key': 3}, body)
+
+    assert cache.lookup('laps', {'session_key': 2}) is None
+    assert cache.lookup('laps', {'session_key': 1}) is not None
+    assert cache.lookup('laps', {'session_key': 3}) is not None
+    assert cache.size() == 200
@@ -0,0 +1,84 @@
+import io
+import json
+
+import pytest
+from conftest import filter_records, race
+
+from openf1_fetch import OpenF1Fetcher, iter_json_array
+from openf1_schema import LAPS
+
+ARRAYS = {
+    'objects': [{'driver_number': 1, 'lap_duration': 95.123, 'segments_sector_1': [2049, 2051]},
+                {'driver_number': 11, 'lap_duration': None, 'is_pit_out_lap': True}],
+    'numbers': [1.5, -2, 3e-4, 0, 12345.678, -0.5e+10],
+    'strings': ['Pérez', '', 'a "quoted" ] , value', 'Zhou 周冠宇'],
+    'nested': [[1, [2.25, []]], [], [[{'x': [3]}]], ['a', None, False]],
+}
+
+
+@pytest.mark.parametrize('name', ARRAYS)
+def test_every_chunk_size(name):
+    expected = ARRAYS[name]
+    body = json.dumps(expected, ensure_ascii=False).encode('utf-8')
+    for chunk_size in range(1, len(body) + 1):
+        assert list(iter_json_array(io.BytesIO(body), chunk_size)) == expected, chunk_size
+
+
+def test_whitespace_and_empty_arrays():
+    assert list(iter_json_array(io.BytesIO(b' \n[ ]\n'), 1)) == []
+    assert list(iter_json_array(io.BytesIO(b'[\n  1 ,\n  2\n]'), 2)) == [1, 2]
+
+
+@pytest.mark.parametrize('body', [b'[1.', b'[1.5', b'[{"a": 1}', b'[1, 2'])
+def test_truncated_arrays_raise(body):
+    with pytest.raises(ValueError, match='Truncated'):
+        list(iter_json_array(io.BytesIO(body), 1))
+
+
+def test_rejects_non_arrays():
+    with pytest.raises(ValueError, match='Expected a JSON array'):
+        list(iter_json_array(io.BytesIO(b'{"detail": "Not Found"}')))
+
+
+def test_session_bulk_splits_by_driver(stub):
+    records = race()
+    stub.serve('/v1/laps', records['laps'])
+    laps, errors = OpenF1Fetcher(stub.url, rate=0).get_session_bulk('laps', 9165, [1, 55, 4], transform=LAPS.row)
+    assert errors == {}
+    assert {driver_number: len(rows) for driver_number, rows in laps.items()} == {1: 6, 55: 6, 4: 6}
+    assert [row[3] for row in laps[55]] == [1, 2, 3, 4, 5, 6]  # lap_number, in API order
+    assert stub.paths('/v1/laps') == ['/v1/laps?session_key=9165']
+
+
+def test_session_bulk_fetches_drivers_missing_from_the_response(stub):
+    records = race()['laps']
+
+    def cut_short(headers, params):
+        if 'driver_number' not in params:
+            return 200, {}, [record for record in records if record['driver_number'] == 1]
+        return 200, {}, filter_records(records, params)
+
+    stub.script('/v1/laps', (200, {}, cut_short))
+    laps, errors = OpenF1Fetcher(stub.url, rate=0).get_session_bulk('laps', 9165, [1, 55, 4])
+    assert errors == {}
+    assert {driver_number: len(rows) for driver_number, rows in laps.items()} == {1: 6, 55: 6, 4: 6}
+    assert sorted(stub.paths('/v1/laps?session_key=9165&driver_number')) == [
+        '/v1/laps?session_key=9165&driver_number=4', '/v1/laps?session_key=9165&driver_number=55']
+
+
+def test_session_bulk_falls_back_to_per_driver_requests(stub, sleeps):
+    records = race()['laps']
+
+    def bulk_fails(headers, params):
+        if 'driver_number' not in params:
+            return 503, {}, b''
+        if params['driver_number'] == '4':
+            return 500, {}, b''
+        return 200, {}, filter_records(records, params)
+
+    stub.script('/v1/laps', (200, {}, bulk_fails))
+    laps, errors = OpenF1Fetcher(stub.url, rate=0, retries=1).get_session_bulk('laps', 9165, [1, 55, 4])
+    assert sorted(laps) == [1, 55]
+    assert [record['driver_number'] for record in laps[55]] == [55] * 6
+    assert list(errors) == [4]
+    assert errors[4].status == 500
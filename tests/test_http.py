@@ -0,0 +1,95 @@
+import gzip
+
+import pytest
+
+from openf1_fetch import OpenF1Fetcher
+from openf1_http import HTTPSession, RequestFailed
+from openf1_pipeline import failed_drivers
+
+LAPS = [{'driver_number': 1, 'lap_number': 1, 'lap_duration': 95.1},
+        {'driver_number': 1, 'lap_number': 2, 'lap_duration': 94.8}]
+
+
+def test_retries_5xx_then_succeeds(stub, sleeps):
+    stub.script('/v1/laps', (503, {}, b''), (502, {}, b''), (200, {}, LAPS))
+    fetcher = OpenF1Fetcher(stub.url, rate=0)
+    assert fetcher.get('laps', session_key=9165) == LAPS
+    assert len(stub.paths('/v1/laps')) == 3
+    assert len(sleeps) == 2
+
+
+def test_backoff_grows_and_is_capped(monkeypatch):
+    monkeypatch.setattr('openf1_http.random.uniform', lambda low, high: high)
+    session = HTTPSession(backoff=0.5, max_backoff=3)
+    assert [session.delay(attempt) for attempt in range(1, 5)] == [0.5, 1.0, 2.0, 3]
+
+
+def test_429_honours_retry_after(stub, sleeps):
+    stub.script('/v1/laps', (429, {'Retry-After': '2'}, b''), (200, {}, LAPS))
+    assert OpenF1Fetcher(stub.url, rate=0).get('laps', session_key=9165) == LAPS
+    assert sleeps == [2.0]
+
+
+def test_retry_after_is_capped_and_http_dates_fall_back(monkeypatch):
+    monkeypatch.setattr('openf1_http.random.uniform', lambda low, high: high)
+    session = HTTPSession(backoff=1, max_backoff=10)
+    assert session.delay(1, '120') == 10
+    assert session.delay(1, 'Wed, 21 Oct 2015 07:28:00 GMT') == 1
+
+
+def test_gives_up_with_request_failed(stub, sleeps):
+    stub.script('/v1/laps', (502, {}, b''))
+    with pytest.raises(RequestFailed) as failure:
+        OpenF1Fetcher(stub.url, rate=0, retries=2).get('laps', session_key=9165)
+    assert failure.value.status == 502
+    assert failure.value.attempts == 3
+    assert len(stub.paths('/v1/laps')) == 3
+
+
+def test_client_errors_are_not_retried(stub, sleeps):
+    stub.script('/v1/laps', (404, {}, {'detail': 'Not Found'}))
+    with pytest.raises(RequestFailed) as failure:
+        OpenF1Fetcher(stub.url, rate=0).get('laps', session_key=9165)
+    assert (failure.value.status, failure.value.attempts) == (404, 1)
+    assert sleeps == []
+
+
+def test_connection_errors_are_retried(sleeps):
+    session = HTTPSession(timeout=1, retries=1)
+    with pytest.raises(RequestFailed) as failure:
+        session.open('http://127.0.0.1:9/v1/laps')  # discard port, nothing listens
+    assert failure.value.status is None
+    assert failure.value.attempts == 2
+
+
+def test_failed_drivers_reports_status_and_attempts(stub, sleeps):
+    stub.script('/v1/laps', (500, {}, b''))
+    fetcher = OpenF1Fetcher(stub.url, rate=0, retries=1)
+    results, errors = fetcher.get_per_driver('laps', 9165, [1])
+    assert results == {}
+    report = failed_drivers({'laps': errors, 'positions': {}})
+    assert list(report) == ['laps']
+    failure, = report['laps']
+    assert failure['driver_number'] == 1
+    assert failure['error'] == 'RequestFailed'
+    assert (failure['status'], failure['attempts']) == (500, 2)
+    assert '500' in failure['message']
+
+
+def test_gzip_bodies_are_decoded(stub):
+    stub.script('/v1/laps', (200, {'gzip': True}, LAPS))
+    fetcher = OpenF1Fetcher(stub.url, rate=0)
+    assert fetcher.get('laps', session_key=9165) == LAPS
+    assert list(fetcher.iter_records('laps', session_key=9165)) == LAPS
+    path, headers = stub.requests[0]
+    assert 'gzip' in headers['Accept-Encoding']
+
+
+def test_gzip_response_is_streamed_not_buffered(stub):
+    body = gzip.compress(b'[' + b','.join(b'{"lap_number": %d}' % n for n in range(5000)) + b']')
+    stub.script('/v1/laps', (200, {'Content-Encoding': 'gzip'}, body))
+    with HTTPSession().open(f'{stub.url}/laps') as response:
+        first = response.read(16)
+        rest = response.read()
+    assert (first + rest).startswith(b'[{"lap_number": 0}')
+    assert (first + rest).endswith(b'{"lap_number": 4999}]')
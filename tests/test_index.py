@@ -0,0 +1,67 @@
+from openf1_fetch import OpenF1Fetcher
+from openf1_index import SessionIndex, read_circuits
+
+CIRCUITS = [('Singapore', 'Marina Bay'), ('Miami', 'Miami'), ('Monaco', 'Monaco')]
+
+
+def _session(session_key, meeting_key, year, country, location, session_name, date_start):
+    return {'session_key': session_key, 'meeting_key': meeting_key, 'year': year, 'country_name': country,
+            'location': location, 'session_name': session_name, 'date_start': date_start}
+
+
+SESSIONS = {
+    2023: [
+        _session(9161, 1219, 2023, 'Singapore', 'Marina Bay', 'Qualifying', '2023-09-16T13:00:00+00:00'),
+        _session(9165, 1219, 2023, 'Singapore', 'Marina Bay', 'Race', '2023-09-17T12:00:00+00:00'),
+        _session(9078, 1208, 2023, 'United States', 'Miami', 'Race', '2023-05-07T19:30:00+00:00'),
+    ],
+    2024: [_session(9574, 1240, 2024, 'Singapore', 'Marina Bay', 'Race', '2024-09-22T12:00:00+00:00')],
+}
+
+
+def _index(stub):
+    stub.script('/v1/sessions', (200, {}, lambda headers, params: (200, {}, SESSIONS.get(int(params['year']), []))))
+    return SessionIndex(OpenF1Fetcher(stub.url, rate=0), CIRCUITS)
+
+
+def test_find_pulls_each_year_once(stub):
+    index = _index(stub)
+    assert index.find('Singapore', 'Race', 2023)['session_key'] == 9165
+    assert index.find('singapore', 'qualifying', 2023)['session_key'] == 9161
+    assert index.find('Marina Bay', 'Race', 2024)['session_key'] == 9574
+    assert stub.paths('/v1/sessions') == ['/v1/sessions?year=2023', '/v1/sessions?year=2024']
+
+
+def test_races_listed_by_circuit_are_found(stub):
+    # Countries.csv lists Miami, whose country_name is the United States
+    assert _index(stub).find('Miami', 'Race', 2023)['session_key'] == 9078
+
+
+def test_find_without_a_year_uses_the_latest_pulled(stub):
+    index = _index(stub)
+    assert index.find('Singapore') is None
+    assert stub.paths('/v1/sessions') == []
+    index.load_year(2023)
+    index.load_year(2024)
+    assert index.find('Singapore')['session_key'] == 9574
+    assert index.find('Miami')['session_key'] == 9078
+
+
+def test_lookups_by_key_and_meeting(stub):
+    index = _index(stub)
+    assert index.session(9165) is None
+    index.load_year(2023)
+    assert index.session(9165)['location'] == 'Marina Bay'
+    assert [session['session_key'] for session in index.meeting(1219)] == [9161, 9165]
+
+
+def test_sessions_reports_missing_combinations(stub):
+    found, missing = _index(stub).sessions([2023], ['Race'])
+    assert [session['session_key'] for session in found] == [9165, 9078]
+    assert missing == [('Monaco', 'Race', 2023)]
+
+
+def test_read_circuits():
+    circuits = read_circuits()
+    assert ('Singapore', 'Marina Bay') in circuits and ('Miami', 'Miami') in circuits
+    assert all(country and circuit for country, circuit in circuits)
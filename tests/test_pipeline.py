@@ -0,0 +1,97 @@
+import pandas as pd
+from conftest import race, serve_race
+
+from openf1_fetch import OpenF1Fetcher
+from openf1_pipeline import (fastest_lap_summary, final_positions, load_session, merge_session, process_session,
+                             race_lap_count)
+from openf1_schema import DRIVERS, LAPS, POSITIONS
+from openf1_store import read_partition
+
+
+def _tables(records=None):
+    records = records or race()
+    return (LAPS.frame(records['laps']), DRIVERS.frame(records['drivers']),
+            final_positions(map(POSITIONS.row, records['position'])))
+
+
+def test_final_positions_keep_the_last_sample():
+    _, _, positions_df = _tables()
+    assert dict(zip(positions_df['driver_number'], positions_df['final_position'])) == {1: 2, 55: 1, 4: 3}
+
+
+def test_merge_session_joins_drivers_and_positions():
+    laps_df, drivers_df, positions_df = _tables()
+    merged = merge_session(laps_df, drivers_df, positions_df, 'Marina Bay')
+
+    assert len(merged) == len(laps_df)
+    assert merged.index.equals(laps_df.index)
+    expected = laps_df.merge(drivers_df.drop(columns=['meeting_key', 'session_key']), on='driver_number',
+                             how='left').merge(positions_df, on='driver_number', how='left')
+    for column in ['full_name', 'team_name', 'final_position', 'date']:
+        assert merged[column].tolist() == expected[column].tolist()
+    assert merged['race_location'].unique().tolist() == ['Marina Bay']
+    # Side table types are kept, not widened by the join
+    assert merged['team_name'].dtype == drivers_df['team_name'].dtype
+    assert merged['final_position'].dtype == 'Int8'
+
+
+def test_merge_session_leaves_unknown_drivers_missing():
+    laps_df, drivers_df, positions_df = _tables()
+    merged = merge_session(laps_df, drivers_df[drivers_df['driver_number'] != 4], positions_df.iloc[:0])
+    unknown = merged[merged['driver_number'] == 4]
+    assert unknown['full_name'].isna().all()
+    assert merged.loc[merged['driver_number'] == 1, 'full_name'].eq('Max VERSTAPPEN').all()
+    assert 'final_position' not in merged.columns and 'race_location' not in merged.columns
+
+
+def test_race_lap_count_is_the_winners_laps():
+    records = race()
+    laps_df, _, positions_df = _tables(records)
+    laps_df = laps_df[~((laps_df['driver_number'] == 55) & (laps_df['lap_number'] == 6))]
+    assert race_lap_count(laps_df, positions_df) == 5
+    assert race_lap_count(laps_df, positions_df.iloc[:0]) is None
+
+
+def test_race_lap_count_memoizes_finished_sessions_only():
+    records = race()
+    session = records['sessions'][0]
+    laps_df, _, positions_df = _tables(records)
+    assert race_lap_count(laps_df, positions_df, session) == 6
+    # The session is final, so its distance is not worked out again
+    assert race_lap_count(laps_df.iloc[:0], positions_df, session) == 6
+    running = {**session, 'session_key': 9166, 'date_end': None}
+    assert race_lap_count(laps_df, positions_df, running) == 6
+    assert race_lap_count(laps_df[laps_df['lap_number'] < 4], positions_df, running) == 3
+
+
+def test_fastest_lap_summary():
+    laps_df, drivers_df, positions_df = _tables()
+    summary = fastest_lap_summary(merge_session(laps_df, drivers_df, positions_df))
+    assert summary['driver_number'].tolist() == [4, 55, 1]
+    assert summary['lap_duration'].tolist() == [98.0, 99.0, 100.0]
+    assert summary.columns.tolist() == ['driver_number', 'full_name', 'team_name', 'lap_duration', 'st_speed',
+                                        'final_position']
+
+
+def test_load_session(stub):
+    serve_race(stub, race())
+    tables = load_session(OpenF1Fetcher(stub.url, rate=0), 9165)
+    assert tables['session']['location'] == 'Marina Bay'
+    assert tables['drivers']['driver_number'].tolist() == [1, 55, 4]
+    assert 'headshot_url' not in tables['drivers'].columns
+    # Laps come in drivers table order
+    assert tables['laps']['driver_number'].tolist() == [1] * 6 + [55] * 6 + [4] * 6
+    assert tables['positions']['final_position'].tolist() == [2, 1, 3]
+
+
+def test_process_session_writes_every_table(stub, tmp_path):
+    serve_race(stub, race())
+    report = process_session(OpenF1Fetcher(stub.url, rate=0), 9165, root=str(tmp_path), format='csv')
+    assert report['partition'] == (2023, 1219, 9165)
+    assert (report['laps'], report['drivers'], report['failed_drivers']) == (18, 3, {})
+    assert sorted(report['paths']) == ['drivers', 'fastest_laps', 'laps', 'merged', 'positions']
+    merged = read_partition('merged', 2023, 1219, 9165, root=str(tmp_path), format='csv')
+    assert merged['race_location'].unique().tolist() == ['Marina Bay']
+    summary = read_partition('fastest_laps', 2023, 1219, 9165, root=str(tmp_path), format='csv')
+    pd.testing.assert_series_equal(summary['driver_number'], pd.Series([4, 55, 1], dtype='int8',
+                                                                       name='driver_number'))
@@ -0,0 +1,97 @@
+import os
+
+import pandas as pd
+from conftest import SESSION_START, race, serve_race
+
+from openf1_fetch import OpenF1Fetcher
+from openf1_pipeline import process_session
+from openf1_refresh import lap_cursor, refresh_session
+from openf1_schema import LAPS
+from openf1_session import clear_session_memos
+from openf1_store import read_partition
+from openf1_tracker import FastestLapTracker
+
+TABLES = ('drivers', 'laps', 'positions', 'merged', 'fastest_laps')
+
+
+def _in_progress(records, laps):
+    """The race as the API had it during lap `laps`: that lap still open, later laps and samples missing"""
+    cutoff = SESSION_START + pd.Timedelta(minutes=5, seconds=100 * (laps - 1))
+    lap_records = []
+    for record in records['laps']:
+        if record['lap_number'] < laps:
+            lap_records.append(record)
+        elif record['lap_number'] == laps:
+            lap_records.append({**record, 'lap_duration': None, 'duration_sector_3': None})
+    positions = [record for record in records['position'] if pd.Timestamp(record['date']) <= cutoff]
+    return {**records, 'laps': lap_records, 'position': positions}
+
+
+def _stored(root, format='csv'):
+    return {table: read_partition(table, 2023, 1219, 9165, root=root, format=format) for table in TABLES}
+
+
+def test_refresh_matches_a_full_fetch(stub, tmp_path):
+    records = race()
+    fetcher = OpenF1Fetcher(stub.url, rate=0)
+    refreshed, full = str(tmp_path / 'refreshed'), str(tmp_path / 'full')
+
+    serve_race(stub, _in_progress(records, 3))
+    process_session(fetcher, 9165, root=refreshed, format='csv')
+    # The first run was during the session, so none of its results were final
+    clear_session_memos()
+    serve_race(stub, records)
+    del stub.requests[:]
+    tracker = FastestLapTracker()
+    report = refresh_session(fetcher, 9165, root=refreshed, format='csv', tracker=tracker)
+    # The open lap 3 of every driver and the laps after it, and the samples after the last stored
+    assert report['new_laps'] == 12
+    assert report['new_position_samples'] == 3
+    assert stub.paths('/v1/laps') == ['/v1/laps?session_key=9165&date_start>=2023-09-17T12%3A08%3A20']
+
+    process_session(fetcher, 9165, root=full, format='csv')
+    expected = _stored(full)
+    for table, df in _stored(refreshed).items():
+        pd.testing.assert_frame_equal(df, expected[table], check_categorical=False, obj=table)
+
+
+def test_refresh_of_an_unknown_session_fetches_it_whole(stub, tmp_path):
+    serve_race(stub, race())
+    report = refresh_session(OpenF1Fetcher(stub.url, rate=0), 9165, root=str(tmp_path), format='csv')
+    assert report['laps'] == 18
+    # The session record found first is handed on, not looked up again
+    assert len(stub.paths('/v1/sessions')) == 1
+
+
+def test_refresh_resolves_positions_never_stored(stub, tmp_path):
+    records = race()
+    root = str(tmp_path)
+    serve_race(stub, {**records, 'position': []})
+    process_session(OpenF1Fetcher(stub.url, rate=0), 9165, root=root, format='csv')
+    assert read_partition('positions', 2023, 1219, 9165, root=root, format='csv') is None
+
+    # As if the first run had been during the session, before any result was final
+    clear_session_memos()
+    serve_race(stub, records)
+    report = refresh_session(OpenF1Fetcher(stub.url, rate=0), 9165, root=root, format='csv')
+    assert report['new_position_samples'] == 3
+    positions = read_partition('positions', 2023, 1219, 9165, root=root, format='csv')
+    assert dict(zip(positions['driver_number'], positions['final_position'])) == {1: 2, 55: 1, 4: 3}
+    assert os.path.exists(report['paths']['positions'])
+
+
+def test_lap_cursor_skips_retired_drivers():
+    records = race(laps=12)
+    laps = [record for record in records['laps']
+            if record['driver_number'] != 1 or record['lap_number'] <= 4]
+    for record in laps:
+        # Driver 1 retired on lap 4, driver 4 is on lap 12; 55 has just finished lap 12
+        if (record['driver_number'], record['lap_number']) in ((1, 4), (4, 12)):
+            record['lap_duration'] = None
+    laps_df = LAPS.frame(laps)
+    driver_4 = laps_df[(laps_df['driver_number'] == 4) & (laps_df['lap_number'] == 12)]
+    assert lap_cursor(laps_df) == driver_4['date_start'].iloc[0]
+
+    laps_df.loc[driver_4.index, 'lap_duration'] = 98.0
+    assert lap_cursor(laps_df) == laps_df['date_start'].max()
+    assert lap_cursor(laps_df.assign(date_start=pd.NaT)) is None
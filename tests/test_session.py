@@ -0,0 +1,74 @@
+from datetime import datetime, timedelta, timezone
+
+from conftest import race, serve_race
+
+from openf1_fetch import OpenF1Fetcher
+from openf1_session import SessionMemo, api_date, fetch_session, last_positions, parse_date, session_finished
+
+
+def test_date_helpers():
+    date = parse_date('2023-09-17T14:00:00.250000+02:00')
+    assert api_date(date) == '2023-09-17T12:00:00'
+    assert parse_date(None) is None
+
+
+def test_session_finished_waits_for_the_settle_time():
+    now = datetime(2023, 9, 17, 14, 30, tzinfo=timezone.utc)
+    assert not session_finished({'date_end': '2023-09-17T14:00:00+00:00'}, now)
+    assert session_finished({'date_end': '2023-09-17T14:00:00+00:00'}, now + timedelta(hours=1))
+    assert not session_finished({'date_end': None}, now)
+
+
+def test_last_positions_reads_back_from_the_end(stub):
+    records = race()
+    serve_race(stub, records)
+    fetcher = OpenF1Fetcher(stub.url, rate=0)
+    rows = last_positions(fetcher, records['sessions'][0], [1, 55, 4])
+    assert [(row[0], row[2]) for row in rows] == [(1, 2), (55, 1), (4, 3)]
+
+    # Driver 4 is in the first window; 1 and 55 last changed place long before the
+    # end, so after max_windows windows one request for the whole history finds them
+    requests = stub.paths('/v1/position')
+    assert len(requests) == 4
+    assert requests[0] == '/v1/position?session_key=9165&date>=2023-09-17T13%3A55%3A00'
+    assert requests[-1] == '/v1/position?session_key=9165'
+
+
+def test_last_positions_of_finished_sessions_are_memoized(stub):
+    records = race()
+    serve_race(stub, records)
+    fetcher = OpenF1Fetcher(stub.url, rate=0)
+    first = last_positions(fetcher, records['sessions'][0], [1, 55, 4])
+    requests = len(stub.requests)
+    assert last_positions(fetcher, records['sessions'][0], [1, 55, 4]) == first
+    assert len(stub.requests) == requests
+
+
+def test_last_positions_of_running_sessions_are_not_memoized(stub):
+    records = race()
+    session = {**records['sessions'][0], 'date_end': (datetime.now(timezone.utc) + timedelta(hours=1)).isoformat()}
+    serve_race(stub, records)
+    fetcher = OpenF1Fetcher(stub.url, rate=0)
+    last_positions(fetcher, session, [1, 55, 4])
+    requests = len(stub.requests)
+    last_positions(fetcher, session, [1, 55, 4])
+    assert len(stub.requests) > requests
+
+
+def test_session_memo_keeps_the_most_recently_used():
+    memo = SessionMemo(maxsize=2)
+    memo.put(1, 'a')
+    memo.put(2, 'b')
+    assert memo.get(1) == 'a'
+    memo.put(3, 'c')
+    assert (memo.get(1), memo.get(2), memo.get(3)) == ('a', None, 'c')
+
+
+def test_fetch_session_uses_the_record_given(stub):
+    records = race()
+    serve_race(stub, records)
+    fetched = fetch_session(OpenF1Fetcher(stub.url, rate=0), 9165, session=records['sessions'][0])
+    assert stub.paths('/v1/sessions') == []
+    assert [row[2] for row in fetched['drivers']] == [1, 55, 4]
+    assert len(fetched['laps']) == 18
+    assert fetched['errors'] == {'laps': {}, 'positions': {}}
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from conftest import race
+
+from openf1_pipeline import final_positions
+from openf1_schema import DRIVERS, LAPS, POSITIONS
+from openf1_store import read_partition, read_table, write_session, write_table
+
+
+def _laps(segments, meeting_key=1219, session_key=9165):
+    """Laps table of one driver whose laps have the given sector 1 mini-sector codes"""
+    return LAPS.frame({
+        'meeting_key': meeting_key, 'session_key': session_key, 'driver_number': 1, 'lap_number': lap_number,
+        'date_start': '2023-09-17T12:03:15.000000+00:00', 'is_pit_out_lap': False, 'lap_duration': 95.0,
+        'duration_sector_1': 30.0, 'duration_sector_2': 35.0, 'duration_sector_3': 30.0,
+        'segments_sector_1': codes, 'segments_sector_2': [2049], 'segments_sector_3': [2051],
+    } for lap_number, codes in enumerate(segments, 1))
+
+
+@pytest.mark.parametrize('format', ['parquet', 'csv'])
+def test_sessions_with_different_segment_counts(tmp_path, format):
+    if format == 'parquet':
+        pytest.importorskip('pyarrow')
+    root = str(tmp_path)
+    # The session with fewer mini-sectors is written (and found) first
+    write_table(_laps([[2049, 2051]]), 'laps', 2023, 1219, 9165, root=root, format=format)
+    write_table(_laps([[2048, 2049, 2051, 2064]], 1220, 9166), 'laps', 2023, 1220, 9166, root=root, format=format)
+
+    df = read_table('laps', root=root, format=format).sort_values('session_key', ignore_index=True)
+    columns = ['segments_sector_1_1', 'segments_sector_1_2', 'segments_sector_1_3', 'segments_sector_1_4']
+    assert df[columns].to_numpy().tolist() == [[2, 4, 0, 0], [1, 2, 4, 17]]
+    assert df['session_key'].tolist() == [9165, 9166]
+
+    one = read_table('laps', columns=['session_key', 'segments_sector_1_4'], root=root, format=format,
+                     filters=[('session_key', '=', 9166)])
+    assert one['segments_sector_1_4'].tolist() == [17]
+
+
+@pytest.mark.parametrize('format', ['parquet', 'csv'])
+def test_session_round_trip(tmp_path, format):
+    if format == 'parquet':
+        pytest.importorskip('pyarrow')
+    records = race()
+    tables = {
+        'drivers': DRIVERS.frame(records['drivers']),
+        'laps': LAPS.frame(records['laps']),
+        'positions': final_positions(map(POSITIONS.row, records['position'])),
+        'empty': LAPS.frame([]),
+    }
+    paths = write_session(tables, 2023, 1219, 9165, root=str(tmp_path), format=format)
+    assert sorted(paths) == ['drivers', 'laps', 'positions']
+    assert read_partition('empty', 2023, 1219, 9165, root=str(tmp_path), format=format) is None
+
+    for table in paths:
+        expected = tables[table].drop(columns=['meeting_key', 'session_key'], errors='ignore')
+        stored = read_partition(table, 2023, 1219, 9165, root=str(tmp_path), format=format)
+        pd.testing.assert_frame_equal(stored, expected, check_categorical=False)
+    laps = read_partition('laps', 2023, 1219, 9165, root=str(tmp_path), format=format)
+    assert laps['is_pit_out_lap'].isna().sum() == 15
+    assert laps['date_start'].dt.tz is not None
+
+
+@pytest.mark.parametrize('format', ['parquet', 'csv'])
+def test_read_table_filters_sessions_and_rows(tmp_path, format):
+    if format == 'parquet':
+        pytest.importorskip('pyarrow')
+    root = str(tmp_path)
+    laps = LAPS.frame(race()['laps'])
+    write_table(laps, 'laps', 2023, 1219, 9165, root=root, format=format)
+    write_table(laps.assign(session_key=9166), 'laps', 2024, 1230, 9166, root=root, format=format)
+    # Writing a session again replaces it
+    write_table(laps, 'laps', 2023, 1219, 9165, root=root, format=format)
+
+    assert len(read_table('laps', root=root, format=format)) == 36
+    df = read_table('laps', columns=['driver_number', 'lap_number', 'year'], root=root, format=format,
+                    filters=[('year', '=', 2024), ('driver_number', 'in', [1, 4])])
+    assert df.columns.tolist() == ['driver_number', 'lap_number', 'year']
+    assert sorted(set(df['driver_number'])) == [1, 4] and set(df['year']) == {2024}
+    assert len(df) == 12
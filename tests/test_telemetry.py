@@ -0,0 +1,74 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+from conftest import SESSION_START
+
+from openf1_fetch import OpenF1Fetcher
+from openf1_telemetry import ingest_session, read_telemetry
+
+SESSION = {'session_key': 9165, 'meeting_key': 1219, 'year': 2023, 'date_start': SESSION_START.isoformat(),
+           'date_end': (SESSION_START + timedelta(minutes=3)).isoformat()}
+
+
+def _car_data():
+    records = []
+    for driver_number in (1, 55):
+        for step in range(13):  # every 15 s from the start to the end, both included
+            records.append({'session_key': 9165, 'driver_number': driver_number,
+                            'date': (SESSION_START + timedelta(seconds=15 * step)).isoformat(),
+                            'speed': 200 + step, 'throttle': 99, 'brake': 0, 'rpm': 11000 + driver_number,
+                            'n_gear': 7, 'drs': None if step == 0 else 8})
+    # The API can send a sample twice
+    return records + records[5:6]
+
+
+def test_ingest_windows_and_deduplicates(stub, tmp_path):
+    stub.serve('/v1/car_data', _car_data())
+    report = ingest_session(OpenF1Fetcher(stub.url, rate=0), SESSION, endpoints=('car_data',),
+                            root=str(tmp_path), window=timedelta(minutes=1))
+    assert report == {'car_data': {1: 13, 55: 13}}
+    # One request per window for every driver; the window bounds are inclusive, so they overlap
+    assert stub.paths('/v1/car_data') == [
+        f'/v1/car_data?session_key=9165&date>=2023-09-17T12%3A0{minute}%3A00&date<=2023-09-17T12%3A0{minute + 1}%3A00'
+        for minute in range(3)
+    ]
+
+    telemetry = read_telemetry('car_data', 2023, 1219, 9165, 55, root=str(tmp_path))
+    assert len(telemetry) == 13
+    assert telemetry['speed'].tolist() == list(range(200, 213))
+    assert (np.diff(telemetry.date.astype('int64')) > 0).all()
+    assert telemetry['drs'][:2].tolist() == [0, 8]
+    assert isinstance(telemetry['rpm'], np.memmap)
+    assert read_telemetry('car_data', 2023, 1219, 9165, 44, root=str(tmp_path)) is None
+
+
+def test_laps_and_time_ranges_are_views(stub, tmp_path):
+    stub.serve('/v1/car_data', _car_data())
+    ingest_session(OpenF1Fetcher(stub.url, rate=0), SESSION, endpoints=('car_data',), root=str(tmp_path))
+    telemetry = read_telemetry('car_data', 2023, 1219, 9165, 1, root=str(tmp_path))
+
+    samples = telemetry.between('2023-09-17T12:01:00+00:00', '2023-09-17T12:02:00+00:00')
+    assert samples['speed'].tolist() == [204, 205, 206, 207]
+    assert np.shares_memory(samples['speed'], telemetry['speed'])
+
+    laps_df = pd.DataFrame({
+        'driver_number': [1, 1, 1, 55],
+        'lap_number': [1, 2, 3, 1],
+        'date_start': pd.to_datetime([SESSION_START, SESSION_START + timedelta(seconds=60), None,
+                                      SESSION_START], utc=True),
+        'lap_duration': [60.0, 45.5, 50.0, 60.0],
+    })
+    laps = {lap_number: views['speed'].tolist() for lap_number, views in telemetry.laps(laps_df)}
+    assert laps == {1: [200, 201, 202, 203], 2: [204, 205, 206, 207]}
+
+
+def test_ingest_again_replaces_the_session(stub, tmp_path):
+    stub.serve('/v1/car_data', _car_data())
+    fetcher = OpenF1Fetcher(stub.url, rate=0)
+    ingest_session(fetcher, SESSION, endpoints=('car_data',), root=str(tmp_path))
+    report = ingest_session(fetcher, SESSION, endpoints=('car_data',), driver_numbers=[1], root=str(tmp_path))
+    assert report == {'car_data': {1: 13}}
+    assert stub.paths('/v1/car_data')[-1].endswith('&driver_number=1')
+    assert read_telemetry('car_data', 2023, 1219, 9165, 55, root=str(tmp_path)) is None
+    assert len(read_telemetry('car_data', 2023, 1219, 9165, 1, root=str(tmp_path))) == 13
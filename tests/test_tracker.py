@@ -0,0 +1,77 @@
+import pandas as pd
+from conftest import race
+
+from openf1_analysis import speed_by_lap_group
+from openf1_pipeline import fastest_lap_summary, final_positions, merge_session
+from openf1_schema import DRIVERS, LAPS, POSITIONS
+from openf1_tracker import FastestLapTracker, LapGroupSpeeds
+
+
+def _session():
+    records = race()
+    laps_df, drivers_df = LAPS.frame(records['laps']), DRIVERS.frame(records['drivers'])
+    positions_df = final_positions(map(POSITIONS.row, records['position']))
+    return records, laps_df, drivers_df, positions_df
+
+
+def test_tracker_summary_matches_fastest_lap_summary():
+    records, laps_df, drivers_df, positions_df = _session()
+    tracker = FastestLapTracker()
+    for record in records['laps']:
+        tracker.update_record(record)
+    expected = fastest_lap_summary(merge_session(laps_df, drivers_df, positions_df)).reset_index(drop=True)
+    pd.testing.assert_frame_equal(tracker.summary(drivers_df, positions_df), expected, check_dtype=False)
+
+
+def test_tracker_folds_laps_in_incrementally():
+    _, laps_df, _, _ = _session()
+    tracker = FastestLapTracker()
+    assert tracker.update_frame(laps_df[laps_df['lap_number'] <= 2])
+    assert tracker.best_laps[4] == (99.0, 2, 304.0)
+    # A lap fed again, and a slower one, change nothing
+    assert not tracker.update(4, 2, 99.0, 304.0)
+    assert not tracker.update(4, 3, 99.5, 305.0)
+    assert tracker.update(4, 3, 98.0, 305.0)
+    assert tracker.best_laps[4] == (98.0, 3, 305.0)
+    assert tracker.laps_seen == 9
+
+
+def test_tracker_sectors():
+    _, laps_df, _, _ = _session()
+    tracker = FastestLapTracker()
+    tracker.update_frame(laps_df)
+    sectors = tracker.sectors().set_index('driver_number')
+    assert sectors.loc[1, 'duration_sector_1'] == pd.Series([30.01], dtype='float32')[0]
+    assert sectors['duration_sector_1_session_best'].tolist() == [True, False, False]
+    assert sectors.loc[4, 'duration_sector_3_session_best']
+    # Laps without a valid time or sector change nothing
+    tracker.update(11, 1, None, None, float('nan'), -1.0, None)
+    assert 11 not in tracker.best_laps and 11 not in tracker.personal_best_sectors
+
+
+def test_lap_group_speeds_match_speed_by_lap_group():
+    records, laps_df, drivers_df, positions_df = _session()
+    merged = merge_session(laps_df, drivers_df, positions_df)
+    expected = speed_by_lap_group(merged, window=4, keep=('team_colour',))
+    speeds = LapGroupSpeeds(window=4)
+    for record in records['laps']:  # in date order, not driver order
+        speeds.update_record(record)
+    names = {driver['driver_number']: driver['full_name'] for driver in records['drivers']}
+    colours = {driver['driver_number']: driver['team_colour'] for driver in records['drivers']}
+    frame = speeds.frame(names, colours=colours)
+    assert frame['full_name'].tolist() == expected['full_name'].astype(str).tolist()
+    assert frame['lap_group'].tolist() == expected['lap_group'].tolist()
+    assert frame['st_speed'].tolist() == expected['st_speed'].tolist()
+    assert frame['team_colour'].tolist() == expected['team_colour'].astype(str).tolist()
+
+
+def test_lap_group_speeds_replace_a_lap_fed_again():
+    speeds = LapGroupSpeeds(window=5)
+    assert speeds.update(1, 1, 300.0)
+    assert speeds.update(1, 2, 310.0)
+    assert not speeds.update(1, 2, 310.0)
+    assert speeds.update(1, 2, 320.0)
+    assert not speeds.update(1, 3, None)
+    assert speeds.update(1, 6, 280.0)
+    frame = speeds.frame()
+    assert frame.to_dict('list') == {'full_name': ['1', '1'], 'lap_group': [1, 6], 'st_speed': [310.0, 280.0]}